@@ -0,0 +1,71 @@
+'''
+Measure the sampling of the duplicate detector.
+
+    python benchmark/bench_duplicate_samples.py
+
+Unifies the tokens of the given files (lizard's own sources by default)
+and times samples(). "strings" builds every sample as the concatenation
+of its unified tokens, as the detector did before; "digests" is the
+current hashing of slices of the concatenated tokens.
+'''
+import os
+import sys
+import timeit
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lizard import FileAnalyzer, get_extensions, get_all_source_files  # noqa
+from lizard_ext import lizardduplicate  # noqa
+
+
+def string_samples(unified_tokens, sample_size):
+    buf = deque()
+    for unified_token, current_line in unified_tokens:
+        buf.append([current_line, current_line, ''])
+        for sample in buf:
+            sample[1] = current_line
+            sample[2] += unified_token
+        if len(buf) > sample_size:
+            yield buf.popleft()
+
+
+def unified_streams(paths):
+    streams = []
+    original = lizardduplicate.NestingStackWithUnifiedTokens.samples
+
+    def keep(unifier):
+        streams.append(unifier.unified_tokens)
+        return original(unifier)
+    lizardduplicate.NestingStackWithUnifiedTokens.samples = keep
+    try:
+        analyzer = FileAnalyzer(get_extensions(["duplicate"]))
+        for name in get_all_source_files(paths, [], []):
+            analyzer(name)
+    finally:
+        lizardduplicate.NestingStackWithUnifiedTokens.samples = original
+    return streams
+
+
+def main():
+    paths = sys.argv[1:] or [os.path.join(os.path.dirname(__file__), '..')]
+    streams = unified_streams(paths)
+    size = lizardduplicate.NestingStackWithUnifiedTokens.SAMPLE_SIZE
+    unifier = lizardduplicate.NestingStackWithUnifiedTokens(None)
+
+    def digests():
+        for tokens in streams:
+            unifier.unified_tokens = tokens
+            unifier.samples()
+
+    def strings():
+        for tokens in streams:
+            list(string_samples(tokens, size))
+    print("%d tokens in %d files" % (sum(map(len, streams)), len(streams)))
+    for name, run in (("strings", strings), ("digests", digests)):
+        print("%-8s %8.3f s" % (name, min(timeit.repeat(run, number=1,
+                                                        repeat=3))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+'''
+Measure the per-file setup cost of the tokenizers.
+
+    python benchmark/bench_tokenizer_setup.py
+
+Each file is a one-token source, so the time is dominated by what
+generate_tokens does before the first match. "rebuilt" builds the token
+pattern on every call like before, "cached" is the current behavior.
+'''
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lizard_languages import code_reader  # noqa
+from lizard_languages.clike import CLikeReader  # noqa
+from lizard_languages.fortran import FortranReader  # noqa
+from lizard_languages.python import PythonReader  # noqa
+from lizard_languages.java import JavaReader  # noqa
+
+FILES = 20000
+READERS = (CLikeReader, JavaReader, FortranReader, PythonReader)
+
+
+def per_file(reader):
+    run = timeit.repeat(lambda: list(reader.generate_tokens("x")),
+                        number=FILES, repeat=5)
+    return min(run) / FILES * 1e6
+
+
+def main():
+    cached = code_reader.token_pattern
+    print("%-14s %12s %12s" % ("reader", "rebuilt", "cached"))
+    for reader in READERS:
+        code_reader.token_pattern = cached.__wrapped__
+        try:
+            rebuilt = per_file(reader)
+        finally:
+            code_reader.token_pattern = cached
+        print("%-14s %9.1f us %9.1f us" % (
+            reader.__name__, rebuilt, per_file(reader)))
+
+
+if __name__ == "__main__":
+    main()
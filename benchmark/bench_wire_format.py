@@ -0,0 +1,60 @@
+'''
+Compare the plain pickle of FileInformation with the compact form that
+the worker processes of -t send back to the parent.
+
+    python benchmark/bench_wire_format.py
+
+Reports, per 10k functions, the bytes sent, the time the worker spends
+to encode them and the time the parent spends to decode them.
+'''
+import os
+import pickle
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lizard import FileAnalyzer, get_extensions  # noqa
+
+FUNCTIONS = 10000
+CODE = '''
+int foo(int a, int b, const char * c) {
+    if (a && b) { for (int i = 0; i < a; i++) { bar(i); } }
+    return a ? b : 0;
+}
+'''
+
+
+def sample(extension_names):
+    analyzer = FileAnalyzer(get_extensions(extension_names))
+    fileinfos = [analyzer.analyze_source_code("file%d.c" % i, CODE * 100)
+                 for i in range(FUNCTIONS // 100)]
+    return analyzer, fileinfos
+
+
+def measure(encode, decode, repeat=7):
+    data = encode()
+    worker = min(timeit.repeat(encode, number=1, repeat=repeat))
+    parent = min(timeit.repeat(lambda: decode(data), number=1, repeat=repeat))
+    return len(data), worker, parent
+
+
+def main():
+    protocol = pickle.HIGHEST_PROTOCOL
+    for names in ([], ["nd", "ns"]):
+        analyzer, fileinfos = sample(names)
+        plain = measure(
+            lambda: pickle.dumps(fileinfos, protocol),
+            pickle.loads)
+        packed = measure(
+            lambda: pickle.dumps(analyzer.pack_batch(fileinfos), protocol),
+            lambda data: list(analyzer.unpack_batch(pickle.loads(data))))
+        print("extensions: %s" % (", ".join(names) or "(none)"))
+        for label, (size, worker, parent) in (("plain", plain),
+                                              ("compact", packed)):
+            print("  %-8s %9d bytes  worker %6.1f ms  parent %6.1f ms" % (
+                label, size, worker * 1000, parent * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -24,10 +24,14 @@ from __future__ import print_function, division
 import codecs
 import sys
 import itertools
+import operator
 import re
 import os
-from fnmatch import fnmatch
+import time
+import tempfile
+from fnmatch import translate as translate_glob
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 if sys.version[0] == '2':
     from future_builtins import map, filter  # pylint: disable=W0622, F0401
@@ -41,32 +45,59 @@ try:
     from lizard_ext import version
     from lizard_ext import print_xml
     from lizard_ext import print_csv
-    from lizard_ext import html_output
-    from lizard_ext import auto_open, auto_read
+    from lizard_ext import print_ndjson, print_sqlite
+    from lizard_ext import html_output, html_report
+    from lizard_ext import auto_read, decode_source
     from lizard_ext import print_checkstyle
+    from lizard_ext import ResultCache
+    from lizard_ext import git_changed_files, load_changed_lines, GitError
+    from lizard_ext import GitIgnore
 except ImportError:
     sys.stderr.write("Cannot find the lizard_ext modules.")
 
 DEFAULT_CCN_THRESHOLD, DEFAULT_WHITELIST, \
     DEFAULT_MAX_FUNC_LENGTH = 15, "whitelizard.txt", 1000
+DEFAULT_CACHE_SIZE_MB = 512
+FILE_TABLE_SPOOL_SIZE = 1024 * 1024
 
 
 # pylint: disable-msg=too-many-arguments
 def analyze(paths, exclude_pattern=None, threads=1, exts=None,
-            lans=None):
+            lans=None, cache=None, diff=None, changed_lines=None):
     '''
     returns an iterator of file information that contains function
     statistics.
+    When diff is a git revision range, only the files changed in the
+    range are analyzed and the results of the other files are taken
+    from the cache.
+    When changed_lines is given, only the files in it are analyzed
+    and only the functions that overlap the changed lines are kept.
     '''
     exclude_pattern = exclude_pattern or []
-    files = get_all_source_files(paths, exclude_pattern, lans)
-    return analyze_files(files, threads, exts)
-
-
-def analyze_files(files, threads=1, exts=None):
+    if changed_lines is not None:
+        excludes = ExcludePatterns(exclude_pattern)
+        files = [f for f in changed_lines.files()
+                 if _is_under(f, paths) and
+                 _is_source_file(f, excludes, lans)]
+        return changed_function_filter(
+            analyze_files(files, threads, exts, cache), changed_lines)
+    if diff:
+        exts = exts or get_extensions([])
+        files, baseline = get_diff_source_files(
+            paths, exclude_pattern, lans, cache, diff, exts)
+        return analyze_files(files, threads, exts, cache, baseline)
+    files = get_source_files_with_content(
+        paths, exclude_pattern, lans, threads)
+    return analyze_files(files, threads, exts, cache)
+
+
+def analyze_files(files, threads=1, exts=None, cache=None, baseline=()):
     extensions = exts or get_extensions([])
-    file_analyzer = FileAnalyzer(extensions)
+    file_analyzer = FileAnalyzer(extensions, cache)
     result = map_files_to_analyzer(files, file_analyzer, threads)
+    if cache:
+        result = cache.evict_after(result)
+    result = itertools.chain(baseline, result)
     for extension in extensions:
         if hasattr(extension, 'cross_file_process'):
             result = extension.cross_file_process(result)
@@ -156,6 +187,13 @@ def arg_parser(prog=None):
                         action="store_const",
                         const=print_clang_style_warning,
                         dest="printer")
+    parser.add_argument("--low_memory",
+                        help='''Compute the totals and the file table of the
+                        default output while the files are analyzed instead
+                        of keeping all the results, so that the memory used
+                        grows with the number of warnings only''',
+                        action="store_true",
+                        dest="low_memory")
     parser.add_argument("--warning-msvs",
                         help='''Show warnings only, using Visual Studio's
                         warning format for printing warnings.
@@ -185,13 +223,58 @@ def arg_parser(prog=None):
                         action="append",
                         dest="exclude",
                         default=[])
+    parser.add_argument("--exclude_from",
+                        help='''Read exclude patterns from a file, one
+                        pattern per line. Blank lines and lines starting
+                        with "#" are ignored.''',
+                        action="append",
+                        dest="exclude_from",
+                        default=[])
     parser.add_argument("-t", "--working_threads",
                         help='''number of working threads. The default
                         value is 1. Using a bigger
-                        number can fully utilize the CPU and often faster.''',
+                        number can fully utilize the CPU and often faster.
+                        The files are handed to the worker processes in
+                        chunks and the results keep the order of the
+                        files. The directories are listed in as many
+                        threads.''',
                         type=int,
                         dest="working_threads",
                         default=1)
+    diff_group = parser.add_mutually_exclusive_group()
+    diff_group.add_argument("--diff",
+                            help='''Only analyze the files changed in the
+                            given git revision range, e.g. "main..HEAD". A
+                            single revision compares it with the working
+                            tree. Together with --cache_dir, the results of
+                            the unchanged files are taken from the previous
+                            run, so the totals still cover all the files.
+                            Without --cache_dir, the totals only cover the
+                            changed files.''',
+                            type=str,
+                            dest="diff")
+    diff_group.add_argument("--diff_lines",
+                            help='''Only analyze the files in the given
+                            unified diff and only report the functions that
+                            overlap the changed lines. It can be a patch file
+                            ("-" for the standard input) or a git revision
+                            range. It can't be used with --diff.''',
+                            type=str,
+                            dest="diff_lines")
+    parser.add_argument("--cache_dir",
+                        help='''Cache the analysis result of each file in
+                        the given folder. Files that haven't changed since
+                        the previous run will not be analyzed again.''',
+                        type=str,
+                        dest="cache_dir")
+    parser.add_argument("--cache_size",
+                        help='''Maximum size of the cache folder in MB. The
+                        least recently used results are removed when the
+                        cache grows bigger. The default value is %d.
+                        ''' % DEFAULT_CACHE_SIZE_MB,
+                        type=int,
+                        dest="cache_size",
+                        default=DEFAULT_CACHE_SIZE_MB)
     parser.add_argument("-X", "--xml",
                         help='''Generate XML in cppncss style instead of the
                         tabular output. Useful to generate report in Jenkins
@@ -205,11 +288,25 @@ def arg_parser(prog=None):
                         action="store_const",
                         const=print_csv,
                         dest="printer")
+    parser.add_argument("--ndjson",
+                        help='''Generate newline delimited JSON output, one
+                        record per function and per file, written while
+                        the files are analyzed''',
+                        action="store_const",
+                        const=print_ndjson,
+                        dest="printer")
     parser.add_argument("-H", "--html",
                         help='''Output HTML report''',
                         action="store_const",
                         const=html_output,
                         dest="printer")
+    parser.add_argument("--html_dir",
+                        help='''Write a HTML report for big code bases to the
+                        given directory: a small index page with the summary
+                        of each source directory, and the functions in data
+                        shards that the page loads on demand. It can't be
+                        used with the other output options.''',
+                        dest="html_dir")
     parser.add_argument("-m", "--modified",
                         help='''Calculate modified cyclomatic complexity number
                         , which count a switch/case with multiple cases as
@@ -371,6 +468,95 @@ class FileInformation(object):  # pylint: disable=R0903
         return summary / len(self.function_list) if self.function_list else 0
 
 
+class CompactFileInfo(object):
+    '''
+    A compact representation of FileInformation that is cheap to
+    pickle, used to send results from the worker processes back.
+
+    Each function becomes a tuple of the values of its attributes, in
+    the order of a schema made of the basic FunctionInfo attributes and
+    the FUNCTION_INFO columns of the extensions. Attributes outside the
+    schema (e.g. the state kept by some extensions) are appended to the
+    tuple and named once per file. The schema itself is never sent, as
+    the worker and the parent build it from the same extensions. A
+    function that doesn't fit is sent as it is.
+    '''
+
+    FUNCTION_FIELDS = (
+        'name', 'long_name', 'start_line', 'end_line',
+        'cyclomatic_complexity', 'nloc', 'token_count', 'full_parameters',
+        'top_nesting_level', 'fan_in', 'fan_out', 'general_fan_out',
+        'max_nesting_depth')
+    FILE_FIELDS = ('filename', 'nloc', 'token_count', 'function_list')
+
+    def __init__(self, extensions):
+        extension_fields = [
+            key for ext in extensions
+            for key in getattr(ext, 'FUNCTION_INFO', {})
+            if key not in self.FUNCTION_FIELDS]
+        self.fields = self.FUNCTION_FIELDS + tuple(
+            dict.fromkeys(extension_fields))
+
+    def pack(self, fileinfo):
+        if type(fileinfo) is not FileInformation:  # pylint: disable=C0123
+            return fileinfo
+        extra = {k: v for k, v in fileinfo.__dict__.items()
+                 if k not in self.FILE_FIELDS}
+        functions = fileinfo.function_list
+        extra_fields = self._extra_fields(functions)
+        pack_function = self._function_packer(
+            fileinfo.filename, extra_fields)
+        return (fileinfo.filename, fileinfo.nloc, fileinfo.token_count,
+                [pack_function(fun) for fun in functions],
+                extra or None, extra_fields)
+
+    def _extra_fields(self, functions):
+        '''
+        The attributes outside the schema are usually the same for all
+        the functions of a file, so they are named once per file.
+        '''
+        if not functions:
+            return ()
+        return tuple(k for k in functions[0].__dict__
+                     if k not in self.fields and k != 'filename')
+
+    def _function_packer(self, filename, extra_fields):
+        values = operator.itemgetter(*(self.fields + extra_fields))
+        expected = set(self.fields + extra_fields + ('filename',))
+
+        def pack_function(fun):
+            if (type(fun) is not FunctionInfo or  # pylint: disable=C0123
+                    fun.filename != filename or
+                    fun.__dict__.keys() != expected):
+                return fun
+            return values(fun.__dict__)
+        return pack_function
+
+    def unpack(self, record):
+        if not isinstance(record, tuple):
+            return record
+        filename, nloc, token_count, functions, extra, extra_fields = record
+        fields = self.fields + extra_fields
+        fileinfo = FileInformation(
+            filename, nloc,
+            [self._unpack_function(fun, fields, filename)
+             for fun in functions])
+        fileinfo.token_count = token_count
+        if extra:
+            fileinfo.__dict__.update(extra)
+        return fileinfo
+
+    @staticmethod
+    def _unpack_function(values, fields, filename):
+        if not isinstance(values, tuple):
+            return values
+        fun = FunctionInfo.__new__(FunctionInfo)
+        attributes = dict(zip(fields, values))
+        attributes['filename'] = filename
+        fun.__dict__ = attributes
+        return fun
+
+
 class NestingStack(object):
 
     def __init__(self):
@@ -553,13 +739,32 @@ def condition_counter(tokens, reader):
 
 class FileAnalyzer(object):  # pylint: disable=R0903
 
-    def __init__(self, extensions):
+    def __init__(self, extensions, cache=None):
         self.processors = extensions
+        self.cache = cache
+        self.compact = CompactFileInfo(extensions)
+
+    def pack_batch(self, fileinfos):
+        return [self.compact.pack(fileinfo) for fileinfo in fileinfos]
+
+    def unpack_batch(self, records):
+        for record in records:
+            yield self.compact.unpack(record)
 
     def __call__(self, filename):
+        '''
+        filename may also be a (filename, content) pair, when the raw
+        content was already read during the file discovery.
+        '''
+        data = None
+        if isinstance(filename, tuple):
+            filename, data = filename
         try:
-            return self.analyze_source_code(
-                filename, auto_read(filename))
+            code = auto_read(filename) if data is None else \
+                decode_source(data)
+            if self.cache:
+                return self._analyze_with_cache(filename, code)
+            return self.analyze_source_code(filename, code)
         except UnicodeDecodeError:
             sys.stderr.write("Error: doesn't support none utf encoding '%s'\n"
                              % filename)
@@ -572,6 +777,19 @@ class FileAnalyzer(object):  # pylint: disable=R0903
             raise
         return FileInformation(filename, 0, [])
 
+    def _analyze_with_cache(self, filename, code):
+        stat = os.stat(filename)
+        key = self.cache.key(
+            filename, get_reader_for(filename) or CLikeReader,
+            self.processors, code)
+        fileinfo = self.cache.load(key)
+        if fileinfo is None:
+            fileinfo = self.analyze_source_code(filename, code)
+            self.cache.save(key, fileinfo)
+        fileinfo.cache_entry = (stat.st_size, stat.st_mtime_ns, key,
+                                self.cache.pipeline(self.processors))
+        return fileinfo
+
     def analyze_source_code(self, filename, code):
         context = FileInfoBuilder(filename)
         reader = (get_reader_for(filename) or CLikeReader)(context)
@@ -593,6 +811,16 @@ def map_files_to_analyzer(files, analyzer, working_threads):
     return mapmethod(analyzer, files)
 
 
+def changed_function_filter(module_infos, changed_lines):
+    for file_info in module_infos:
+        if file_info:
+            file_info.function_list = [
+                fun for fun in file_info.function_list
+                if changed_lines.overlaps(
+                    file_info.filename, fun.start_line, fun.end_line)]
+        yield file_info
+
+
 def warning_filter(option, module_infos):
     for file_info in module_infos:
         if file_info:
@@ -602,25 +830,67 @@ def warning_filter(option, module_infos):
                     yield fun
 
 
-def whitelist_filter(warnings, script=None, whitelist=None):
-    def _get_whitelist_item(script):
-        white = {}
-        pieces = script.replace('::', '##').split(':')
-        if len(pieces) > 1:
-            white['file_name'] = pieces[0]
-            script = pieces[1]
-        white['function_names'] = (
-            [x.strip().replace('##', '::') for x in script.split(',')])
-        return white
-
-    def _in_list(warning):
-        return any(_match_whitelist_item(white, warning)
-                   for white in whitelist)
-
-    def _match_whitelist_item(white, warning):
-        return (warning.name in white['function_names'] and
-                warning.filename == white.get('file_name', warning.filename))
+class Whitelist(object):
+    '''
+    The entries of a whitelist, indexed by function name and by file and
+    function name, so checking a warning costs the same however long the
+    whitelist is. An entry without a file name applies to the function
+    in every file; an entry with one applies to that file only. The
+    entries of a line starting with "glob " are globs, which are compiled
+    into one regular expression; as with --exclude, * also matches "/".
+    Other entries are matched exactly, e.g. "operator*".
+    '''
+
+    GLOB_PREFIX = 'glob '
+
+    def __init__(self, script):
+        self.names = set()
+        self.file_functions = set()
+        globs = []
+        for file_name, name, is_glob in self._entries(script):
+            if is_glob:
+                globs.append((file_name or '*', name))
+            elif file_name is None:
+                self.names.add(name)
+            else:
+                self.file_functions.add((file_name, name))
+        self.glob_match = self._compile(globs)
+
+    @classmethod
+    def _entries(cls, script):
+        for line in script.splitlines():
+            line = line.split('#')[0]
+            is_glob = line.lstrip().startswith(cls.GLOB_PREFIX)
+            if is_glob:
+                line = line.lstrip()[len(cls.GLOB_PREFIX):].lstrip()
+            pieces = line.replace('::', '##').split(':')
+            file_name = None
+            if len(pieces) > 1:
+                file_name = pieces[0]
+            for name in pieces[1 if file_name is not None else 0].split(','):
+                yield file_name, name.strip().replace('##', '::'), is_glob
+
+    @staticmethod
+    def _compile(globs):
+        if not globs:
+            return None
+        return re.compile('(?:%s)\\Z' % '|'.join(
+            _glob_regex(file_name) + '\\x00' + _glob_regex(name)
+            for file_name, name in globs)).match
+
+    def __contains__(self, function):
+        return (function.name in self.names or
+                (function.filename, function.name) in self.file_functions or
+                (self.glob_match is not None and self.glob_match(
+                    function.filename + '\x00' + function.name) is not None))
+
+
+def _glob_regex(pattern):
+    regex = translate_glob(pattern)
+    return regex[:-len('\\Z')] if regex.endswith('\\Z') else regex
 
+
+def whitelist_filter(warnings, script=None, whitelist=None):
     def get_whitelist(whitelist):
         if os.path.isfile(whitelist):
             return auto_read(whitelist)
@@ -631,11 +901,9 @@ def whitelist_filter(warnings, script=None, whitelist=None):
 
     if not script:
         script = get_whitelist(whitelist)
-    whitelist = [
-        _get_whitelist_item(line.split('#')[0])
-        for line in script.splitlines()]
+    whitelist = Whitelist(script)
     for warning in warnings:
-        if not _in_list(warning):
+        if warning not in whitelist:
             yield warning
 
 
@@ -814,24 +1082,75 @@ def print_and_save_modules(all_fileinfos, scheme):
     for module_info in all_fileinfos:
         if module_info:
             saved_fileinfos.append(module_info)
-            for fun in module_info.function_list:
-                try:
-                    print(scheme.function_info(fun))
-                except UnicodeEncodeError:
-                    print("Found ill-formatted unicode function name.")
-    print("%d file analyzed." % (len(saved_fileinfos)))
+            print_functions(module_info, scheme)
+    print_file_table_head(len(saved_fileinfos), scheme)
+    for module_info in saved_fileinfos:
+        print(file_table_row(module_info, scheme))
+    return saved_fileinfos
+
+
+def print_functions(module_info, scheme):
+    for fun in module_info.function_list:
+        try:
+            print(scheme.function_info(fun))
+        except UnicodeEncodeError:
+            print("Found ill-formatted unicode function name.")
+
+
+def print_file_table_head(file_count, scheme):
+    print("%d file analyzed." % file_count)
     print("==============================================================")
     print("NLOC   " + scheme.average_captions() + " function_cnt    file")
     print("--------------------------------------------------------------")
-    for module_info in saved_fileinfos:
-        print((
-            "{module.nloc:7d}" +
-            scheme.average_formatter() +
-            "{function_count:10d}" +
-            "     {module.filename}").format(
-            module=module_info,
-            function_count=len(module_info.function_list)))
-    return saved_fileinfos
+
+
+def file_table_row(module_info, scheme):
+    return (
+        "{module.nloc:7d}" +
+        scheme.average_formatter() +
+        "{function_count:10d}" +
+        "     {module.filename}").format(
+        module=module_info,
+        function_count=len(module_info.function_list))
+
+
+class RunningTotal(object):
+    '''
+    The totals of AllResult, added up while the files pass by instead of
+    keeping all of them.
+    '''
+
+    def __init__(self, scheme):
+        self.files = 0
+        self.nloc = 0
+        self.functions = 0
+        self.function_nloc = 0
+        self.sums = dict((item['value'], 0) for item in scheme.items
+                         if item.get('avg_caption'))
+
+    def add(self, file_info):
+        self.files += 1
+        self.nloc += file_info.nloc
+        for fun in file_info.function_list:
+            self.functions += 1
+            self.function_nloc += fun.nloc
+            for column in self.sums:
+                self.sums[column] += getattr(fun, column)
+
+    def __getattr__(self, name):
+        column = name[len("average_"):]
+        if not name.startswith("average_") or column not in self.sums:
+            raise AttributeError(name)
+        return self.sums[column] / self.functions if self.functions else 0
+
+    def function_count(self):
+        return self.functions or 1
+
+    def nloc_in_functions(self):
+        return self.function_nloc or 1
+
+    def as_fileinfo(self):
+        return self
 
 
 def get_warnings(code_infos, option):
@@ -851,6 +1170,35 @@ def print_result(result, option, scheme, total_factory):
     return warning_count
 
 
+def print_result_in_bounded_memory(result, option, scheme, _):
+    '''
+    The default output, computed without keeping the results. The totals
+    are added up as the files pass by, and the file table is kept in a
+    temporary file (in memory while it's small) until the functions are
+    printed. Only the warnings are kept.
+    '''
+    total = RunningTotal(scheme)
+    with tempfile.SpooledTemporaryFile(
+            FILE_TABLE_SPOOL_SIZE, mode="w+", encoding="utf-8") as file_table:
+        def print_and_count(all_fileinfos):
+            print(scheme.function_info_head())
+            for module_info in all_fileinfos:
+                if module_info:
+                    print_functions(module_info, scheme)
+                    total.add(module_info)
+                    file_table.write(file_table_row(module_info, scheme))
+                    file_table.write("\n")
+                    yield module_info
+        warnings = list(get_warnings(print_and_count(result), option))
+        print_file_table_head(total.files, scheme)
+        file_table.seek(0)
+        for row in file_table:
+            sys.stdout.write(row)
+    warning_count, warning_nloc = print_warnings(option, scheme, warnings)
+    print_total(warning_count, warning_nloc, total, scheme)
+    return warning_count
+
+
 def silent_printer(result, *_):
     '''
     just to exhaust the result, no output.
@@ -880,94 +1228,397 @@ def get_map_method(working_threads):
     try:
         if working_threads == 1:
             raise ImportError
-        import multiprocessing
-        pool = multiprocessing.Pool(processes=working_threads)
-        return pool.imap_unordered
+        import multiprocessing  # pylint: disable=W0611
+        return lambda function, items: map_in_processes(
+            working_threads, function, items)
     except ImportError:
         return map
 
 
-def md5_hash_file(full_path_name):
-    ''' return md5 hash of a file '''
+# Target time a worker spends on one chunk of files. The chunk size is
+# adapted to it, so a run with many small files doesn't pay an IPC round
+# trip per file while a few huge files still spread over all workers.
+WORKER_CHUNK_SECONDS = 0.1
+WORKER_MAX_CHUNK_SIZE = 256
+# Number of chunks in flight per worker process. It bounds how far the
+# file discovery runs ahead of the analysis.
+WORKER_CHUNKS_IN_FLIGHT = 4
+
+_WORKER_FUNCTION = None
+
+
+def _init_worker(function):
+    '''
+    Runs once in each worker process. Keeps the function to map, so it
+    isn't pickled with every chunk, and warms up the language readers.
+    '''
+    global _WORKER_FUNCTION  # pylint: disable=W0603
+    _WORKER_FUNCTION = function
+    for reader in languages():
+        analyze_file.analyze_source_code("warm_up." + reader.ext[0], "")
+
+
+def _map_chunk(chunk):
+    start = time.time()
+    results = [_WORKER_FUNCTION(item) for item in chunk]
+    if hasattr(_WORKER_FUNCTION, 'pack_batch'):
+        results = _WORKER_FUNCTION.pack_batch(results)
+    return time.time() - start, results
+
+
+def map_in_processes(processes, function, items):
+    '''
+    Like map, but the function runs in a pool of worker processes.
+    The items are sent to the workers in chunks and the results come
+    back in the order of the items. If the function has pack_batch and
+    unpack_batch methods, they are used to send the results of a chunk
+    in a compact form. The items are consumed lazily:
+    only a bounded number of chunks is in flight at any time.
+    The pool is closed when the results are exhausted, and terminated
+    if the consumer stops early or something goes wrong.
+    '''
+    import multiprocessing
+    from collections import deque
+    items = iter(items)
+    pool = None
+    pending = deque()
+    chunk_size = 1
+    seconds_per_item = None
     try:
-        with auto_open(full_path_name, mode='r') as source_file:
-            if sys.version_info[0] == 3:
-                code_md5 = hashlib.md5(source_file.read().encode('utf-8'))
-            else:
-                code_md5 = hashlib.md5(source_file.read())
-        return code_md5.hexdigest()
+        while True:
+            while len(pending) < processes * WORKER_CHUNKS_IN_FLIGHT:
+                chunk = list(itertools.islice(items, chunk_size))
+                if not chunk:
+                    break
+                if pool is None:
+                    pool = multiprocessing.Pool(
+                        processes, _init_worker, (function,))
+                pending.append(
+                    (len(chunk), pool.apply_async(_map_chunk, (chunk,))))
+            if not pending:
+                break
+            count, async_result = pending.popleft()
+            elapsed, results = async_result.get()
+            per_item = elapsed / count
+            seconds_per_item = per_item if seconds_per_item is None else (
+                seconds_per_item + per_item) / 2
+            chunk_size = max(1, min(
+                WORKER_MAX_CHUNK_SIZE,
+                int(WORKER_CHUNK_SECONDS / max(seconds_per_item, 1e-6))))
+            if hasattr(function, 'unpack_batch'):
+                results = function.unpack_batch(results)
+            for result in results:
+                yield result
+        if pool is not None:
+            pool.close()
+    except BaseException:
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.join()
+
+
+class DuplicateFileFilter(object):
+    '''
+    Tells whether a file has the same content as a file seen before.
+
+    Files are told apart by (device, inode) and size first, which only
+    needs a stat. A file is read and hashed only when another file of
+    the same size shows up, and the first file of a size is hashed only
+    then. The raw content read for hashing is returned, so the file
+    doesn't need to be read again to be analyzed.
+    '''
+
+    def __init__(self):
+        self.inodes = set()
+        self.sizes = {}  # size -> first file name, or set of hashes
+
+    def check(self, pathname):
+        '''
+        Returns (is duplicate, raw content or None).
+        A file that cannot be read is never a duplicate.
+        '''
+        try:
+            stat = os.stat(pathname)
+        except OSError:
+            return False, None
+        if stat.st_ino:
+            inode = (stat.st_dev, stat.st_ino)
+            if inode in self.inodes:
+                return True, None
+            self.inodes.add(inode)
+        hashes = self.sizes.get(stat.st_size)
+        if hashes is None:
+            self.sizes[stat.st_size] = pathname
+            return False, None
+        if not isinstance(hashes, set):
+            first = _read_bytes(hashes)
+            hashes = self.sizes[stat.st_size] = set()
+            if first is not None:
+                hashes.add(_content_hash(first))
+        data = _read_bytes(pathname)
+        if data is None:
+            return False, None
+        digest = _content_hash(data)
+        if digest in hashes:
+            return True, None
+        hashes.add(digest)
+        return False, data
+
+
+def _read_bytes(pathname):
+    try:
+        with open(pathname, 'rb') as source_file:
+            return source_file.read()
     except IOError:
         return None
-    except UnicodeDecodeError:
+
+
+def _content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ExcludePatterns(object):
+    '''
+    The -x patterns, translated once into a single regex.
+    A pattern that ends with "*" and matches a directory name followed
+    by a separator matches every file under the directory too, so
+    those patterns are also used to skip whole directories.
+    '''
+
+    def __init__(self, patterns):
+        patterns = list(patterns)
+        self._files = _compile_globs(patterns)
+        self._directories = _compile_globs(
+            p for p in patterns if p.endswith('*'))
+
+    def excludes(self, pathname):
+        return bool(self._files and self._files(os.path.normcase(pathname)))
+
+    def excludes_directory(self, directory):
+        return bool(self._directories and self._directories(
+            os.path.normcase(directory + os.sep)))
+
+
+def _compile_globs(patterns):
+    regexes = [translate_glob(os.path.normcase(p)) for p in patterns]
+    if regexes:
+        return re.compile('|'.join(regexes)).match
+    return None
+
+
+def read_exclude_file(filename):
+    '''
+    The patterns in an --exclude_from file, one per line. Blank lines
+    and lines starting with "#" are skipped.
+    '''
+    lines = (line.strip() for line in auto_read(filename).splitlines())
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def _is_source_file(pathname, excludes, lans):
+    reader = get_reader_for(pathname)
+    return bool(
+        reader and
+        (not lans or set(lans).intersection(reader.language_names)) and
+        not excludes.excludes(pathname))
+
+
+def _is_under(pathname, paths):
+    pathname = os.path.abspath(pathname)
+    for path in paths:
+        path = os.path.abspath(path)
+        if pathname == path or pathname.startswith(path.rstrip(os.sep) +
+                                                   os.sep):
+            return True
+    return False
+
+
+def _name_under_paths(pathname, paths):
+    '''
+    pathname as it would be found under the first of the paths it is
+    in, e.g. "/tmp/repo/a.c" rather than "../../tmp/repo/a.c" for the
+    path "/tmp/repo", or None when it isn't in any of them.
+    '''
+    absolute = os.path.abspath(pathname)
+    for path in paths:
+        if _is_under(absolute, [path]):
+            relative = os.path.relpath(absolute, os.path.abspath(path))
+            return path if relative == '.' else os.path.join(path, relative)
+    return None
+
+
+def _git_directory(paths):
+    if os.path.isdir(paths[0]):
+        return paths[0]
+    return os.path.dirname(paths[0]) or '.'
+
+
+def get_diff_source_files(paths, exclude_patterns, lans, cache, diff,
+                          extensions=None):
+    '''
+    Split the source files into the ones to analyze and the stored
+    results of the rest.
+    The files changed in the git revision range diff are analyzed.
+    The other source files under the paths are loaded from the cache
+    when they were analyzed in a previous run with the same cache and
+    their size and modification time haven't changed since then and the
+    run had the same version and extensions, and analyzed otherwise. Without a previous run, every file is analyzed.
+    Without a cache, only the changed files are analyzed, so the
+    results only cover them.
+    '''
+    excludes = ExcludePatterns(exclude_patterns)
+    changed = [
+        f for f in (_name_under_paths(name, paths) for name in
+                    git_changed_files(diff, _git_directory(paths)))
+        if f is not None and _is_source_file(f, excludes, lans)]
+    if not cache:
+        return changed, []
+    manifest = cache.load_manifest()
+    if not manifest:
+        return get_all_source_files(paths, exclude_patterns, lans), []
+    changed_set = set(os.path.abspath(f) for f in changed)
+    pipeline = cache.pipeline(extensions or get_extensions([]))
+    files = []
+    baseline = []
+    for filename in get_all_source_files(paths, exclude_patterns, lans):
+        fileinfo = None
+        entry = manifest.get(cache.manifest_key(filename))
+        if entry is not None and \
+                os.path.abspath(filename) not in changed_set:
+            fileinfo = _load_unchanged(cache, filename, entry, pipeline)
+        if fileinfo is None:
+            files.append(filename)
+        else:
+            baseline.append(fileinfo)
+    return files, baseline
+
+
+def _load_unchanged(cache, filename, entry, pipeline):
+    if len(entry) != 4 or entry[3] != pipeline:
+        return None  # computed by another version or other extensions
+    size, mtime, key, _ = entry
+    try:
+        stat = os.stat(filename)
+    except OSError:
         return None
-    except UnicodeEncodeError:
+    if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
         return None
+    fileinfo = cache.load(key)
+    if fileinfo is None or fileinfo.filename != filename:
+        return None  # e.g. stored from another working directory
+    return fileinfo
 
 
-def get_all_source_files(paths, exclude_patterns, lans):
+def _scan_directory(path):
     '''
-    Function counts md5 hash for the given file and checks if it isn't a
-    duplicate using set of hashes for previous files.
-
-    If a .gitignore file is found in any of the given paths, it will be used
-    to filter out files that match the gitignore patterns.
+    Returns the files and the subdirectories of path. The types come
+    from the os.scandir entries, so no extra stat is needed on most
+    platforms. Like os.walk, links to directories are not entered and
+    unreadable directories are skipped.
     '''
-    hash_set = set()
-    gitignore_spec = None
-    base_path = None
+    files, directories = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.append(entry.path)
+                elif not entry.is_symlink():
+                    directories.append(entry.path)
+    except OSError:
+        pass
+    return files, directories
+
 
-    def _load_gitignore():
-        nonlocal gitignore_spec, base_path
+def walk_source_tree(top, prune, threads=1):
+    '''
+    Yields the files under top, each directory's files before its
+    subdirectories. A subdirectory for which prune returns True is not
+    entered. With several threads, the subdirectories are listed ahead
+    in a thread pool while the files found so far are consumed, and
+    the files still come in the same order.
+    '''
+    if threads <= 1:
+        stack = [top]
+        while stack:
+            files, directories = _scan_directory(stack.pop())
+            for filename in files:
+                yield filename
+            stack.extend(d for d in reversed(directories) if not prune(d))
+        return
+    with ThreadPoolExecutor(threads) as executor:
+        stack = [executor.submit(_scan_directory, top)]
         try:
-            import pathspec
-            for path in paths:
-                gitignore_path = os.path.join(path, '.gitignore')
-                if os.path.exists(gitignore_path):
-                    gitignore_file = auto_read(gitignore_path)
-                    # Read lines and strip whitespace and empty lines
-                    patterns = [line.strip() for line in gitignore_file.splitlines()]
-                    patterns = [p for p in patterns if p and not p.startswith('#')]
-                    gitignore_spec = pathspec.PathSpec.from_lines('gitwildmatch', patterns)
-                    base_path = path
-                    break
-        except ImportError:
-            pass
-
-    def _support(reader):
-        return not lans or set(lans).intersection(
-            reader.language_names)
-
-    def _validate_file(pathname):
-        if gitignore_spec is not None and base_path is not None:
-            rel_path = os.path.relpath(pathname, base_path)
-            # Normalize path separators for consistent matching
-            rel_path = rel_path.replace(os.sep, '/')
-            if gitignore_spec.match_file(rel_path):
-                return False
-        return (
-            pathname in paths or (
-                get_reader_for(pathname) and
-                _support(get_reader_for(pathname)) and
-                all(not fnmatch(pathname, p) for p in exclude_patterns) and
-                _not_duplicate(pathname)))
-
-    def _not_duplicate(full_path_name):
-        fhash = md5_hash_file(full_path_name)
-        if not fhash or fhash not in hash_set:
-            hash_set.add(fhash)
-            return True
+            while stack:
+                files, directories = stack.pop().result()
+                for filename in files:
+                    yield filename
+                stack.extend(executor.submit(_scan_directory, d)
+                             for d in reversed(directories) if not prune(d))
+        finally:
+            for future in stack:
+                future.cancel()
+
+
+def get_all_source_files(paths, exclude_patterns, lans, threads=1):
+    '''
+    Returns the source files under the given paths, skipping the files
+    with the same content as a file already returned.
+
+    The files ignored by the .gitignore files (and .git/info/exclude)
+    are skipped, as git would.
+    '''
+    return (pathname for pathname, _ in get_source_files_with_content(
+        paths, exclude_patterns, lans, threads))
+
+
+def get_source_files_with_content(paths, exclude_patterns, lans,
+                                  threads=1):
+    '''
+    Like get_all_source_files, but yields (file name, raw content) with
+    the content that was read while looking for duplicates, or None
+    when the file wasn't read yet.
+    The directories that are excluded or git-ignored are not entered.
+    With several threads the directories are listed in a thread pool.
+    '''
+    duplicates = DuplicateFileFilter()
+    excludes = ExcludePatterns(exclude_patterns)
+
+    def _validated_files(pathnames):
+        for pathname in pathnames:
+            if pathname in paths:
+                yield pathname, None
+            elif _is_source_file(pathname, excludes, lans):
+                duplicate, data = duplicates.check(pathname)
+                if not duplicate:
+                    yield pathname, data
+
+    def _walk(path):
+        gitignore = GitIgnore(path)
+
+        def _pruned(directory):
+            return gitignore.ignored(directory, is_dir=True) or \
+                excludes.excludes_directory(directory)
+
+        for filename in walk_source_tree(path, _pruned, threads):
+            if not gitignore.ignored(filename):
+                yield filename
 
     def all_listed_files(paths):
         for path in paths:
             if os.path.isfile(path):
                 yield path
             else:
-                for root, _, files in os.walk(path, topdown=False):
-                    for filename in files:
-                        yield os.path.join(root, filename)
+                for filename in _walk(path):
+                    yield filename
 
-    _load_gitignore()
-    return filter(_validate_file, all_listed_files(paths))
+    return _validated_files(all_listed_files(paths))
 
 
 def parse_args(argv):
@@ -984,6 +1635,9 @@ def parse_args(argv):
     parser = extend_parser(arg_parser(argv[0]))
     opt = parser.parse_args(args=argv[1:])
     opt.extensions = get_extensions(opt.extensions)
+    for ext in opt.extensions:
+        if hasattr(ext, "set_options"):
+            ext.set_options(opt)  # pylint: disable=E1101
     values = OutputScheme(opt.extensions).value_columns()
     no_fields = (set(opt.sorting) | set(opt.thresholds.keys())) - set(values)
     if no_fields:
@@ -1003,6 +1657,10 @@ def parse_args(argv):
         opt.thresholds["nloc"] = 1000000
     if "parameter_count" not in opt.thresholds:
         opt.thresholds["parameter_count"] = opt.arguments
+    if opt.html_dir and (opt.printer or opt.output_file):
+        sys.stderr.write("Error: --html_dir can't be used with another "
+                         "output option.\n")
+        sys.exit(2)
     if opt.output_file:
         inferred_printer = infer_printer_from_file_ext(opt.output_file)
         if inferred_printer:
@@ -1014,6 +1672,10 @@ def parse_args(argv):
             elif opt.printer != inferred_printer:
                 msg = "Warning: overriding output file extension.\n"
                 sys.stderr.write(msg)
+    if opt.html_dir:
+        opt.printer = html_report
+    if opt.low_memory and not opt.printer:
+        opt.printer = print_result_in_bounded_memory
     return opt
 
 
@@ -1027,6 +1689,10 @@ def infer_printer_from_file_ext(path):
         return print_xml
     if lower_path.endswith(".csv"):
         return print_csv
+    if lower_path.endswith((".ndjson", ".jsonl")):
+        return print_ndjson
+    if lower_path.endswith((".sqlite", ".sqlite3", ".db")):
+        return print_sqlite
     return None
 
 
@@ -1080,16 +1746,35 @@ def main(argv=None):
     schema.patch_for_extensions()
     if options.input_file:
         options.paths = auto_read(options.input_file).splitlines()
+    for exclude_file in options.exclude_from:
+        options.exclude = options.exclude + read_exclude_file(exclude_file)
     original_stdout = sys.stdout
     output_file = None
-    result = analyze(
-        options.paths,
-        options.exclude,
-        options.working_threads,
-        options.extensions,
-        options.languages)
+    cache = None
+    if options.cache_dir:
+        cache = ResultCache(options.cache_dir, options.cache_size)
+    try:
+        changed_lines = None
+        if options.diff_lines:
+            changed_lines = load_changed_lines(
+                options.diff_lines, _git_directory(options.paths))
+        result = analyze(
+            options.paths,
+            options.exclude,
+            options.working_threads,
+            options.extensions,
+            options.languages,
+            cache,
+            options.diff,
+            changed_lines)
+    except GitError as error:
+        sys.stderr.write("Error: git diff failed: %s\n" % error)
+        sys.exit(2)
     warning_count = None
-    if options.output_file:
+    if options.output_file and printer is print_sqlite:
+        # the database is written to the output file by the printer
+        warning_count = printer(result, options, schema, AllResult)
+    elif options.output_file:
         output_file = open_output_file(options.output_file)
         sys.stdout = output_file
         # Special handling for checkstyle output
@@ -3,14 +3,22 @@
 from __future__ import print_function
 from .version import version
 from .htmloutput import html_output
+from .htmlreport import html_report
 from .csvoutput import csv_output
-from .xmloutput import xml_output
-from .auto_open import auto_open, auto_read
-from .checkstyleoutput import checkstyle_output
+from .xmloutput import xml_output, write_xml
+from .auto_open import auto_open, auto_read, decode_source
+from .checkstyleoutput import checkstyle_output, write_checkstyle
+from .ndjsonoutput import write_ndjson, function_columns
+from .sqliteoutput import write_sqlite
+from .result_cache import ResultCache
+from .gitdiff import git_changed_files, load_changed_lines, GitError
+from .gitignore import GitIgnore
 
 
-def print_xml(results, options, _, total_factory):
-    print(xml_output(total_factory(list(results)), options.verbose))
+def print_xml(results, options, _, __):
+    import sys
+    write_xml(results, options.verbose, sys.stdout)
+    sys.stdout.write("\n")
     return 0
 
 
@@ -19,14 +27,23 @@ def print_csv(results, options, _, total_factory):
     return 0
 
 
-def print_checkstyle(results, options, _, total_factory, file=None):
+def print_ndjson(results, options, schema, _):
+    # pylint: disable=unused-argument
+    import sys
+    write_ndjson(results, function_columns(schema), sys.stdout)
+    return 0
+
+
+def print_sqlite(results, options, schema, _):
+    write_sqlite(results, function_columns(schema), options.output_file)
+    return 0
+
+
+def print_checkstyle(results, options, _, __, file=None):
     import sys
     print("DEBUG: print_checkstyle called", file=sys.stderr)
-    output = checkstyle_output(total_factory(list(results)), options.verbose)
     if file is None:
         file = sys.stdout
-    file.write(output)
-    if not output.endswith("\n"):
-        file.write("\n")
+    write_checkstyle(results, options.verbose, file)
     file.flush()
     return 0
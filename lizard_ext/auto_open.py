@@ -27,10 +27,17 @@ def auto_open(*args, **kwargs):
 
 
 def auto_read(filename):
-    try:
-        with auto_open(filename, 'r') as current_file:
-            return current_file.read()
+    with io.open(filename, 'rb') as current_file:
+        return decode_source(current_file.read())
+
 
+def decode_source(data):
+    '''
+    Decode the content of a source file read as bytes, the same way
+    auto_open would have read it as text.
+    '''
+    encoding = 'utf-8-sig' if data.startswith(codecs.BOM_UTF8) else None
+    try:
+        return io.TextIOWrapper(io.BytesIO(data), encoding=encoding).read()
     except UnicodeDecodeError:
-        with open(filename, 'rb') as current_file:
-            return current_file.read().decode('utf8', 'ignore')
+        return data.decode('utf8', 'ignore')
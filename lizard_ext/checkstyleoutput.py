@@ -1,31 +1,50 @@
 '''
 Checkstyle XML output for Lizard
+
+The document is written while the results arrive, so memory doesn't
+grow with the number of functions.
 '''
+import io
+
 
 def checkstyle_output(all_result, verbose):
-    result = all_result.result
-    import xml.etree.ElementTree as ET
+    output = io.StringIO()
+    write_checkstyle(all_result.result, verbose, output)
+    return output.getvalue()
 
-    checkstyle = ET.Element('checkstyle', version="4.3")
 
+def write_checkstyle(result, verbose, output):
+    # pylint: disable=unused-argument
+    output.write('<?xml version="1.0" ?>\n')
+    empty = True
     for source_file in result:
-        if source_file:
-            file_elem = ET.SubElement(checkstyle, 'file', name=source_file.filename)
-            for func in source_file.function_list:
-                # Each function with a warning (e.g., CCN > threshold) could be an <error>
-                # For now, output all functions as <error> for demonstration
-                ET.SubElement(
-                    file_elem,
-                    'error',
-                    line=str(func.start_line),
-                    column="0",
-                    severity="info",
-                    message=f"{func.name} has {func.nloc} NLOC, {func.cyclomatic_complexity} CCN, {func.token_count} token, {len(func.parameters)} PARAM, {func.length} length",
-                    source="lizard"
-                )
+        if not source_file:
+            continue
+        if empty:
+            output.write('<checkstyle version="4.3">\n')
+            empty = False
+        if not source_file.function_list:
+            output.write('  <file name="%s"/>\n' % _escape(
+                source_file.filename))
+            continue
+        output.write('  <file name="%s">\n' % _escape(source_file.filename))
+        for func in source_file.function_list:
+            # Each function with a warning (e.g., CCN > threshold) could be an <error>
+            # For now, output all functions as <error> for demonstration
+            message = (
+                f"{func.name} has {func.nloc} NLOC, "
+                f"{func.cyclomatic_complexity} CCN, {func.token_count} token, "
+                f"{len(func.parameters)} PARAM, {func.length} length")
+            output.write(
+                '    <error line="%s" column="0" severity="info" '
+                'message="%s" source="lizard"/>\n' % (
+                    func.start_line, _escape(message)))
+        output.write('  </file>\n')
+    output.write('<checkstyle version="4.3"/>\n' if empty else
+                 '</checkstyle>\n')
+
 
-    # Pretty print
-    import xml.dom.minidom
-    rough_string = ET.tostring(checkstyle, 'utf-8')
-    reparsed = xml.dom.minidom.parseString(rough_string)
-    return reparsed.toprettyxml(indent="  ") 
\ No newline at end of file
+def _escape(text):
+    ''' escape the way minidom writes attributes '''
+    return (text.replace("&", "&amp;").replace("<", "&lt;")
+            .replace("\"", "&quot;").replace(">", "&gt;"))
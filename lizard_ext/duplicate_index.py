@@ -0,0 +1,292 @@
+'''
+An on-disk index of the samples of the duplicate detector.
+
+The duplicate detector keeps a hash and a line range for every token
+of the code base, and groups the samples by hash to find the repeated
+ones. With --duplicate_index, the samples are kept in a SQLite database
+instead, and grouped there:
+
+    files(id, filename, content_key, sample_count, seen)
+    samples(file_id, offset, hash, start_line, end_line)
+
+The database is kept between runs. A file whose samples have the same
+content_key as last time is not written again, the samples of a file
+that changed are replaced, and the files that are gone are removed, so
+a run over a code base where few files changed writes little. The
+index on the hashes is kept up to date by SQLite, so the samples don't
+have to be sorted again either.
+
+The position of a sample is the position of its file in this run plus
+its offset in the file, as for the samples kept in memory. The groups
+of the positions of the repeated hashes are written to temporary
+tables for the run:
+
+    firsts(position, first)     the first sample of the group of every
+                                sample of a repeated hash (NULL when
+                                the sample is collapsed)
+    members(first, position)    the samples of the groups of more than
+                                one sample
+
+The groups are read back in the order of their first sample, and the
+hashes and lines are looked up by position when they are needed, so
+the memory used doesn't depend on the size of the code base.
+'''
+import sqlite3
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import groupby
+
+from .lizardduplicate import indexed_positions
+
+BATCH_SIZE = 10000
+CACHED_FILES = 256
+CACHED_BLOCKS = 256
+BLOCK_SIZE = 4096
+SCHEMA_VERSION = 1
+POPCOUNT = bytes(bin(byte).count('1') for byte in range(256))
+
+
+def content_key(samples):
+    digest = blake2b(digest_size=16)
+    for column in (samples.hashes, samples.start_lines, samples.end_lines):
+        digest.update(column.tobytes())
+    return digest.digest()
+
+
+class SampleStore(object):
+    '''
+    The samples of the files, in the order of cross_file_process.
+    It has the interface of Samples that DuplicateFinder uses.
+    '''
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        if self.connection.execute(
+                "PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._create_tables()
+        self.run = self.connection.execute(
+            "SELECT COALESCE(MAX(seen), 0) + 1 FROM files").fetchone()[0]
+        self.count = 0
+        self.uncommitted = 0
+        self.reused = 0
+        self.bases = array('l')
+        self.file_ids = array('l')
+        self.filenames = []
+        self.start_lines = _Column(self, "start_line")
+        self.end_lines = _Column(self, "end_line")
+
+    def _create_tables(self):
+        with self.connection:
+            self.connection.execute("DROP TABLE IF EXISTS samples")
+            self.connection.execute("DROP TABLE IF EXISTS files")
+            self.connection.execute(
+                "CREATE TABLE files (id INTEGER PRIMARY KEY, "
+                "filename TEXT UNIQUE, content_key BLOB, "
+                "sample_count INTEGER, seen INTEGER)")
+            self.connection.execute(
+                "CREATE TABLE samples (file_id INTEGER, offset INTEGER, "
+                "hash INTEGER, start_line INTEGER, end_line INTEGER, "
+                "PRIMARY KEY (file_id, offset)) WITHOUT ROWID")
+            self.connection.execute(
+                "CREATE INDEX samples_hash ON samples(hash)")
+            self.connection.execute(
+                "PRAGMA user_version = %d" % SCHEMA_VERSION)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, filename, samples):
+        key = content_key(samples)
+        row = self.connection.execute(
+            "SELECT id, content_key FROM files WHERE filename = ?",
+            (filename,)).fetchone()
+        if row is not None and row[1] == key:
+            file_id = row[0]
+            self.reused += 1
+            self.connection.execute(
+                "UPDATE files SET seen = ? WHERE id = ?", (self.run, file_id))
+        else:
+            if row is None:
+                file_id = self.connection.execute(
+                    "INSERT INTO files VALUES (NULL, ?, ?, ?, ?)",
+                    (filename, key, len(samples), self.run)).lastrowid
+            else:
+                file_id = row[0]
+                self.connection.execute(
+                    "DELETE FROM samples WHERE file_id = ?", (file_id,))
+                self.connection.execute(
+                    "UPDATE files SET content_key = ?, sample_count = ?, "
+                    "seen = ? WHERE id = ?",
+                    (key, len(samples), self.run, file_id))
+            self.connection.executemany(
+                "INSERT INTO samples VALUES (?, ?, ?, ?, ?)",
+                zip([file_id] * len(samples), range(len(samples)),
+                    samples.hashes, samples.start_lines, samples.end_lines))
+            self.uncommitted += len(samples)
+        self.bases.append(self.count)
+        self.file_ids.append(file_id)
+        self.filenames.append(filename)
+        self.count += len(samples)
+        if self.uncommitted >= BATCH_SIZE:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def locate(self, position):
+        ''' the (file_id, offset) of a position '''
+        index = bisect_right(self.bases, position) - 1
+        return self.file_ids[index], position - self.bases[index]
+
+    def filename_at(self, position):
+        return self.filenames[bisect_right(self.bases, position) - 1]
+
+    def group_index(self, boundaries, collapse_repeat_tokens):
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM samples WHERE file_id IN "
+                "(SELECT id FROM files WHERE seen != ?)", (self.run,))
+            self.connection.execute(
+                "DELETE FROM files WHERE seen != ?", (self.run,))
+        return StoreIndex(self, boundaries, collapse_repeat_tokens)
+
+    def close(self):
+        self.connection.close()
+
+
+class _Column(object):  # pylint: disable=R0903
+
+    def __init__(self, store, name):
+        self.store = store
+        self.query = ("SELECT %s FROM samples WHERE file_id = ? "
+                      "AND offset = ?" % name)
+
+    def __getitem__(self, position):
+        return self.store.connection.execute(
+            self.query, self.store.locate(position)).fetchone()[0]
+
+
+class StoreIndex(object):
+    '''
+    The samples of a SampleStore grouped by hash, with the interface of
+    MemoryIndex. The samples are read in the order of their hashes from
+    the index on them, and the groups of the repeated hashes are
+    written back in batches. The group firsts are kept in a bitmap.
+    '''
+
+    def __init__(self, store, boundaries, collapse_repeat_tokens):
+        self.store = store
+        connection = self.connection = store.connection
+        connection.execute("DROP TABLE IF EXISTS temp.firsts")
+        connection.execute("DROP TABLE IF EXISTS temp.members")
+        connection.execute(
+            "CREATE TEMP TABLE firsts (position INTEGER PRIMARY KEY, "
+            "first INTEGER)")
+        connection.execute(
+            "CREATE TEMP TABLE members (first INTEGER, position INTEGER)")
+        # the samples are mostly read one after another, so the hashes
+        # of the recent files and the firsts of the recent blocks are
+        # kept, in caches of this index only
+        self._file_hashes = lru_cache(maxsize=CACHED_FILES)(
+            self._read_file_hashes)
+        self._block_firsts = lru_cache(maxsize=CACHED_BLOCKS)(
+            self._read_block_firsts)
+        self.count = 0
+        self.firsts = bytearray((len(store) + 7) // 8)
+        bases = {}
+        for base, file_id in zip(store.bases, store.file_ids):
+            bases.setdefault(file_id, []).append(base)
+        firsts, members = [], []
+        rows = connection.execute(
+            "SELECT hash, file_id, offset FROM samples ORDER BY hash")
+        for _, same in groupby(rows, key=lambda row: row[0]):
+            positions = sorted(base + offset for _, file_id, offset in same
+                               for base in bases[file_id])
+            self.count += 1
+            self._set_first(positions[0])
+            if len(positions) == 1:
+                continue
+            indexed = indexed_positions(
+                positions, boundaries, collapse_repeat_tokens)
+            indexed_set = set(indexed)
+            firsts.extend(
+                (position, indexed[0] if position in indexed_set else None)
+                for position in positions)
+            if len(indexed) > 1:
+                members.extend((indexed[0], position) for position in indexed)
+            if len(firsts) >= BATCH_SIZE:
+                self._write(firsts, members)
+        self._write(firsts, members)
+        connection.execute("CREATE INDEX temp.members_first "
+                           "ON members(first, position)")
+        connection.commit()
+
+    def _set_first(self, position):
+        self.firsts[position >> 3] |= 1 << (position & 7)
+
+    def _write(self, firsts, members):
+        self.connection.executemany(
+            "INSERT INTO firsts VALUES (?, ?)", firsts)
+        self.connection.executemany(
+            "INSERT INTO members VALUES (?, ?)", members)
+        del firsts[:]
+        del members[:]
+
+    def hash_at(self, position):
+        file_id, offset = self.store.locate(position)
+        return self._file_hashes(file_id)[offset]
+
+    def _read_file_hashes(self, file_id):
+        return array('q', (code_hash for code_hash, in self.connection.execute(
+            "SELECT hash FROM samples WHERE file_id = ? ORDER BY offset",
+            (file_id,))))
+
+    def group_first(self, position):
+        if not 0 <= position < len(self.store):
+            return None
+        block = self._block_firsts(position // BLOCK_SIZE)
+        return block.get(position, position)  # not there: a unique hash
+
+    def _read_block_firsts(self, block):
+        return dict(self.connection.execute(
+            "SELECT position, first FROM firsts WHERE position >= ? "
+            "AND position < ?",
+            (block * BLOCK_SIZE, (block + 1) * BLOCK_SIZE)))
+
+    def group_count(self):
+        return self.count
+
+    def candidate_groups(self):
+        rows = self.connection.execute(
+            "SELECT first, position FROM members ORDER BY first, position")
+        for _, group in groupby(rows, key=lambda row: row[0]):
+            yield array('l', (position for _, position in group))
+
+    def firsts_at_ranks(self, ranks):
+        '''
+        The rank-th group firsts in the order of their positions, found
+        by counting the bits of the bitmap.
+        '''
+        found = []
+        ranks = iter(ranks)
+        rank = next(ranks, None)
+        counted = 0
+        for index, bits in enumerate(self.firsts):
+            while rank is not None and rank < counted + POPCOUNT[bits]:
+                found.append(_nth_bit(bits, rank - counted) + index * 8)
+                rank = next(ranks, None)
+            if rank is None:
+                break
+            counted += POPCOUNT[bits]
+        return found
+
+
+def _nth_bit(bits, nth):
+    for bit in range(8):
+        if bits & (1 << bit):
+            if nth == 0:
+                return bit
+            nth -= 1
+    return None
@@ -0,0 +1,157 @@
+'''
+Ask the local git repository which files and lines changed in a
+revision range.
+'''
+import io
+import os
+import re
+import subprocess
+import sys
+from bisect import bisect_right
+
+
+class GitError(Exception):
+    pass
+
+
+def _git(directory, *args):
+    try:
+        return subprocess.check_output(
+            ('git', '-C', directory) + args,
+            stderr=subprocess.PIPE).decode('utf-8', 'replace')
+    except subprocess.CalledProcessError as error:
+        raise GitError(error.stderr.decode('utf-8', 'replace').strip())
+    except OSError as error:
+        raise GitError("cannot run git: %s" % error)
+
+
+def _split_z(output):
+    return [name for name in output.split('\0') if name]
+
+
+def git_changed_files(rev_range, directory='.'):
+    '''
+    Return the existing files changed in rev_range, e.g. "main..HEAD".
+    A single revision compares it to the working tree, in which case
+    untracked (but not ignored) files count as changed too.
+    The paths are relative to the current working directory.
+    '''
+    root = _git(directory, 'rev-parse', '--show-toplevel').strip()
+    names = _split_z(_git(
+        root, 'diff', '--name-only', '-z', '--no-renames',
+        '--diff-filter=d', rev_range, '--'))
+    if '..' not in rev_range:
+        names += _split_z(_git(
+            root, 'ls-files', '-z', '--others', '--exclude-standard'))
+    return [os.path.relpath(os.path.join(root, name)) for name in names]
+
+
+HUNK_HEADER = re.compile(
+    r'^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+def _diff_file_name(header):
+    name = header[4:].split('\t')[0].strip()
+    if name == '/dev/null':
+        return None
+    if name.startswith('b/'):
+        name = name[2:]
+    return name
+
+
+def parse_unified_diff(lines, root=''):
+    '''
+    Return {file name: [(first line, last line), ...]} of the lines on
+    the new side of a unified diff. A hunk that only deletes lines marks
+    the lines around the deletion.
+    The lines of a hunk are counted down by the numbers in its header,
+    so only the lines between the hunks can be file headers, and an
+    added line starting with "++ " is not one.
+    '''
+    changes = {}
+    current = None
+    old_left = new_left = 0
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if old_left > 0 or new_left > 0:
+            if line.startswith('-'):
+                old_left -= 1
+            elif line.startswith('+'):
+                new_left -= 1
+            elif not line.startswith('\\'):  # "\ No newline at end of file"
+                old_left -= 1
+                new_left -= 1
+            continue
+        if line.startswith('+++ '):
+            name = _diff_file_name(line)
+            current = None
+            if name is not None:
+                name = os.path.relpath(os.path.join(root, name))
+                current = changes.setdefault(name, [])
+            continue
+        match = HUNK_HEADER.match(line)
+        if match:
+            old_left = int(match.group(1) or 1)
+            start = int(match.group(2))
+            count = new_left = int(match.group(3) or 1)
+            if current is None:
+                continue
+            if count:
+                current.append((start, start + count - 1))
+            else:
+                current.append((max(start, 1), start + 1))
+    return changes
+
+
+class ChangedLines(object):
+    '''
+    Index of the changed line ranges of each file. The ranges of a file
+    are merged and sorted, so finding out whether a function overlaps
+    any of them is a binary search instead of a scan over the hunks.
+    '''
+
+    def __init__(self, changes):
+        self.index = {}
+        for name, ranges in changes.items():
+            merged = []
+            for start, end in sorted(ranges):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self.index[os.path.abspath(name)] = (
+                [start for start, _ in merged], [end for _, end in merged])
+        self.names = list(changes)
+
+    def files(self):
+        return self.names
+
+    def overlaps(self, filename, start_line, end_line):
+        try:
+            starts, ends = self.index[os.path.abspath(filename)]
+        except KeyError:
+            return False
+        i = bisect_right(starts, end_line)
+        return i > 0 and ends[i - 1] >= start_line
+
+
+def load_changed_lines(diff, directory='.'):
+    '''
+    diff is either a unified diff file ("-" for stdin) or a git
+    revision range. The paths in a diff file are relative to the top
+    level of the git repository of directory, if there is one.
+    '''
+    if diff == '-' or os.path.isfile(diff):
+        try:
+            root = _git(directory, 'rev-parse', '--show-toplevel').strip()
+        except GitError:
+            root = ''
+        if diff == '-':
+            return ChangedLines(parse_unified_diff(sys.stdin, root))
+        with io.open(diff, encoding='utf-8', errors='replace') as patch:
+            return ChangedLines(parse_unified_diff(patch, root))
+    root = _git(directory, 'rev-parse', '--show-toplevel').strip()
+    output = _git(root, 'diff', '-U0', '--no-color', '--no-renames',
+                  '--no-ext-diff', '--src-prefix=a/', '--dst-prefix=b/',
+                  diff, '--')
+    return ChangedLines(parse_unified_diff(output.splitlines(), root))
@@ -0,0 +1,231 @@
+'''
+Git ignore rules, applied the way git applies them to a work tree.
+
+Every directory may have a .gitignore file whose patterns are relative
+to that directory, and the rules of a deeper directory take precedence
+over the rules of the directories above it. The patterns in
+.git/info/exclude apply to the whole repository with the lowest
+precedence. Within a file the last matching pattern wins, so a pattern
+starting with "!" re-includes what an earlier pattern excluded.
+
+The patterns of each file are compiled into one combined regular
+expression for directories and one for files, so checking a path
+against a file costs a single match however many patterns it has.
+The files are loaded lazily, as the walk reaches their directories.
+'''
+import io
+import os
+import re
+
+GITIGNORE = '.gitignore'
+
+
+def translate(glob):
+    '''
+    Translate the glob of a gitignore pattern to a regular expression
+    without capturing groups.
+    '''
+    i, length = 0, len(glob)
+    result = []
+    while i < length:
+        char = glob[i]
+        if glob.startswith('**', i) and (i == 0 or glob[i - 1] == '/'):
+            if i + 2 == length:  # "dir/**": everything inside
+                result.append('.*')
+                i += 2
+                continue
+            if glob[i + 2] == '/':  # "**/": zero or more directories
+                result.append('(?:.*/)?')
+                i += 3
+                continue
+        if char == '*':
+            while i < length and glob[i] == '*':
+                i += 1
+            result.append('[^/]*')
+            continue
+        if char == '?':
+            result.append('[^/]')
+        elif char == '[':
+            end = _class_end(glob, i)
+            if end < 0:
+                result.append(re.escape(char))
+            else:
+                content = glob[i + 1:end].replace('\\', '\\\\') \
+                    .replace('[', '\\[')
+                if content[0] in '!^':
+                    content = '^' + content[1:]
+                result.append('[' + content + ']')
+                i = end
+        elif char == '\\' and i + 1 < length:
+            i += 1
+            result.append(re.escape(glob[i]))
+        else:
+            result.append(re.escape(char))
+        i += 1
+    return ''.join(result)
+
+
+def _class_end(glob, start):
+    i = start + 1
+    if i < len(glob) and glob[i] in '!^':
+        i += 1
+    if i < len(glob) and glob[i] == ']':
+        i += 1
+    return glob.find(']', i)
+
+
+def parse_pattern(line):
+    '''
+    Returns (regex, negated, directory only) for a line of an ignore
+    file, or None for blank lines and comments.
+    '''
+    line = line.rstrip('\r\n')
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+    if not line or line.startswith('#'):
+        return None
+    negated = line.startswith('!')
+    if negated:
+        line = line[1:]
+    directory_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    anchored = '/' in line
+    regex = translate(line.lstrip('/'))
+    if not anchored:
+        regex = '(?:.*/)?' + regex
+    return regex, negated, directory_only
+
+
+class IgnoreRules(object):
+    '''
+    The compiled patterns of one ignore file.
+    '''
+
+    def __init__(self, lines):
+        patterns = [p for p in (parse_pattern(line) for line in lines) if p]
+        self.for_directories = _combine(patterns)
+        self.for_files = _combine([p for p in patterns if not p[2]])
+
+    def match(self, path, is_dir=False):
+        '''
+        Returns True if the last matching pattern ignores path, False if
+        it re-includes path and None if no pattern matches. path is
+        relative to the directory of the ignore file and uses "/".
+        '''
+        combined = self.for_directories if is_dir else self.for_files
+        if combined is None:
+            return None
+        regex, negated = combined
+        match = regex.match(path)
+        if match is None:
+            return None
+        return not negated[match.lastindex]
+
+
+def _combine(patterns):
+    if not patterns:
+        return None
+    patterns = patterns[::-1]  # the first alternative that matches wins
+    regex = re.compile(
+        '(?:' + '|'.join('(%s)' % p[0] for p in patterns) + r')\Z', re.S)
+    return regex, [None] + [p[1] for p in patterns]
+
+
+def load_rules(path):
+    try:
+        with io.open(path, encoding='utf-8', errors='replace') as rules:
+            return IgnoreRules(rules.read().splitlines())
+    except (IOError, OSError):
+        return None
+
+
+def find_repository(directory):
+    '''
+    Returns the root of the git work tree that contains directory, or
+    None.
+    '''
+    directory = os.path.abspath(directory)
+    while True:
+        if os.path.exists(os.path.join(directory, '.git')):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+class GitIgnore(object):
+    '''
+    Tells whether the paths found while walking top are ignored by git.
+    The paths must be made by joining names to top, as a walk of top
+    does. The .gitignore files of the directories between the root of
+    the repository and top apply too.
+    '''
+
+    def __init__(self, top):
+        self.top = self._key(top)
+        self.levels = {self.top: self._top_levels(top)}
+
+    @staticmethod
+    def _key(directory):
+        return directory.rstrip(os.sep) or directory
+
+    def _top_levels(self, top):
+        strip = len(os.path.join(top, ''))
+        levels = []
+        root = find_repository(top)
+        if root is not None:
+            ancestors = []
+            directory = os.path.abspath(top)
+            while True:
+                ancestors.append(directory)
+                if directory == root:
+                    break
+                directory = os.path.dirname(directory)
+            exclude = load_rules(os.path.join(root, '.git', 'info', 'exclude'))
+            candidates = [(root, exclude)] + [
+                (d, load_rules(os.path.join(d, GITIGNORE)))
+                for d in reversed(ancestors)]
+            for directory, rules in candidates:
+                if rules is not None:
+                    prefix = os.path.relpath(os.path.abspath(top), directory)
+                    prefix = '' if prefix == '.' else _slashed(prefix) + '/'
+                    levels.append((prefix, strip, rules))
+        else:
+            rules = load_rules(os.path.join(top, GITIGNORE))
+            if rules is not None:
+                levels.append(('', strip, rules))
+        return levels
+
+    def _levels(self, directory):
+        key = self._key(directory)
+        levels = self.levels.get(key)
+        if levels is None:
+            parent = os.path.dirname(key)
+            if parent == key or not key:
+                return self.levels[self.top]
+            levels = self._levels(parent)
+            rules = load_rules(os.path.join(directory, GITIGNORE))
+            if rules is not None:
+                levels = levels + [
+                    ('', len(os.path.join(directory, '')), rules)]
+            self.levels[key] = levels
+        return levels
+
+    def ignored(self, path, is_dir=False):
+        if is_dir and os.path.basename(path) == '.git':
+            return True
+        for prefix, strip, rules in reversed(
+                self._levels(os.path.dirname(path))):
+            result = rules.match(prefix + _slashed(path[strip:]), is_dir)
+            if result is not None:
+                return result
+        return False
+
+
+def _slashed(path):
+    return path.replace(os.sep, '/') if os.sep != '/' else path
@@ -0,0 +1,392 @@
+'''
+A HTML report that stays usable for code bases of any size.
+
+--html renders one table row per function into a single page, which
+becomes too big for the browser on large code bases. This report is a
+directory instead:
+
+    index.html       the page, with the summary of every source
+                     directory and the most complex functions
+    data/<n>.js      the functions of one directory, in shards of at
+                     most SHARD_SIZE functions
+
+The page only loads the shard of the directory being looked at, one
+shard at a time, and shows its functions a page at a time; the shards
+it doesn't show any more are dropped, so a directory of any size is
+never loaded at once. Shards are JavaScript files that
+hand their data to the page, so the report also works when opened
+from the local disk.
+
+The report is written while the results arrive. Functions are buffered
+per directory and a shard is written once it is full, or when too many
+functions are buffered in total, so the memory used doesn't depend on
+the size of the code base.
+'''
+import datetime
+import heapq
+import io
+import json
+import os
+
+SHARD_SIZE = 2000
+MAX_BUFFERED_FUNCTIONS = 50000
+WORST_FUNCTIONS = 100
+COLUMNS = ["name", "start_line", "nloc", "cyclomatic_complexity",
+           "token_count", "parameter_count", "length"]
+
+
+def html_report(result, options, *_):
+    report = HtmlReport(options.html_dir, options.thresholds)
+    for source_file in result:
+        if source_file:
+            report.add(source_file)
+    report.close()
+    print("HTML report written to %s" %
+          os.path.join(options.html_dir, "index.html"))
+    return 0
+
+
+class _DirectorySummary(object):  # pylint: disable=R0903
+
+    def __init__(self):
+        self.files = 0
+        self.functions = 0
+        self.nloc = 0
+        self.ccn = 0
+        self.max_ccn = 0
+        self.warnings = 0
+        self.shards = []
+
+    def as_row(self, name):
+        return [name, self.files, self.functions, self.nloc, self.ccn,
+                self.max_ccn, self.warnings, self.shards]
+
+
+class HtmlReport(object):
+
+    def __init__(self, report_dir, thresholds,
+                 shard_size=SHARD_SIZE,
+                 max_buffered=MAX_BUFFERED_FUNCTIONS):
+        self.report_dir = report_dir
+        self.data_dir = os.path.join(report_dir, "data")
+        if not os.path.isdir(self.data_dir):
+            os.makedirs(self.data_dir)
+        self.thresholds = dict(thresholds)
+        self.shard_size = shard_size
+        self.max_buffered = max_buffered
+        self.directories = {}
+        self.buffers = {}  # directory -> (file names, function rows)
+        self.buffered = 0
+        self.shard_count = 0
+        self.worst = []
+        self.order = 0
+
+    def add(self, source_file):
+        directory = os.path.dirname(source_file.filename) or "."
+        summary = self.directories.get(directory)
+        if summary is None:
+            summary = self.directories[directory] = _DirectorySummary()
+        summary.files += 1
+        summary.nloc += source_file.nloc
+        if not source_file.function_list:
+            return
+        files, rows = self.buffers.setdefault(directory, ([], []))
+        file_index = len(files)
+        files.append(source_file.filename)
+        for func in source_file.function_list:
+            row = [file_index] + [getattr(func, c) for c in COLUMNS]
+            rows.append(row)
+            summary.functions += 1
+            summary.ccn += func.cyclomatic_complexity
+            summary.max_ccn = max(summary.max_ccn, func.cyclomatic_complexity)
+            if self._exceeds_thresholds(func):
+                summary.warnings += 1
+            self._rank(source_file.filename, row)
+            self.buffered += 1
+            if len(rows) >= self.shard_size:
+                self._flush(directory)
+                files, rows = self.buffers.setdefault(
+                    directory, ([source_file.filename], []))
+                file_index = 0
+        while self.buffered > self.max_buffered:
+            self._flush(max(self.buffers,
+                            key=lambda d: len(self.buffers[d][1])))
+
+    def _exceeds_thresholds(self, func):
+        return any(getattr(func, attr, 0) > limit
+                   for attr, limit in self.thresholds.items())
+
+    def _rank(self, filename, row):
+        self.order += 1
+        entry = (row[4], -self.order, [filename] + row[1:])
+        if len(self.worst) < WORST_FUNCTIONS:
+            heapq.heappush(self.worst, entry)
+        elif entry > self.worst[0]:
+            heapq.heapreplace(self.worst, entry)
+
+    def _flush(self, directory):
+        files, rows = self.buffers.pop(directory)
+        if not rows:
+            return
+        shard = self.shard_count
+        self.shard_count += 1
+        self.buffered -= len(rows)
+        self.directories[directory].shards.append(shard)
+        _write_script(
+            os.path.join(self.data_dir, "%d.js" % shard),
+            "lizardShard(%d, %s);\n" % (
+                shard, _to_json({"files": files, "rows": rows})))
+
+    def summary(self):
+        names = sorted(self.directories)
+        directories = [self.directories[name].as_row(name) for name in names]
+        functions = sum(d.functions for d in self.directories.values())
+        return {
+            "title": "Lizard code complexity report",
+            "date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M'),
+            "columns": COLUMNS,
+            "thresholds": self.thresholds,
+            "totals": {
+                "files": sum(d.files for d in self.directories.values()),
+                "functions": functions,
+                "nloc": sum(d.nloc for d in self.directories.values()),
+                "ccn": sum(d.ccn for d in self.directories.values()),
+                "warnings": sum(
+                    d.warnings for d in self.directories.values())},
+            "directories": directories,
+            "worst": [row for _, _, row in sorted(self.worst, reverse=True)]
+        }
+
+    def close(self):
+        for directory in list(self.buffers):
+            self._flush(directory)
+        _write_script(os.path.join(self.report_dir, "index.html"),
+                      TEMPLATE.replace("__SUMMARY__", _to_json(self.summary())))
+
+
+def _to_json(data):
+    # "</" would end the script element the data is embedded in
+    return json.dumps(data, separators=(",", ":")).replace("</", "<\\/")
+
+
+def _write_script(path, content):
+    with io.open(path, "w", encoding="utf-8") as output:
+        output.write(content)
+
+
+TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Code complexity report</title>
+<style>
+  body { font-family: sans-serif; margin: 1em 2em; }
+  h2 { text-align: center; }
+  table { border-collapse: collapse; margin: 0.5em 0; }
+  th { background-color: LightBlue; cursor: pointer; padding: 2px 8px; }
+  td { padding: 2px 8px; text-align: center; white-space: nowrap; }
+  td.name { text-align: left; background-color: LightSteelBlue; }
+  td.greater-value { background-color: LightPink; }
+  td.lesser-value { background-color: LightGreen; }
+  tr.directory { cursor: pointer; }
+  tr.directory:hover td { background-color: #eef; }
+  .pager button { margin: 0 2px; }
+  .footer { text-align: center; padding-top: 1em; }
+</style>
+</head>
+<body>
+<h2>Code Complexity Report</h2>
+<div id="totals"></div>
+<h3>Most complex functions</h3>
+<div id="worst"></div>
+<h3>Directories</h3>
+<input id="filter" placeholder="filter directories">
+<div id="directories"></div>
+<h3 id="functions-title"></h3>
+<div id="functions"></div>
+<div class="footer">Generated by <a href="http://www.lizard.ws/">Lizard</a>
+on <span id="date"></span></div>
+<script>
+var SUMMARY = __SUMMARY__;
+var PAGE_SIZE = 100;
+var CAPTIONS = {
+  name: "Function name", start_line: "Line", nloc: "NLOC",
+  cyclomatic_complexity: "CCN", token_count: "Tokens",
+  parameter_count: "Params", length: "Length", file: "File",
+  directory: "Directory", files: "Files", functions: "Functions",
+  ccn: "CCN sum", max_ccn: "Max CCN", warnings: "Warnings"
+};
+var shards = {};
+var shardWaiters = {};
+var shownRequest = 0;
+
+function lizardShard(id, data) {
+  shards[id] = data;
+  (shardWaiters[id] || []).forEach(function (done) { done(); });
+  delete shardWaiters[id];
+}
+
+function loadShard(id, done) {
+  if (shards[id]) { done(); return; }
+  if (shardWaiters[id]) { shardWaiters[id].push(done); return; }
+  shardWaiters[id] = [done];
+  var script = document.createElement("script");
+  script.id = "shard-" + id;
+  script.src = "data/" + id + ".js";
+  document.head.appendChild(script);
+}
+
+function forgetShards(keep) {
+  Object.keys(shards).forEach(function (id) {
+    if (Number(id) === keep) { return; }
+    delete shards[id];
+    var script = document.getElementById("shard-" + id);
+    if (script) { script.parentNode.removeChild(script); }
+  });
+}
+
+function element(tag, text, className) {
+  var node = document.createElement(tag);
+  if (text !== undefined) { node.textContent = text; }
+  if (className) { node.className = className; }
+  return node;
+}
+
+function cell(column, value) {
+  var limit = SUMMARY.thresholds[column];
+  if (column === "name" || column === "file" || column === "directory") {
+    return element("td", value, "name");
+  }
+  if (limit === undefined) { return element("td", value); }
+  return element("td", value, value > limit ? "greater-value" : "lesser-value");
+}
+
+/* A table that renders one page of rows at a time. */
+function PagedTable(container, columns, rows, onClick) {
+  this.container = container;
+  this.columns = columns;
+  this.rows = rows;
+  this.onClick = onClick;
+  this.page = 0;
+  this.sortColumn = -1;
+  this.render();
+}
+
+PagedTable.prototype.sortBy = function (index) {
+  var descending = this.sortColumn !== index;
+  this.sortColumn = descending ? index : -1;
+  this.rows.sort(function (a, b) {
+    var order = a[index] < b[index] ? -1 : a[index] > b[index] ? 1 : 0;
+    return descending ? -order : order;
+  });
+  this.page = 0;
+  this.render();
+};
+
+PagedTable.prototype.render = function () {
+  var self = this;
+  var pages = Math.max(1, Math.ceil(this.rows.length / PAGE_SIZE));
+  var table = element("table");
+  var header = element("tr");
+  this.columns.forEach(function (column, index) {
+    var th = element("th", CAPTIONS[column] || column);
+    th.onclick = function () { self.sortBy(index); };
+    header.appendChild(th);
+  });
+  table.appendChild(header);
+  this.rows.slice(this.page * PAGE_SIZE, (this.page + 1) * PAGE_SIZE)
+    .forEach(function (row) {
+      var tr = element("tr");
+      self.columns.forEach(function (column, index) {
+        tr.appendChild(cell(column, row[index]));
+      });
+      if (self.onClick) {
+        tr.className = "directory";
+        tr.onclick = function () { self.onClick(row); };
+      }
+      table.appendChild(tr);
+    });
+  var pager = element("div", undefined, "pager");
+  function button(label, page) {
+    var b = element("button", label);
+    b.disabled = page < 0 || page >= pages || page === self.page;
+    b.onclick = function () { self.page = page; self.render(); };
+    pager.appendChild(b);
+  }
+  button("<<", 0);
+  button("<", this.page - 1);
+  pager.appendChild(element("span",
+    " page " + (this.page + 1) + " of " + pages +
+    " (" + this.rows.length + " rows) "));
+  button(">", this.page + 1);
+  button(">>", pages - 1);
+  this.container.textContent = "";
+  this.container.appendChild(table);
+  if (pages > 1) { this.container.appendChild(pager); }
+};
+
+/* Shows the functions of one shard of a directory, with buttons to
+   page through its other shards. */
+function showDirectory(directory, part) {
+  var name = directory[0], ids = directory[7];
+  var title = document.getElementById("functions-title");
+  var container = document.getElementById("functions");
+  var request = ++shownRequest;
+  part = part || 0;
+  title.textContent = "Functions in " + name;
+  if (!ids.length) { container.textContent = "no functions"; return; }
+  if (ids.length > 1) {
+    title.textContent += " (part " + (part + 1) + " of " + ids.length + ")";
+  }
+  container.textContent = "loading...";
+  loadShard(ids[part], function () {
+    if (request !== shownRequest) { return; }
+    var shard = shards[ids[part]];
+    var rows = shard.rows.map(function (row) {
+      return [shard.files[row[0]]].concat(row.slice(1));
+    });
+    var table = element("div");
+    container.textContent = "";
+    container.appendChild(table);
+    new PagedTable(table, ["file"].concat(SUMMARY.columns), rows);
+    if (ids.length > 1) {
+      var pager = element("div", undefined, "pager");
+      [["previous part", part - 1], ["next part", part + 1]].forEach(
+        function (target) {
+          var b = element("button", target[0]);
+          b.disabled = target[1] < 0 || target[1] >= ids.length;
+          b.onclick = function () { showDirectory(directory, target[1]); };
+          pager.appendChild(b);
+        });
+      container.appendChild(pager);
+    }
+    forgetShards(ids[part]);
+  });
+}
+
+function showDirectories(filter) {
+  var rows = SUMMARY.directories.filter(function (d) {
+    return d[0].indexOf(filter) >= 0;
+  });
+  new PagedTable(document.getElementById("directories"),
+    ["directory", "files", "functions", "nloc", "ccn", "max_ccn",
+     "warnings"], rows, showDirectory);
+}
+
+var totals = SUMMARY.totals;
+document.getElementById("date").textContent = SUMMARY.date;
+document.getElementById("totals").textContent =
+  totals.files + " files, " + totals.functions + " functions, " +
+  totals.nloc + " NLOC, average CCN " +
+  (totals.functions ? (totals.ccn / totals.functions).toFixed(2) : 0) +
+  ", " + totals.warnings + " warnings";
+new PagedTable(document.getElementById("worst"),
+  ["file"].concat(SUMMARY.columns), SUMMARY.worst);
+showDirectories("");
+document.getElementById("filter").oninput = function () {
+  showDirectories(this.value);
+};
+</script>
+</body>
+</html>
+'''
@@ -1,12 +1,101 @@
 '''
 This is an extension of lizard, that counts the amount of dependencies
 within the code.
+
+With --import_graph FILE, it also collects the modules that every file
+includes or imports, and writes the import graph as an adjacency list,
+one line per file:
+
+    <file>\t<import>\t<import>...
+
+An import is written as the path of the analyzed file it names when
+there is exactly one, e.g. "foo/bar.h" or "pkg.mod" for src/pkg/mod.py,
+and as it is written in the code otherwise.
 '''
+import io
+import os
+
+
+class _ImportScanner(object):
+    '''
+    Reads the names of the modules of #include, import and
+    from ... import statements, e.g. "foo/bar.h", "os.path", "java.util",
+    or "./mod" for a JavaScript import from a string.
+    '''
+
+    def __init__(self):
+        self.modules = {}  # ordered set
+        self.expecting = None
+        self.name = ''
+        self.pending = None
+
+    def feed(self, token):
+        if self.expecting == '#include':
+            self.modules[token.strip('<>"')] = None
+            self.expecting = None
+        elif self.expecting in ('import', 'from'):
+            self._read_name(token)
+        elif self.expecting == 'as':
+            self.expecting = 'import'  # skip the alias
+        elif token in ('#include', 'import', 'from'):
+            self.expecting = token
+            self.name = ''
+
+    def _read_name(self, token):
+        if self.pending is not None and (self.name or token[0] not in '"\''):
+            # "import a" followed by Python's "from b import c"
+            self._add(self.pending)
+        if not self.name and token[0] in ('"', "'"):
+            self.modules[token.strip('"\'')] = None
+            self.expecting = None
+        elif token == 'static' and not self.name:
+            pass  # Java's import static
+        elif token == '.' or (not self.name or self.name.endswith('.')) \
+                and (token[0].isalpha() or token[0] == '_') \
+                and token not in ('import', 'from'):
+            self.name += token
+        elif self.expecting == 'import' and token == 'from' and self.name:
+            # JavaScript's "import a from 'b'" unless a module name follows
+            self.pending, self.name, self.expecting = self.name, '', 'from'
+            return
+        else:
+            if self.expecting == 'import' or token == 'import':
+                self._add(self.name)  # not e.g. "yield from x"
+            self.name = ''
+            if self.expecting == 'import' and token in (',', 'as'):
+                self.expecting = 'import' if token == ',' else 'as'
+            elif self.expecting == 'from' and token == 'import':
+                self.expecting = None  # the names imported are not modules
+            else:
+                self.expecting = None
+                self.feed(token)
+        self.pending = None
+
+    def _add(self, name):
+        if name:
+            self.modules[name.rstrip('.') or name] = None
 
 
 class LizardExtension(object):  # pylint: disable=R0903
     FUNCTION_INFO = {"dependency_count": {"caption": " dep cnt "}}
 
+    def __init__(self):
+        self.graph_path = None
+        self.graph = {}
+
+    @staticmethod
+    def set_args(parser):
+        parser.add_argument(
+            "--import_graph",
+            help='''Write the graph of the files and the modules they
+            include or import to this file, as an adjacency list.
+            ''',
+            dest="import_graph",
+            default=None)
+
+    def set_options(self, options):
+        self.graph_path = getattr(options, "import_graph", None)
+
     def __call__(self, tokens, reader):
         ignored_list = {','}
         dependency_type = {
@@ -15,21 +104,23 @@ class LizardExtension(object):  # pylint: disable=R0903
             'import': 2,
             'python_import_as_change': 3}
         expect_dependency = 0
-        import_list = []
+        import_list = set()
         import_as_list = []
         import_as_counter = 0
+        scanner = _ImportScanner()
         for token in tokens:
             if not hasattr(reader.context.current_function,
                            "dependency_count"):
                 reader.context.current_function.dependency_count = 0
+            scanner.feed(token)
             # this accounts for java, c, c++ and python's import
             if token in ("import", "#include"):
                 if import_as_list != []:
-                    import_list.append(import_as_list)
+                    import_list.add(tuple(import_as_list))
                 expect_dependency = dependency_type[token]
             elif expect_dependency == dependency_type['#include']:
                 # gets rid of the <> or "" as well as the .h
-                import_list += [token[1:len(token) - 3]]
+                import_list.add(token[1:len(token) - 3])
                 expect_dependency = dependency_type['null']
             elif expect_dependency == dependency_type['import']:
                 if token == "as":
@@ -38,7 +129,7 @@ class LizardExtension(object):  # pylint: disable=R0903
                     import_as_counter = len(import_as_list)
                     import_as_list = []
                 elif import_as_counter > 4:
-                    import_list += [import_as_list[0]]
+                    import_list.add(import_as_list[0])
                     import_as_list = []
                     import_as_counter = 0
                     expect_dependency = dependency_type['null']
@@ -49,9 +140,89 @@ class LizardExtension(object):  # pylint: disable=R0903
                   dependency_type['python_import_as_change'] and
                   token not in ignored_list):
                 import_as_counter -= 1
-                import_list += [token]
+                import_list.add(token)
                 if import_as_counter == 0:
                     expect_dependency = dependency_type['null']
             if token in import_list:
                 reader.context.current_function.dependency_count += 1
             yield token
+        for func in reader.context.fileinfo.function_list:
+            if not hasattr(func, "dependency_count"):  # e.g. no tokens seen
+                func.dependency_count = 0
+        reader.context.fileinfo.imports = list(scanner.modules)
+
+    def cross_file_process(self, fileinfos):
+        for fileinfo in fileinfos:
+            if self.graph_path is not None:
+                self.graph[fileinfo.filename] = getattr(
+                    fileinfo, "imports", [])
+            yield fileinfo
+
+    def print_result(self):
+        if self.graph_path is None:
+            return
+        edges = write_import_graph(self.graph, self.graph_path)
+        print("Import graph of %d files and %d imports written to %s" % (
+            len(self.graph), edges, self.graph_path))
+
+
+def _module_keys(filename):
+    '''
+    The names a file can be included or imported by: the trailing parts
+    of its path, with and without the extension, and for a package
+    (__init__.py) the path of its directory.
+    '''
+    parts = filename.replace(os.sep, '/').split('/')
+    stem = os.path.splitext(parts[-1])[0]
+    keys = []
+    for start in range(len(parts) - 1, -1, -1):
+        directory = parts[start:-1]
+        keys.append('/'.join(directory + [parts[-1]]))
+        keys.append('/'.join(directory + [stem]))
+        if stem == '__init__' and directory:
+            keys.append('/'.join(directory))
+    return keys
+
+
+def _relative_key(filename, module):
+    '''
+    The path of a relative Python import, e.g. "..a.b" from x/y/c.py is
+    x/a/b.
+    '''
+    name = module.lstrip('.')
+    levels = len(module) - len(name)
+    if not levels:
+        return None
+    parts = filename.replace(os.sep, '/').split('/')[:-levels]
+    return '/'.join(parts + name.split('.') if name else parts)
+
+
+def resolve_imports(graph):
+    '''
+    Maps every import to the analyzed file it names, when only one
+    does. Returns {file: [file or module name]}.
+    '''
+    files_by_key = {}
+    for filename in graph:
+        for key in set(_module_keys(filename)):
+            files_by_key.setdefault(key, set()).add(filename)
+    resolved = {}
+    for filename, imports in graph.items():
+        targets = []
+        for module in imports:
+            files = files_by_key.get(_relative_key(filename, module)) or \
+                files_by_key.get(module) or \
+                files_by_key.get(module.replace('.', '/'), ())
+            targets.append(next(iter(files)) if len(files) == 1 else module)
+        resolved[filename] = targets
+    return resolved
+
+
+def write_import_graph(graph, path):
+    edges = 0
+    with io.open(path, 'w', encoding='utf-8') as output:
+        for filename, targets in resolve_imports(graph).items():
+            edges += len(targets)
+            output.write('\t'.join([filename] + targets))
+            output.write('\n')
+    return edges
@@ -2,10 +2,13 @@
 Get Duplicated parameter lists
 '''
 from __future__ import print_function
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import deque
-from itertools import groupby
-from .default_ordered_dict import DefaultOrderedDict
+from hashlib import blake2b
+from itertools import accumulate, chain, groupby
 from .extension_base import ExtensionBase
+from .near_miss import DEFAULT_SIMILARITY, NearMissFinder, shingle_hashes, signature
 
 
 class CodeSnippet(object):
@@ -27,26 +30,42 @@ class CodeSnippet(object):
         pass
 
 
-class Sequence(object):
-    def __init__(self, start_line):
-        self.hash = ''
-        self.start_line = self.end_line = start_line
+class Samples(object):
+    '''
+    The hashes and line ranges of the samples of token sequences, kept
+    in parallel arrays.
+    '''
 
-    def append_token(self, unified_token, end_line):
-        self.hash += unified_token
-        self.end_line = end_line
+    def __init__(self):
+        self.hashes = array('q')
+        self.start_lines = array('l')
+        self.end_lines = array('l')
+        self.shards = None
 
-    def __str__(self):
-        return "<%s-%s: %s>" % (self.start_line, self.end_line, self.hash)
+    def __len__(self):
+        return len(self.hashes)
 
-    def __repr__(self):
-        return str(self)
+    def extend(self, samples):
+        self.hashes.extend(samples.hashes)
+        self.start_lines.extend(samples.start_lines)
+        self.end_lines.extend(samples.end_lines)
+
+    def shard(self, count):
+        '''
+        Splits the samples by hash into count (hashes, offsets) shards.
+        '''
+        shards = [(array('q'), array('l')) for _ in range(count)]
+        for offset, code_hash in enumerate(self.hashes):
+            hashes, offsets = shards[code_hash % count]
+            hashes.append(code_hash)
+            offsets.append(offset)
+        return shards
 
 
 class InvolvingScope(object):
-    def __init__(self, boundaries, keyfunc):
+    def __init__(self, boundaries, keyfunc, dup_starts=None):
         self.current_file_duplicates = []
-        self.dup_starts = set()
+        self.dup_starts = set() if dup_starts is None else dup_starts
         self.boundaries = boundaries
         self.keyfunc = keyfunc
 
@@ -90,7 +109,140 @@ class InvolvingScope(object):
             for dup in self.current_file_duplicates)
 
 
+def indexed_positions(same, boundaries, collapse_repeat_tokens):
+    '''
+    Returns the positions of the samples with the same hash that are
+    indexed: a sample is not when the same hash also starts one of the
+    collapse_repeat_tokens samples before it in the same file.
+    '''
+    indexed = [same[0]]
+    for previous, position in zip(same, same[1:]):
+        if (position - previous > collapse_repeat_tokens or
+                bisect_right(boundaries, previous) !=
+                bisect_right(boundaries, position)):
+            indexed.append(position)
+    return indexed
+
+
+def _reduce_shard(shard):
+    '''
+    Groups the samples of a shard by hash. A shard is a list of
+    (base, hashes, offsets) chunks in the order of the samples, where
+    offsets are relative to base (None for 0, 1, 2...). Returns the
+    sorted positions of the hashes that are indexed once, and the
+    positions of the others.
+    '''
+    chunks, boundaries, collapse_repeat_tokens = shard
+    positions = {}
+    for base, hashes, offsets in chunks:
+        for offset, code_hash in zip(
+                range(len(hashes)) if offsets is None else offsets, hashes):
+            positions.setdefault(code_hash, []).append(base + offset)
+    singles = array('l')
+    groups = []
+    for same in positions.values():
+        indexed = indexed_positions(same, boundaries, collapse_repeat_tokens)
+        if len(indexed) == 1:
+            singles.append(indexed[0])
+        else:
+            groups.append(array('l', indexed))
+    return array('l', sorted(singles)), groups
+
+
+def _map_shards(shards, processes):
+    if processes > 1 and len(shards) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(min(processes, len(shards)))
+        try:
+            reduced = pool.map(_reduce_shard, shards)
+            pool.close()
+            return reduced
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    return [_reduce_shard(shard) for shard in shards]
+
+
+class MemoryIndex(object):
+    '''
+    The samples grouped by hash in memory. The shards are reduced in as
+    many processes as given.
+    '''
+
+    def __init__(self, hashes, shards, boundaries, collapse_repeat_tokens,
+                 processes=1):
+        self.hashes = hashes
+        reduced = _map_shards(
+            [(chunks, boundaries, collapse_repeat_tokens)
+             for chunks in shards], processes)
+        self.singles = array('l', sorted(chain.from_iterable(
+            singles for singles, _ in reduced)))
+        self.groups = sorted(
+            (group for _, groups in reduced for group in groups),
+            key=lambda group: group[0])
+        self.group_firsts = array('l', sorted(chain(
+            self.singles, (group[0] for group in self.groups))))
+        self.first_of_member = dict(
+            (member, group[0]) for group in self.groups for member in group)
+
+    def hash_at(self, position):
+        return self.hashes[position]
+
+    def group_first(self, position):
+        first = self.first_of_member.get(position)
+        if first is None:
+            index = bisect_left(self.singles, position)
+            if index < len(self.singles) and self.singles[index] == position:
+                first = position
+        return first
+
+    def group_count(self):
+        return len(self.group_firsts)
+
+    def candidate_groups(self):
+        return iter(self.groups)
+
+    def firsts_at_ranks(self, ranks):
+        return [self.group_firsts[rank] for rank in ranks
+                if rank < len(self.group_firsts)]
+
+
+class _ProcessedStarts(object):
+    '''
+    Stands for the dup_starts set of an InvolvingScope, which holds
+    n - sample_size for every sample n of the groups processed since
+    the scope started, without adding the samples one by one.
+    '''
+
+    def __init__(self, finder, since):
+        self.finder = finder
+        self.since = self.until = since
+
+    def begin_group(self, first):
+        self.until = first
+
+    def __ior__(self, _):
+        self.until += 1  # the current group is processed
+        return self
+
+    def __contains__(self, start):
+        first = self.finder.index.group_first(
+            start + self.finder.sample_size)
+        return first is not None and self.since <= first < self.until
+
+
 class DuplicateFinder(object):
+    '''
+    Finds the duplicated sequences of samples. The samples are grouped
+    by hash, and only the groups of more than one sample are expanded
+    by an InvolvingScope, in the order of their first sample. nodes can
+    be a store that groups its samples itself (see group_index);
+    otherwise they are grouped in memory, from the given shards in as
+    many processes as given.
+    '''
+
     def __init__(self, nodes, boundaries, **options):
         collapse_repeat_tokens = options.get("collapse_repeat_tokens", 20)
         self.min_duplicate_tokens = options.get("min_duplicate_tokens", 0) * 2
@@ -98,22 +250,34 @@ class DuplicateFinder(object):
         self.duplicate_token_count = 0
         self.nodes = nodes
         self.boundaries = set(boundaries + [len(nodes)])
-        self.hashed_node_indice = DefaultOrderedDict(list)
-        for i, node_hash in enumerate(n.hash for n in nodes):
-            if i in self.boundaries:
-                recent = deque([''] * collapse_repeat_tokens)
-            if node_hash not in recent:
-                self.hashed_node_indice[node_hash].append(i)
-            recent.append(node_hash)
-            recent.popleft()
+        sorted_boundaries = sorted(self.boundaries)
+        if hasattr(nodes, "group_index"):
+            self.index = nodes.group_index(
+                sorted_boundaries, collapse_repeat_tokens)
+        else:
+            hashes = (nodes.hashes if isinstance(nodes, Samples)
+                      else [n.hash for n in nodes])
+            self.index = MemoryIndex(
+                hashes, options.get("shards") or [[(0, hashes, None)]],
+                sorted_boundaries, collapse_repeat_tokens,
+                options.get("processes", 1))
+        # a new scope starts at the groups whose ranks are boundaries
+        self.scope_firsts = self.index.firsts_at_ranks(sorted_boundaries)
 
     def find_start_and_ends(self):
-        for i, same in enumerate(self.hashed_node_indice.values()):
-            if i in self.boundaries:
-                scope = InvolvingScope(self.boundaries, self._keyfunc)
+        scope, scope_first = None, None
+        for same in self.index.candidate_groups():
+            first = self.scope_firsts[
+                bisect_right(self.scope_firsts, same[0]) - 1]
+            if first != scope_first:
+                scope_first = first
+                scope = InvolvingScope(
+                    self.boundaries, self._keyfunc,
+                    _ProcessedStarts(self, first))
+            scope.dup_starts.begin_group(same[0])
             before_same = set(n - self.sample_size for n in same)
             for dup in scope.same_beginning(
-                    same, before_same):
+                    list(same), before_same):
                 token_count = len(dup) * \
                         (dup[0][1] - dup[0][0] + self.sample_size)
                 if token_count >= self.min_duplicate_tokens:
@@ -130,13 +294,13 @@ class DuplicateFinder(object):
 
     def unique_rate(self):
         try:
-            return len(self.hashed_node_indice) / len(self.nodes)
+            return self.index.group_count() / len(self.nodes)
         except ZeroDivisionError:
             return 0
 
     def _keyfunc(self, seq):
         try:
-            return self.nodes[seq[1]].hash
+            return self.index.hash_at(seq[1])
         except IndexError:
             return ''
 
@@ -202,43 +366,184 @@ class NestingStackWithUnifiedTokens(object):
         self.previous_token = token
 
     def samples(self):
-        buf = deque()
-        for unified_token, current_line in self.unified_tokens:
-            buf.append(Sequence(current_line))
-            for code_hash in buf:
-                code_hash.append_token(unified_token, current_line)
-            if len(buf) > self.SAMPLE_SIZE:
-                yield buf.popleft()
+        '''
+        Returns the Samples of every SAMPLE_SIZE + 1 consecutive unified
+        tokens. A sample is hashed by a 64 bit digest of the
+        concatenation of its tokens, taken from a slice of the
+        concatenation of all the tokens, so no per-sample string is built.
+        '''
+        samples = Samples()
+        window = self.SAMPLE_SIZE + 1
+        if len(self.unified_tokens) < window:
+            return samples
+        tokens, lines = zip(*self.unified_tokens)
+        encoded = [token.encode('utf-8') for token in tokens]
+        code = b''.join(encoded)
+        offsets = [0]
+        offsets.extend(accumulate(map(len, encoded)))
+        samples.hashes.frombytes(b''.join([
+            blake2b(code[start:end], digest_size=8).digest()
+            for start, end in zip(offsets, offsets[window:])]))
+        samples.start_lines.extend(lines[:1 - window])
+        samples.end_lines.extend(lines[window - 1:])
+        return samples
+
+    def function_signatures(self, functions):
+        '''
+        Returns the (start_line, end_line, MinHash signature) of the
+        tokens of every function with more than SAMPLE_SIZE of them.
+        The tokens of a nested function are only its own, and every
+        name counts as the same token, as the unified names depend on
+        what comes before the function.
+        '''
+        if not self.unified_tokens:
+            return []
+        tokens, lines = zip(*self.unified_tokens)
+        owners = [None] * len(tokens)
+        ranges = sorted(
+            (bisect_left(lines, func.start_line),
+             -bisect_right(lines, func.end_line), index)
+            for index, func in enumerate(functions))
+        for start, end, index in ranges:  # the nested ones come later
+            owners[start:-end] = [index] * (-end - start)
+        owned = [[] for _ in functions]
+        for token, owner in zip(tokens, owners):
+            if owner is not None:
+                owned[owner].append('v' if token[0].isalpha() else token)
+        return [(func.start_line, func.end_line,
+                 signature(shingle_hashes(own_tokens)))
+                for func, own_tokens in zip(functions, owned)
+                if len(own_tokens) > self.SAMPLE_SIZE]
 
 
 class LizardExtension(ExtensionBase):
 
     def __init__(self, context=None):
-        self.nodes = []
-        self.fileinfos = []
+        self.nodes = Samples()
+        self.bases = array('l')
+        self.filenames = []
+        self.processes = 1
+        self.shards = None
+        self.index_path = None
+        self.near_miss = None
         self.saved_duplicate_rate = None
         self.saved_unique_rate = None
         super(LizardExtension, self).__init__(context)
 
+    @staticmethod
+    def set_args(parser):
+        parser.add_argument(
+            "--duplicate_index",
+            help='''Keep the samples of the duplicate detector in a
+            SQLite database at this path instead of in memory, so that
+            finding the duplicates of a big code base runs in bounded
+            memory. The database is kept for the next runs, which only
+            write the samples of the files that changed.
+            ''',
+            dest="duplicate_index",
+            default=None)
+        parser.add_argument(
+            "--near_miss",
+            help='''Find the functions that are similar instead of the
+            exact duplicated code, e.g. copies with a few edits.
+            ''',
+            action="store_true",
+            dest="near_miss",
+            default=False)
+        parser.add_argument(
+            "--near_miss_similarity",
+            help='''The minimum similarity of the functions found by
+            --near_miss, between 0 and 1. The default value is %s.
+            ''' % DEFAULT_SIMILARITY,
+            type=float,
+            dest="near_miss_similarity",
+            default=DEFAULT_SIMILARITY)
+
     def __call__(self, tokens, reader):
         token_unifier = reader.context.decorate_nesting_stack(
                 NestingStackWithUnifiedTokens)
         for token in tokens:
             token_unifier.enqueue_token(token, reader.context.current_line)
             yield token
-        reader.context.fileinfo.hash_nodes = list(token_unifier.samples())
+        if self.near_miss is not None:
+            reader.context.fileinfo.near_miss_signatures = \
+                token_unifier.function_signatures(
+                    reader.context.fileinfo.function_list)
+            return
+        samples = token_unifier.samples()
+        if self.processes > 1:
+            samples.shards = samples.shard(self.processes)
+        reader.context.fileinfo.hash_nodes = samples
+
+    def set_options(self, options):
+        '''
+        The samples are sharded by hash in the workers, and the shards
+        are grouped in as many processes as there are working threads,
+        unless they are kept in an on-disk index. With near_miss, the
+        functions are compared by signature instead.
+        '''
+        self.index_path = getattr(options, "duplicate_index", None)
+        if getattr(options, "near_miss", False):
+            self.near_miss = options.near_miss_similarity
+        if self.near_miss is not None:
+            self.nodes = NearMissFinder(self.near_miss)
+            return
+        if self.index_path:
+            return  # the on-disk index groups the samples, not the shards
+        self.processes = options.working_threads
+        if self.processes > 1:
+            self.shards = [[] for _ in range(self.processes)]
+
+    @property
+    def cache_tag(self):
+        ''' the results differ with near_miss '''
+        return "near_miss" if self.near_miss is not None else ""
 
     def cross_file_process(self, fileinfos):
+        if self.near_miss is not None:
+            for fileinfo in fileinfos:
+                for start_line, end_line, function_signature in getattr(
+                        fileinfo, "near_miss_signatures", None) or ():
+                    self.nodes.add(
+                        CodeSnippet(start_line, end_line, fileinfo.filename),
+                        function_signature)
+                fileinfo.near_miss_signatures = None
+                yield fileinfo
+            return
+        if self.index_path and isinstance(self.nodes, Samples):
+            from .duplicate_index import SampleStore
+            self.nodes = SampleStore(self.index_path)
         for fileinfo in fileinfos:
-            self.fileinfos.append((len(self.nodes), fileinfo))
-            self.nodes += fileinfo.hash_nodes
+            samples = fileinfo.hash_nodes
+            fileinfo.hash_nodes = None  # kept in self.nodes from now on
+            if isinstance(self.nodes, Samples):
+                base = len(self.nodes)
+                self.bases.append(base)
+                self.filenames.append(fileinfo.filename)
+                self.nodes.extend(samples)
+                if self.shards is not None:
+                    self._add_to_shards(base, samples)
+            else:
+                self.nodes.add(fileinfo.filename, samples)
             yield fileinfo
 
+    def _add_to_shards(self, base, samples):
+        shards = samples.shards
+        if shards is None or len(shards) != len(self.shards):
+            shards = samples.shard(len(self.shards))  # e.g. from the cache
+        for chunks, (hashes, offsets) in zip(self.shards, shards):
+            chunks.append((base, hashes, offsets))
+
     def get_duplicates(self, min_duplicate_tokens=70):
-        boundaries = [info[0] for info in self.fileinfos]
+        if isinstance(self.nodes, Samples):
+            boundaries = list(self.bases)
+        else:
+            boundaries = list(self.nodes.bases)
         duplicate_finder = DuplicateFinder(
                 self.nodes,
                 boundaries,
+                shards=self.shards,
+                processes=self.processes,
                 min_duplicate_tokens=min_duplicate_tokens,
                 sample_size=NestingStackWithUnifiedTokens.SAMPLE_SIZE)
         for start_and_ends in duplicate_finder.find_start_and_ends():
@@ -255,20 +560,44 @@ class LizardExtension(ExtensionBase):
     def _create_code_snippets(self, start_and_ends):
         return [
             CodeSnippet(
-                self.nodes[start].start_line,
-                self.nodes[end].end_line,
-                self._get_fileinfo_by_token_index(start).filename)
+                self.nodes.start_lines[start],
+                self.nodes.end_lines[end],
+                self._get_filename_by_token_index(start))
             for start, end in start_and_ends]
 
-    def _get_fileinfo_by_token_index(self, index):
-        last_fileinfo = (-1, None)
-        for fileinfo in self.fileinfos:
-            if fileinfo[0] > index:
-                break
-            last_fileinfo = fileinfo
-        return last_fileinfo[1]
+    def _get_filename_by_token_index(self, index):
+        if not isinstance(self.nodes, Samples):
+            return self.nodes.filename_at(index)
+        # the last of the files starting at or before index, which
+        # skips the files without samples
+        return self.filenames[bisect_right(self.bases, index) - 1]
+
+    def print_near_miss_result(self):
+        print("Near-miss duplicates")
+        print("===================================")
+        duplicated = 0
+        for block in self.nodes.find():
+            duplicated += len(block)
+            print("Similar functions:")
+            print("--------------------------")
+            for snippet in block:
+                print(snippet)
+            print("^^^^^^^^^^^^^^^^^^^^^^^^^^")
+            print("")
+        print("Functions with a similar one: %d of %d" % (
+            duplicated, len(self.nodes)))
 
     def print_result(self):
+        if self.near_miss is not None:
+            self.print_near_miss_result()
+            return
+        try:
+            self.print_duplicates()
+        finally:
+            if not isinstance(self.nodes, Samples):
+                self.nodes.close()  # the on-disk index
+
+    def print_duplicates(self):
         print("Duplicates")
         print("===================================")
         for dup in self.get_duplicates():
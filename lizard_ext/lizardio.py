@@ -4,17 +4,10 @@ Fan in and Fan out (again)
 from collections import Counter
 from .extension_base import ExtensionBase
 
-
-def get_all_indices(value, token_list):
-    indices = []
-    idx = -1
-    while True:
-        try:
-            idx = token_list.index(value, idx + 1)
-            indices.append(idx)
-        except ValueError:
-            break
-    return indices
+STRUCTURES = set(['if', 'else', 'elif', 'for', 'foreach', 'while',
+                  'do', 'try', 'catch', 'switch', 'finally',
+                  'except', 'with'])
+PUNCTUATIONS = set(['(', ')', '{', '}'])
 
 
 class LizardExtension(ExtensionBase):
@@ -46,47 +39,70 @@ class LizardExtension(ExtensionBase):
     }
 
     def __init__(self, context=None):
-        self.all_methods = {}
+        self.definitions = Counter()  # name -> files defining it
+        self.occurrences = Counter()  # name -> uses in all functions
+        self.owners = {}  # name -> functions with that name
+        self.users = {}  # name -> functions using it
+        self.scanning = {}
         super(LizardExtension, self).__init__(context)
 
+    def __call__(self, tokens, reader=None):
+        self.scanning = {}
+        return super(LizardExtension, self).__call__(tokens, reader)
+
     def _state_global(self, token):
-        if not hasattr(self.context.current_function, 'tokens'):
-            self.context.current_function.tokens = list()
-        self.context.current_function.tokens.append(token)
+        '''
+        Counts the identifiers of the function, and the calls after its
+        parameter list for the general fan-out. Only the counts are
+        kept, not the tokens.
+        '''
+        func = self.context.current_function
+        state = self.scanning.get(id(func))
+        if state is None or state[2] is not func:  # ids can be reused
+            state = self.scanning[id(func)] = [None, False, func]
+            func.identifiers = Counter()
+        previous, parameters_seen, _ = state
+        if token[0].isalpha() or token[0] == '_':
+            func.identifiers[token] += 1
+        elif token == '(':
+            if parameters_seen and previous not in STRUCTURES | PUNCTUATIONS:
+                func.general_fan_out += 1
+            state[1] = True
+        state[0] = token
 
     def cross_file_process(self, fileinfos):
+        '''
+        Keeps an inverted index of the names used by the functions. All
+        the files are indexed before the first one is yielded, so that
+        the values printed don't depend on the order of the files.
+        '''
+        fileinfos = list(fileinfos)
+        try:
+            for fileinfo in fileinfos:
+                self._add_definitions(fileinfo.function_list)
+            for fileinfo in fileinfos:
+                for func in fileinfo.function_list:
+                    self._add_uses(func)
+        except (AttributeError, TypeError, ValueError):
+            pass
         for fileinfo in fileinfos:
-            try:
-                new_funcs = {f.unqualified_name: f for f in
-                             fileinfo.function_list}
-                self.all_methods.update(new_funcs)
-                self._add_to_fan_outs(new_funcs.keys())
-                self._add_to_general_fan_out()
-                self._add_to_fan_ins(fileinfo.function_list)
-            except (AttributeError, TypeError, ValueError):
-                pass
             yield fileinfo
 
-    def _add_to_fan_outs(self, keys):
-        for other_func in self.all_methods.values():
-            intersect = Counter(keys) & Counter(other_func.tokens)
-            other_func.fan_out += len(list(intersect.elements()))
-
-    def _add_to_general_fan_out(self):
-        structures = set(['if', 'else', 'elif', 'for', 'foreach', 'while',
-                          'do', 'try', 'catch', 'switch', 'finally',
-                          'except', 'with'])
-        punctuations = set(['(', ')', '{', '}'])
-        for other_func in self.all_methods.values():
-            bracket_indexes = get_all_indices('(', other_func.tokens)
-            for idx in bracket_indexes[1:]:
-                # Suggestion ?
-                if other_func.tokens[idx - 1] not in (structures |
-                                                      punctuations):
-                    other_func.general_fan_out += 1
+    def _add_definitions(self, functions):
+        for func in functions:
+            self.owners.setdefault(func.unqualified_name, []).append(func)
+            func.fan_in += self.occurrences[func.unqualified_name]
+        for name in set(func.unqualified_name for func in functions):
+            self.definitions[name] += 1
+            for user in self.users.get(name, ()):
+                user.fan_out += 1
 
-    def _add_to_fan_ins(self, new_funcs):
-        for func in new_funcs:
-            for name in func.tokens:
-                if name in self.all_methods:
-                    self.all_methods[name].fan_in += 1
+    def _add_uses(self, func):
+        identifiers = getattr(func, 'identifiers', {})
+        for name, count in identifiers.items():
+            func.fan_out += self.definitions[name]
+            self.occurrences[name] += count
+            for owner in self.owners.get(name, ()):
+                owner.fan_in += count
+            self.users.setdefault(name, []).append(func)
+        func.identifiers = {}
@@ -4,12 +4,127 @@ in the source code (ignoring the comments and strings), and then generate
 a tag cloud based on the popularity of the identifiers.
 The tag cloud is generated on an HTML5 canvas. So it will eventually save
 the result to an HTML file and open the browser to show it.
+
+Every file's words are counted in a Counter by the workers, and the
+counters are added up in cross_file_process. Only the TAG_COUNT most
+frequent words are drawn, and they are picked with a heap instead of
+sorting the whole vocabulary.
+
+With --word_count_sketch, the words are counted in a count-min sketch
+of a fixed size instead, and only the most frequent candidates are
+kept, so the memory doesn't grow with the vocabulary. The counts of
+the frequent words are then estimates, which are never too low.
+
+With --word_count_file FILE, the counts are saved to FILE, one
+"<word>\\t<count>" per line, instead of generating the tag cloud. The
+tag cloud can be generated from the file later with:
+
+    python -m lizard_ext.lizardwordcount FILE
 '''
 
+import heapq
+import io
+import sys
 import webbrowser
+from array import array
+from collections import Counter
 from os.path import abspath
 from lizard_ext.keywords import IGNORED_WORDS
 
+TAG_COUNT = 400
+SKETCH_WIDTH = 1 << 16
+SKETCH_DEPTH = 4
+
+
+def top_words(counts, count=TAG_COUNT):
+    '''
+    The count most frequent (word, count) pairs, the most frequent
+    first and in the order of the words when they are as frequent.
+    '''
+    return heapq.nsmallest(count, counts.items(),
+                           key=lambda item: (-item[1], item[0]))
+
+
+class CountMinSketch(object):
+    '''
+    Approximate counts in depth rows of width counters. A word is
+    counted in one counter of every row, and its count is estimated by
+    the smallest of them. Only the smallest counters of a word are
+    raised (conservative update), which keeps the estimates closer.
+    '''
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.counters = array('q', bytes(8 * width * depth))
+
+    def _slots(self, word):
+        code = hash(word) & 0xFFFFFFFFFFFFFFFF
+        step = (code >> 32) | 1
+        return [row * self.width + (code + row * step) % self.width
+                for row in range(self.depth)]
+
+    def add(self, word, count=1):
+        ''' adds count to the word and returns its new estimate '''
+        slots = self._slots(word)
+        estimate = min(self.counters[slot] for slot in slots) + count
+        for slot in slots:
+            if self.counters[slot] < estimate:
+                self.counters[slot] = estimate
+        return estimate
+
+    def __getitem__(self, word):
+        return min(self.counters[slot] for slot in self._slots(word))
+
+
+class SketchCounter(object):
+    '''
+    Counts words in a CountMinSketch and keeps the estimates of the
+    most frequent ones as candidates. It has the interface of the
+    Counter used otherwise, but items() only has the candidates.
+    '''
+
+    def __init__(self, capacity=TAG_COUNT, sketch=None):
+        self.capacity = capacity
+        self.sketch = sketch or CountMinSketch()
+        self.candidates = {}
+        self.floor = 0
+
+    def update(self, counts):
+        candidates = self.candidates
+        for word, count in counts.items():
+            estimate = self.sketch.add(word, count)
+            if estimate > self.floor or word in candidates:
+                candidates[word] = estimate
+        if len(candidates) > 2 * self.capacity:
+            # the estimates only grow, so a word dropped here cannot
+            # be among the most frequent ones before it is seen again
+            kept = top_words(candidates, self.capacity)
+            self.candidates = dict(kept)
+            self.floor = kept[-1][1]
+
+    def items(self):
+        return self.candidates.items()
+
+    def __getitem__(self, word):
+        return self.sketch[word]
+
+
+def write_word_counts(counts, path):
+    with io.open(path, 'w', encoding='utf-8') as output:
+        for word, count in top_words(counts, len(counts.items())):
+            output.write(u'%s\t%d\n' % (word, count))
+
+
+def read_word_counts(path):
+    counts = Counter()
+    with io.open(path, encoding='utf-8') as count_file:
+        for line in count_file:
+            word, _, count = line.rstrip('\n').rpartition('\t')
+            if word:
+                counts[word] += int(count)
+    return counts
+
 
 class LizardExtension(object):
 
@@ -17,7 +132,35 @@ class LizardExtension(object):
     ignoreList = IGNORED_WORDS
 
     def __init__(self):
-        self.result = {}
+        self.result = Counter()
+        self.count_file = None
+
+    @staticmethod
+    def set_args(parser):
+        parser.add_argument(
+            "--word_count_file",
+            help='''Save the word counts to this file instead of
+            generating the tag cloud. Use
+            "python -m lizard_ext.lizardwordcount FILE" to generate the
+            tag cloud from the file.
+            ''',
+            dest="word_count_file",
+            default=None)
+        parser.add_argument(
+            "--word_count_sketch",
+            help='''Count the words in a count-min sketch of a fixed
+            size and keep only the most frequent ones, so that the
+            memory used doesn't grow with the number of different
+            words. Their counts are estimates.
+            ''',
+            action="store_true",
+            dest="word_count_sketch",
+            default=False)
+
+    def set_options(self, options):
+        self.count_file = getattr(options, "word_count_file", None)
+        if getattr(options, "word_count_sketch", False):
+            self.result = SketchCounter()
 
     @staticmethod
     def __call__(tokens, reader):
@@ -25,12 +168,13 @@ class LizardExtension(object):
         The function will be used in multiple threading tasks.
         So don't store any data with an extension object.
         '''
-        reader.context.fileinfo.wordCount = result = {}
+        words = []
         for token in tokens:
             if token not in LizardExtension.ignoreList\
                     and token[0] not in ('"', "'", '#'):
-                result[token] = result.get(token, 0) + 1
+                words.append(token)
             yield token
+        reader.context.fileinfo.wordCount = Counter(words)
 
     def cross_file_process(self, fileinfos):
         '''
@@ -40,62 +184,16 @@ class LizardExtension(object):
         '''
         for fileinfo in fileinfos:
             if hasattr(fileinfo, "wordCount"):
-                for k, val in fileinfo.wordCount.items():
-                    self.result[k] = self.result.get(k, 0) + val
+                self.result.update(fileinfo.wordCount)
             yield fileinfo
 
     def print_result(self):
-        with open(self.HTML_FILENAME, 'w') as html_file:
-            html_file.write('''
-<html>
-    <head>
-        <meta name="viewport" content="width=device-width,
-            initial-scale=1.0,maximum-scale=1.0" />
-        <style type="text/css">
-            canvas {
-                border: 1px solid black;
-                width: 700px;
-                height: 700px;
-            }
-        </style>
-        <script type="text/javascript">
-        ''')
-            html_file.write(self.TAG_CLOUD_JAVASCRIPT)
-            html_file.write('''
-        </script>
-        <script type="application/javascript">
-            function draw() {
-                var canvas = document.getElementById("canvas");
-                    if (canvas.getContext) {
-                        var ctx = canvas.getContext("2d");
-                        // scale 2x
-                        if(window.devicePixelRatio == 2) {
-                            canvas.setAttribute('width', canvas.width * 2);
-                            canvas.setAttribute('height', canvas.height * 2);
-                        }
-                        var tagCloud = new TagCloud(canvas.width,
-                            canvas.height, ctx);
-                        tagCloud.render([''')
-            tags = sorted(self.result)
-            tags = sorted(tags, key=self.result.get, reverse=True)[:400]
-            for k in tags:
-                html_file.write(
-                    ' ' * 40 + '["%s", %d],\n' % (
-                        k.replace('"', '\\\"')
-                        .replace("'", "\\\\'").replace("\\", "\\\\"),
-                        self.result[k]))
-            html_file.write('''
-                                    ]);
-                                }
-                        }
-                    </script>
-                </head>
-                <body onload="draw();">
-                    <canvas id="canvas" width="700" height="700"></canvas>
-                </body>
-            </html>''')
-
-            webbrowser.open("file://" + abspath(self.HTML_FILENAME))
+        if self.count_file is not None:
+            write_word_counts(self.result, self.count_file)
+            print("Word counts written to %s" % self.count_file)
+            return
+        write_tag_cloud(top_words(self.result), self.HTML_FILENAME)
+        webbrowser.open("file://" + abspath(self.HTML_FILENAME))
 
     TAG_CLOUD_JAVASCRIPT = '''
 
@@ -229,3 +327,73 @@ function generateSpiralOffsets() {
 BasePlacement.prototype._spiralOffsets = generateSpiralOffsets();
 
     '''
+
+
+def write_tag_cloud(tags, path):
+    ''' tags are the (word, count) pairs to draw '''
+    with open(path, 'w') as html_file:
+        html_file.write('''
+<html>
+    <head>
+        <meta name="viewport" content="width=device-width,
+            initial-scale=1.0,maximum-scale=1.0" />
+        <style type="text/css">
+            canvas {
+                border: 1px solid black;
+                width: 700px;
+                height: 700px;
+            }
+        </style>
+        <script type="text/javascript">
+        ''')
+        html_file.write(LizardExtension.TAG_CLOUD_JAVASCRIPT)
+        html_file.write('''
+        </script>
+        <script type="application/javascript">
+            function draw() {
+                var canvas = document.getElementById("canvas");
+                    if (canvas.getContext) {
+                        var ctx = canvas.getContext("2d");
+                        // scale 2x
+                        if(window.devicePixelRatio == 2) {
+                            canvas.setAttribute('width', canvas.width * 2);
+                            canvas.setAttribute('height', canvas.height * 2);
+                        }
+                        var tagCloud = new TagCloud(canvas.width,
+                            canvas.height, ctx);
+                        tagCloud.render([''')
+        for word, count in tags:
+            html_file.write(
+                ' ' * 40 + '["%s", %d],\n' % (
+                    word.replace('"', '\\\"')
+                    .replace("'", "\\\\'").replace("\\", "\\\\"),
+                    count))
+        html_file.write('''
+                                    ]);
+                                }
+                        }
+                    </script>
+                </head>
+                <body onload="draw();">
+                    <canvas id="canvas" width="700" height="700"></canvas>
+                </body>
+            </html>''')
+
+
+def main(argv=None):
+    '''
+    Generates the tag cloud from a file saved with --word_count_file.
+    '''
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        sys.stderr.write(
+            "usage: python -m lizard_ext.lizardwordcount COUNT_FILE\n")
+        return 2
+    write_tag_cloud(top_words(read_word_counts(argv[0])),
+                    LizardExtension.HTML_FILENAME)
+    webbrowser.open("file://" + abspath(LizardExtension.HTML_FILENAME))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
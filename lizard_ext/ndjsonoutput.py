@@ -0,0 +1,66 @@
+'''
+Newline delimited JSON output for Lizard.
+
+Every function is written as one JSON object on a line of its own,
+followed by one line for the file it belongs to:
+
+    {"type": "function", "filename": "a.c", "name": "foo", ...}
+    {"type": "file", "filename": "a.c", "nloc": 12, ...}
+
+The records are written while the files are analyzed, so a consumer
+can read them as they come. They are written in batches; a batch is
+flushed when it has BATCH_SIZE records or is older than FLUSH_INTERVAL
+seconds, whichever comes first.
+'''
+import json
+import time
+
+BATCH_SIZE = 1000
+FLUSH_INTERVAL = 1.0
+
+
+def function_columns(schema):
+    ''' the metric columns of the functions, including the extensions' '''
+    return [column for column in schema.value_columns()
+            if column != "location"]
+
+
+def write_ndjson(result, columns, output,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+    batch = []
+    last_flush = time.monotonic()
+    for source_file in result:
+        if not source_file:
+            continue
+        filename = source_file.filename
+        for func in source_file.function_list:
+            record = {"type": "function", "filename": filename,
+                      "name": func.name, "long_name": func.long_name,
+                      "start_line": func.start_line,
+                      "end_line": func.end_line}
+            for column in columns:
+                record[column] = getattr(func, column, None)
+            batch.append(_dumps(record))
+        batch.append(_dumps({
+            "type": "file", "filename": filename,
+            "nloc": source_file.nloc,
+            "token_count": source_file.token_count,
+            "cyclomatic_complexity": source_file.CCN,
+            "function_count": len(source_file.function_list)}))
+        now = time.monotonic()
+        if len(batch) >= batch_size or now - last_flush >= flush_interval:
+            _flush(output, batch)
+            last_flush = now
+    _flush(output, batch)
+
+
+def _dumps(record):
+    return json.dumps(record, ensure_ascii=False, default=str)
+
+
+def _flush(output, batch):
+    if batch:
+        output.write("\n".join(batch))
+        output.write("\n")
+        del batch[:]
+    output.flush()
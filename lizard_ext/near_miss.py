@@ -0,0 +1,136 @@
+'''
+Near-miss clone detection for the duplicate detector.
+
+The exact duplicate detector only finds runs of identical unified
+tokens, so a copy with one statement edited is reported in pieces, if
+at all. With --near_miss, the functions are compared instead:
+
+    1. every function's unified tokens are cut into shingles of
+       SHINGLE_SIZE tokens, and the shingles into a MinHash signature
+       of SIGNATURE_SIZE values (one permutation hashing, with the
+       empty bins filled from their neighbours);
+    2. the signatures are cut into BANDS bands, and the functions
+       with an identical band land in the same bucket;
+    3. only the functions in a bucket are compared, by the share of
+       their signatures that are equal, which estimates the Jaccard
+       similarity of their shingles.
+
+The similar functions are then joined into blocks, so the work grows
+with the number of functions and of real candidates, not with their
+square.
+'''
+from array import array
+from hashlib import blake2b
+
+SHINGLE_SIZE = 5
+SIGNATURE_SIZE = 64
+BANDS = 16
+DEFAULT_SIMILARITY = 0.8
+_HASH_BITS = 64
+_EMPTY = 1 << _HASH_BITS
+
+
+def shingle_hashes(tokens, shingle_size=SHINGLE_SIZE):
+    '''
+    The 64 bit hashes of every shingle_size consecutive tokens.
+    '''
+    encoded = [token.encode('utf-8') + b'\0' for token in tokens]
+    return [int.from_bytes(blake2b(b''.join(encoded[i:i + shingle_size]),
+                                   digest_size=8).digest(), 'little')
+            for i in range(len(encoded) - shingle_size + 1)]
+
+
+def signature(hashes, size=SIGNATURE_SIZE):
+    '''
+    The MinHash signature of a set of 64 bit hashes. A single hash
+    function is used: the low bits of a hash choose a bin and the
+    minimum of the rest is kept per bin. An empty bin takes the value
+    of the next bin that isn't, plus its distance to it, so that two
+    sets only agree on it when they agree on that bin.
+    '''
+    bin_bits = size.bit_length() - 1  # size is a power of 2
+    bins = [_EMPTY] * size
+    for code_hash in hashes:
+        index = code_hash & (size - 1)
+        value = code_hash >> bin_bits
+        if value < bins[index]:
+            bins[index] = value
+    if bins.count(_EMPTY) == size:
+        return None
+    result = list(bins)
+    nearest = None
+    for i in reversed(range(2 * size)):  # twice, to wrap around
+        if bins[i % size] != _EMPTY:
+            nearest = i
+        elif i < size:
+            result[i] = bins[nearest % size] + \
+                ((nearest - i) << (_HASH_BITS - bin_bits))
+    return array('Q', result)
+
+
+def similarity(signature1, signature2):
+    return sum(a == b for a, b in zip(signature1, signature2)) / \
+        len(signature1)
+
+
+class NearMissFinder(object):
+    '''
+    Buckets the signatures of the functions by band and joins the
+    functions of a bucket that are similar enough.
+    '''
+
+    def __init__(self, min_similarity=DEFAULT_SIMILARITY, bands=BANDS):
+        self.min_similarity = min_similarity
+        self.bands = bands
+        self.functions = []
+        self.signatures = []
+        self.buckets = {}
+
+    def add(self, function, function_signature):
+        '''
+        function is any object to report, e.g. a CodeSnippet.
+        '''
+        index = len(self.functions)
+        self.functions.append(function)
+        self.signatures.append(function_signature)
+        rows = len(function_signature) // self.bands
+        for band in range(self.bands):
+            key = (band, function_signature[band * rows:
+                                            (band + 1) * rows].tobytes())
+            self.buckets.setdefault(key, []).append(index)
+
+    def find(self):
+        '''
+        Yields the blocks of similar functions, in the order they were
+        added.
+        '''
+        parents = list(range(len(self.functions)))
+
+        def root(index):
+            while parents[index] != index:
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+
+        for bucket in self.buckets.values():
+            # a member is compared with one member of every block seen
+            # in the bucket, so identical functions cost one comparison
+            blocks = {}
+            for index in bucket:
+                for block, member in list(blocks.items()):
+                    if root(index) != root(block) and similarity(
+                            self.signatures[index],
+                            self.signatures[member]) >= self.min_similarity:
+                        parents[root(block)] = root(index)
+                blocks = dict(
+                    (root(member), member)
+                    for member in list(blocks.values()) + [index])
+        blocks = {}
+        for index in range(len(self.functions)):
+            blocks.setdefault(root(index), []).append(index)
+        for block in sorted(blocks.values()):
+            if len(block) > 1:
+                yield [self.functions[index] for index in block]
+
+    def __len__(self):
+        return len(self.functions)
@@ -0,0 +1,206 @@
+'''
+On-disk cache of analysis results.
+
+The FileInformation produced for a source file only depends on the
+content of the file, its name, the version of lizard, the language
+reader and the extensions that processed the tokens. The cache keeps
+the pickled result under a hash of all of these, so a file that hasn't
+changed since the last run doesn't need to be tokenized again.
+
+Several worker processes may use the same cache directory at the same
+time. Entries are written to a temporary file and then atomically
+renamed, so a reader sees either a complete entry or no entry at all.
+The least recently used entries are evicted once the directory grows
+beyond the size limit.
+
+The cache also keeps a manifest that maps each analyzed file to its
+size, modification time and cache key, so the stored result of a file
+can be found again without reading the file. A file is named in the
+manifest by its git repository and its path in it (or by its absolute
+path outside of a repository), so it is found again from any working
+directory. The entries of the files that are gone are removed.
+'''
+import hashlib
+import os
+import pickle
+import tempfile
+from .version import version
+
+ENTRY_SUFFIX = '.pickle'
+MANIFEST = 'manifest' + ENTRY_SUFFIX
+
+
+def extension_signature(extensions):
+    '''
+    A string that identifies the processing pipeline. Both plain
+    functions (like the default counters) and extension objects are
+    identified by their module and name, plus the cache_tag of the
+    extensions whose results depend on their options.
+    '''
+    return ','.join(
+        getattr(ext, '__module__', '') + '.' +
+        getattr(ext, '__name__', type(ext).__name__) +
+        getattr(ext, 'cache_tag', '')
+        for ext in extensions)
+
+
+class ResultCache(object):
+
+    def __init__(self, cache_dir, max_size_mb):
+        self.cache_dir = cache_dir
+        self.max_size = max_size_mb * 1024 * 1024
+        self.roots = {}
+
+    @staticmethod
+    def pipeline(extensions):
+        '''
+        Identifies the version and the extensions a result was computed
+        with. It is kept in the manifest, so that a stored result is
+        only reused by a run with the same pipeline.
+        '''
+        return version + '\0' + extension_signature(extensions)
+
+    def key(self, filename, reader, extensions, code):
+        digest = hashlib.sha1()
+        for part in (version, reader.__module__ + '.' + reader.__name__,
+                     extension_signature(extensions), filename):
+            digest.update(part.encode('utf-8', 'replace'))
+            digest.update(b'\0')
+        digest.update(code.encode('utf-8', 'replace'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ENTRY_SUFFIX)
+
+    def load(self, key):
+        path = self._path(key)
+        result = _load(path)
+        if result is not None:
+            try:
+                os.utime(path, None)  # mark as recently used
+            except OSError:
+                pass
+        return result
+
+    def save(self, key, fileinfo):
+        _save(self._path(key), fileinfo)
+
+    def load_manifest(self):
+        return _load(os.path.join(self.cache_dir, MANIFEST)) or {}
+
+    def manifest_key(self, filename):
+        '''
+        (top level of the git repository, path in it) of a file, or
+        ('', absolute path) outside of a repository.
+        '''
+        path = os.path.abspath(filename)
+        root = self._repository_root(os.path.dirname(path))
+        if not root:
+            return '', path
+        return root, os.path.relpath(path, root).replace(os.sep, '/')
+
+    def _repository_root(self, directory):
+        if directory not in self.roots:
+            parent = os.path.dirname(directory)
+            if os.path.exists(os.path.join(directory, '.git')):
+                self.roots[directory] = directory
+            elif parent == directory:
+                self.roots[directory] = ''
+            else:
+                self.roots[directory] = self._repository_root(parent)
+        return self.roots[directory]
+
+    def update_manifest(self, entries):
+        '''
+        entries maps file names to (size, modification time, key,
+        pipeline).
+        '''
+        if entries:
+            manifest = self.load_manifest()
+            manifest.update(
+                (self.manifest_key(filename), entry)
+                for filename, entry in entries.items())
+            _save(os.path.join(self.cache_dir, MANIFEST), dict(
+                (key, entry) for key, entry in manifest.items()
+                if _manifest_file_exists(key)))
+
+    def entries(self):
+        try:
+            subdirs = list(os.scandir(self.cache_dir))
+        except OSError:
+            return
+        for subdir in subdirs:
+            if not subdir.is_dir():
+                continue
+            try:
+                entries = list(os.scandir(subdir.path))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.endswith(ENTRY_SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except OSError:  # removed by another process
+                        continue
+                    yield stat.st_mtime, stat.st_size, entry.path
+
+    def evict(self):
+        '''
+        Remove the least recently used entries until the cache fits
+        within the size limit.
+        '''
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            _remove(path)
+            total -= size
+
+    def evict_after(self, results):
+        manifest_entries = {}
+        for result in results:
+            if hasattr(result, 'cache_entry'):
+                manifest_entries[result.filename] = result.cache_entry
+            yield result
+        self.update_manifest(manifest_entries)
+        self.evict()
+
+
+def _manifest_file_exists(key):
+    if not isinstance(key, tuple):  # a manifest of an older version
+        return False
+    root, name = key
+    return os.path.isfile(os.path.join(root, name))
+
+
+def _load(path):
+    try:
+        with open(path, 'rb') as entry:
+            return pickle.load(entry)
+    except (OSError, EOFError, pickle.UnpicklingError,
+            AttributeError, ImportError, IndexError):
+        return None
+
+
+def _save(path, data):
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as entry:
+                pickle.dump(data, entry, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            _remove(tmp_path)
+            raise
+    except (OSError, pickle.PicklingError, TypeError, AttributeError):
+        pass
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,111 @@
+'''
+SQLite database output for Lizard.
+
+The result is written to two tables:
+
+    files(id, filename, nloc, token_count, cyclomatic_complexity,
+          function_count)
+    functions(id, file_id, filename, name, long_name, start_line,
+              end_line, nloc, cyclomatic_complexity, token_count,
+              parameter_count, length, <extension columns>...)
+
+The functions table repeats the file name so that the functions of a
+directory can be selected with an index range scan, e.g. the most
+complex functions under src/net:
+
+    SELECT filename, name, cyclomatic_complexity FROM functions
+    WHERE filename >= 'src/net/' AND filename < 'src/net0'
+    ORDER BY cyclomatic_complexity DESC LIMIT 100
+
+The rows are inserted with executemany in a transaction per batch of
+files, and the indexes are created once all rows are in.
+'''
+import os
+import sqlite3
+
+BATCH_SIZE = 500
+FUNCTION_FIELDS = ["name", "long_name", "start_line", "end_line"]
+INDEXES = [("files", "filename"),
+           ("functions", "filename"),
+           ("functions", "name"),
+           ("functions", "cyclomatic_complexity"),
+           ("functions", "nloc")]
+
+
+def write_sqlite(result, columns, path, batch_size=BATCH_SIZE):
+    for stale in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        _create_tables(connection, columns)
+        _insert(connection, result, columns, batch_size)
+        with connection:
+            for table, column in INDEXES:
+                connection.execute(
+                    'CREATE INDEX "%s_%s" ON %s(%s)' % (
+                        table, column, table, _quote(column)))
+    finally:
+        connection.close()
+
+
+def _quote(identifier):
+    return '"%s"' % identifier.replace('"', '""')
+
+
+def _create_tables(connection, columns):
+    with connection:
+        connection.execute(
+            "CREATE TABLE files (id INTEGER PRIMARY KEY, filename TEXT, "
+            "nloc INTEGER, token_count INTEGER, "
+            "cyclomatic_complexity INTEGER, function_count INTEGER)")
+        connection.execute(
+            "CREATE TABLE functions (id INTEGER PRIMARY KEY, "
+            "file_id INTEGER REFERENCES files(id), filename TEXT, "
+            "name TEXT, long_name TEXT, start_line INTEGER, "
+            "end_line INTEGER, %s)" % ", ".join(
+                _quote(column) for column in columns))
+
+
+def _insert(connection, result, columns, batch_size):
+    insert_file = "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)"
+    insert_function = "INSERT INTO functions VALUES (NULL, %s)" % ", ".join(
+        "?" * (2 + len(FUNCTION_FIELDS) + len(columns)))
+    file_rows, function_rows = [], []
+    file_id = 0
+    for source_file in result:
+        if not source_file:
+            continue
+        file_id += 1
+        filename = source_file.filename
+        file_rows.append((file_id, filename, source_file.nloc,
+                          source_file.token_count, source_file.CCN,
+                          len(source_file.function_list)))
+        for func in source_file.function_list:
+            function_rows.append(
+                (file_id, filename) +
+                tuple(getattr(func, field) for field in FUNCTION_FIELDS) +
+                tuple(_value(getattr(func, column, None))
+                      for column in columns))
+        if len(file_rows) >= batch_size:
+            _commit(connection, insert_file, file_rows,
+                    insert_function, function_rows)
+    _commit(connection, insert_file, file_rows,
+            insert_function, function_rows)
+
+
+def _value(value):
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def _commit(connection, insert_file, file_rows,
+            insert_function, function_rows):
+    with connection:
+        connection.executemany(insert_file, file_rows)
+        connection.executemany(insert_function, function_rows)
+    del file_rows[:]
+    del function_rows[:]
@@ -2,166 +2,145 @@
 Thanks for Holy Wen from Nokia Siemens Networks to let me use his code
 to put the result into xml file that is compatible with cppncss.
 Jenkins has plugin for cppncss format result to display the diagram.
-'''
 
+The document is written while the results arrive, so memory doesn't
+grow with the number of functions. The file measure comes after the
+function measure in the document, so its items are kept in a
+temporary file (in memory while it's small) until the functions are
+done. The layout is the same as xml.dom.minidom's toprettyxml().
+'''
+import io
+import tempfile
 
-def xml_output(all_result, verbose):
-    result = all_result.result
-    import xml.dom.minidom
+STYLESHEET = ('type="text/xsl" ' +
+              'href="https://raw.githubusercontent.com' +
+              '/terryyin/lizard/master/lizard.xsl"')
+SPOOL_SIZE = 1024 * 1024
 
-    impl = xml.dom.minidom.getDOMImplementation()
-    doc = impl.createDocument(None, "cppncss", None)
-    root = doc.documentElement
 
-    processing_instruction = doc.createProcessingInstruction(
-        'xml-stylesheet',
-        'type="text/xsl" ' +
-        'href="https://raw.githubusercontent.com' +
-        '/terryyin/lizard/master/lizard.xsl"')
-    doc.insertBefore(processing_instruction, root)
+def xml_output(all_result, verbose):
+    output = io.StringIO()
+    write_xml(all_result.result, verbose, output)
+    return output.getvalue()
 
-    root.appendChild(_create_function_measure(doc, result, verbose))
-    root.appendChild(_create_file_measure(doc, result, all_result))
 
-    return doc.toprettyxml()
+def write_xml(result, verbose, output):
+    output.write('<?xml version="1.0" ?>\n')
+    output.write('<?xml-stylesheet %s?>\n' % STYLESHEET)
+    output.write('<cppncss>\n')
+    with tempfile.SpooledTemporaryFile(
+            SPOOL_SIZE, mode='w+', encoding='utf-8') as file_items:
+        totals = _write_function_measure(output, file_items, result, verbose)
+        file_items.seek(0)
+        _write_file_measure(output, file_items, totals)
+    output.write('</cppncss>\n')
 
 
-def _create_function_measure(doc, result, verbose):
-    measure = doc.createElement("measure")
-    measure.setAttribute("type", "Function")
-    measure.appendChild(_create_labels(doc, ["Nr.", "NCSS", "CCN"]))
+class _Totals(object):  # pylint: disable=R0903
 
-    number = 0
-    total_func_ncss = 0
-    total_func_ccn = 0
+    def __init__(self):
+        self.files = 0
+        self.functions = 0
+        self.nloc = 0
+        self.function_nloc = 0
+        self.ccn = 0
 
-    for source_file in result:
-        if source_file:
-            file_name = source_file.filename
-            for func in source_file.function_list:
-                number += 1
-                total_func_ncss += func.nloc
-                total_func_ccn += func.cyclomatic_complexity
-                measure.appendChild(
-                    _create_function_item(
-                        doc, number, file_name, func, verbose))
-
-            if number != 0:
-                measure.appendChild(
-                    _create_labeled_value_item(
-                        doc, 'average', "NCSS", str(total_func_ncss / number)))
-                measure.appendChild(
-                    _create_labeled_value_item(
-                        doc, 'average', "CCN", str(total_func_ccn / number)))
-    return measure
-
-
-def _create_file_measure(doc, result, all_result):
-    all_in_one = all_result.as_fileinfo()
-    measure = doc.createElement("measure")
-    measure.setAttribute("type", "File")
-    measure.appendChild(
-        _create_labels(doc, ["Nr.", "NCSS", "CCN", "Functions"]))
-
-    file_nr = 0
-    file_total_ccn = 0
-    file_total_funcs = 0
 
+def _write_function_measure(output, file_items, result, verbose):
+    totals = _Totals()
+    output.write('\t<measure type="Function">\n')
+    _write_labels(output, ["Nr.", "NCSS", "CCN"])
     for source_file in result:
-        file_nr += 1
-        file_total_ccn += source_file.CCN
-        file_total_funcs += len(source_file.function_list)
-        measure.appendChild(
-            _create_file_node(doc, source_file, file_nr))
-
-    if file_nr != 0:
-        file_summary = [("NCSS", all_in_one.nloc / file_nr),
-                        ("CCN", file_total_ccn / file_nr),
-                        ("Functions", file_total_funcs / file_nr)]
+        if not source_file:
+            continue
+        file_name = source_file.filename
+        file_ccn = 0
+        for func in source_file.function_list:
+            totals.functions += 1
+            totals.function_nloc += func.nloc
+            file_ccn += func.cyclomatic_complexity
+            _write_function_item(
+                output, totals.functions, file_name, func, verbose)
+        totals.ccn += file_ccn
+        if totals.functions != 0:
+            _write_labeled_value_item(
+                output, 'average', "NCSS",
+                str(totals.function_nloc / totals.functions))
+            _write_labeled_value_item(
+                output, 'average', "CCN",
+                str(totals.ccn / totals.functions))
+        totals.files += 1
+        totals.nloc += source_file.nloc
+        _write_file_item(file_items, source_file, totals.files, file_ccn)
+    output.write('\t</measure>\n')
+    return totals
+
+
+def _write_file_measure(output, file_items, totals):
+    output.write('\t<measure type="File">\n')
+    _write_labels(output, ["Nr.", "NCSS", "CCN", "Functions"])
+    while True:
+        chunk = file_items.read(SPOOL_SIZE)
+        if not chunk:
+            break
+        output.write(chunk)
+
+    if totals.files != 0:
+        file_summary = [("NCSS", totals.nloc / totals.files),
+                        ("CCN", totals.ccn / totals.files),
+                        ("Functions", totals.functions / totals.files)]
         for key, val in file_summary:
-            measure.appendChild(
-                _create_labeled_value_item(doc, 'average', key, val))
+            _write_labeled_value_item(output, 'average', key, val)
 
-    summary = [("NCSS", all_in_one.nloc),
-               ("CCN", file_total_ccn),
-               ("Functions", file_total_funcs)]
+    summary = [("NCSS", totals.nloc),
+               ("CCN", totals.ccn),
+               ("Functions", totals.functions)]
     for key, val in summary:
-        measure.appendChild(_create_labeled_value_item(doc, 'sum', key, val))
+        _write_labeled_value_item(output, 'sum', key, val)
 
-    if file_total_funcs != 0:
-        summary = [("NCSS", all_in_one.average_nloc),
-                   ("CCN", all_in_one.average_cyclomatic_complexity)]
+    if totals.functions != 0:
+        summary = [("NCSS", totals.function_nloc / totals.functions),
+                   ("CCN", totals.ccn / totals.functions)]
         for key, val in summary:
-            measure.appendChild(_create_labeled_value_item(
-                doc, 'average', key, val))
+            _write_labeled_value_item(output, 'average', key, val)
+    output.write('\t</measure>\n')
 
-    return measure
 
+def _escape(text):
+    ''' escape the way minidom does for both text and attributes '''
+    return (text.replace("&", "&amp;").replace("<", "&lt;")
+            .replace("\"", "&quot;").replace(">", "&gt;"))
 
-def _create_label(doc, name):
-    label = doc.createElement("label")
-    text1 = doc.createTextNode(name)
-    label.appendChild(text1)
-    return label
 
+def _write_labels(output, label_names):
+    output.write('\t\t<labels>\n')
+    for label in label_names:
+        output.write('\t\t\t<label>%s</label>\n' % _escape(label))
+    output.write('\t\t</labels>\n')
 
-def _create_labels(doc, label_name):
-    labels = doc.createElement("labels")
-    for label in label_name:
-        labels.appendChild(_create_label(doc, label))
 
-    return labels
+def _write_item(output, name, values):
+    output.write('\t\t<item name="%s">\n' % _escape(name))
+    for value in values:
+        output.write('\t\t\t<value>%s</value>\n' % _escape(str(value)))
+    output.write('\t\t</item>\n')
 
 
-def _create_function_item(doc, number, file_name, func, verbose):
-    item = doc.createElement("item")
+def _write_function_item(output, number, file_name, func, verbose):
     if verbose:
-        item.setAttribute(
-            "name", "%s at %s:%s" %
-            (func.long_name, file_name, func.start_line))
+        name = "%s at %s:%s" % (func.long_name, file_name, func.start_line)
     else:
-        item.setAttribute(
-            "name", "%s(...) at %s:%s" %
-            (func.name, file_name, func.start_line))
-    value1 = doc.createElement("value")
-    text1 = doc.createTextNode(str(number))
-    value1.appendChild(text1)
-    item.appendChild(value1)
-    value2 = doc.createElement("value")
-    text2 = doc.createTextNode(str(func.nloc))
-    value2.appendChild(text2)
-    item.appendChild(value2)
-    value3 = doc.createElement("value")
-    text3 = doc.createTextNode(str(func.cyclomatic_complexity))
-    value3.appendChild(text3)
-    item.appendChild(value3)
-    return item
-
-
-def _create_labeled_value_item(doc, name, label, value):
-    average_ncss = doc.createElement(name)
-    average_ncss.setAttribute("label", label)
-    average_ncss.setAttribute("value", str(value))
-    return average_ncss
-
-
-def _create_file_node(doc, source_file, file_nr):
-    item = doc.createElement("item")
-    item.setAttribute("name", source_file.filename)
-    value1 = doc.createElement("value")
-    text1 = doc.createTextNode(str(file_nr))
-    value1.appendChild(text1)
-    item.appendChild(value1)
-    value2 = doc.createElement("value")
-    text2 = doc.createTextNode(str(source_file.nloc))
-    value2.appendChild(text2)
-    item.appendChild(value2)
-    value3 = doc.createElement("value")
-    text3 = doc.createTextNode(str(source_file.CCN))
-    value3.appendChild(text3)
-    item.appendChild(value3)
-    value4 = doc.createElement("value")
-    text4 = doc.createTextNode(str(len(source_file.function_list)))
-    value4.appendChild(text4)
-    item.appendChild(value4)
-    return item
+        name = "%s(...) at %s:%s" % (func.name, file_name, func.start_line)
+    _write_item(output, name,
+                [number, func.nloc, func.cyclomatic_complexity])
+
+
+def _write_labeled_value_item(output, name, label, value):
+    output.write('\t\t<%s label="%s" value="%s"/>\n' % (
+        name, _escape(label), _escape(str(value))))
+
+
+def _write_file_item(output, source_file, file_nr, file_ccn):
+    _write_item(output, source_file.filename,
+                [file_nr, source_file.nloc, file_ccn,
+                 len(source_file.function_list)])
@@ -57,7 +57,29 @@ def languages():
     ]
 
 
+def _extension_index():
+    index = {}
+    for order, lan in enumerate(languages()):
+        for ext in lan.ext:
+            index.setdefault(ext.lower(), (order, lan))
+    return index
+
+
+EXTENSION_INDEX = _extension_index()
+COMPOUND_DEPTH = max(ext.count('.') for ext in EXTENSION_INDEX)
+
+
 def get_reader_for(filename):
-    for lan in languages():
-        if lan.match_filename(filename):
-            return lan
+    '''
+    Look the reader up by the file extension. When a file name has
+    several matching (compound) extensions, the reader that comes
+    first in languages() wins, as it did when each reader was asked
+    in turn.
+    '''
+    parts = filename.lower().rsplit('.', COMPOUND_DEPTH + 1)
+    best = None
+    for i in range(1, len(parts)):
+        match = EXTENSION_INDEX.get('.'.join(parts[i:]))
+        if match and (best is None or match[0] < best[0]):
+            best = match
+    return best and best[1]
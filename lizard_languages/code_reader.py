@@ -4,7 +4,7 @@ Base class for all language parsers
 
 import re
 from copy import copy
-from functools import reduce
+from functools import reduce, lru_cache
 from operator import or_
 
 
@@ -86,6 +86,58 @@ class CodeStateMachine:
         return decorator
 
 
+_FLAG_DICT = {
+    'a': re.A,  # ASCII-only matching
+    'i': re.I,  # Ignore case
+    'L': re.L,  # Locale dependent
+    'm': re.M,  # Multi-line
+    's': re.S,  # Dot matches all
+    'u': re.U,  # Unicode matching
+    'x': re.X   # Verbose
+}
+_FLAG_PATTERN = re.compile(r'\(\?[aiLmsux]+\)')
+_COMBINED_SYMBOLS = [
+    "<<=", ">>=", "||", "&&", "===", "!==",
+    "==", "!=", "<=", ">=", "->", "=>",
+    "++", "--", '+=', '-=',
+    "+", "-", '*', '/',
+    '*=', '/=', '^=', '&=', '|=', "..."
+]
+
+
+@lru_cache(maxsize=None)
+def token_pattern(addition=''):
+    """ The compiled token regex for a reader's addition.
+    Each reader passes the same addition for every file, so the
+    pattern is built once per reader instead of once per file.
+    Inline flags like (?i) in the addition apply to the whole pattern.
+    """
+    re_flags = ''.join(opt[2:-1] for opt in _FLAG_PATTERN.findall(addition))
+    flags = reduce(or_, (_FLAG_DICT[flag] for flag in re_flags), 0)
+    add = _FLAG_PATTERN.sub('', addition)
+    # DO NOT put any sub groups in the regex. Good for performance
+    _until_end = r"(?:\\\n|[^\n])*"
+    return re.compile(
+        r"(?:" +
+        r"\/\*.*?\*\/" +
+        add +
+        r"|(?:\d+\')+\d+" +
+        r"|0x(?:[0-9A-Fa-f]+\')+[0-9A-Fa-f]+" +
+        r"|0b(?:[01]+\')+[01]+" +
+        r"|\w+" +
+        r"|\"(?:\\.|[^\"\\])*\"" +
+        r"|\'(?:\\.|[^\'\\])*?\'" +
+        r"|\/\/" + _until_end +
+        r"|\#" +
+        r"|:=|::|\*\*" +
+        r"|\<\s*\?(?:\s*extends\s+\w+)?\s*\>" +
+        r"|" + r"|".join(re.escape(s) for s in _COMBINED_SYMBOLS) +
+        r"|\\\n" +
+        r"|\n" +
+        r"|[^\S\n]+" +
+        r"|.)", re.M | re.S | flags)
+
+
 class CodeReader:
     """ CodeReaders are used to parse function structures from
     code of different
@@ -115,71 +167,22 @@ class CodeReader:
         if not token_class:
             token_class = create_token
 
-        def _generate_tokens(source, add, flags=0):
-            # DO NOT put any sub groups in the regex. Good for performance
-            _until_end = r"(?:\\\n|[^\n])*"
-            combined_symbols = [
-                "<<=", ">>=", "||", "&&", "===", "!==",
-                "==", "!=", "<=", ">=", "->", "=>",
-                "++", "--", '+=', '-=',
-                "+", "-", '*', '/',
-                '*=', '/=', '^=', '&=', '|=', "..."
-            ]
-            token_pattern = re.compile(
-                r"(?:" +
-                r"\/\*.*?\*\/" +
-                add +
-                r"|(?:\d+\')+\d+" +
-                r"|0x(?:[0-9A-Fa-f]+\')+[0-9A-Fa-f]+" +
-                r"|0b(?:[01]+\')+[01]+" +
-                r"|\w+" +
-                r"|\"(?:\\.|[^\"\\])*\"" +
-                r"|\'(?:\\.|[^\'\\])*?\'" +
-                r"|\/\/" + _until_end +
-                r"|\#" +
-                r"|:=|::|\*\*" +
-                r"|\<\s*\?(?:\s*extends\s+\w+)?\s*\>" +
-                r"|" + r"|".join(re.escape(s) for s in combined_symbols) +
-                r"|\\\n" +
-                r"|\n" +
-                r"|[^\S\n]+" +
-                r"|.)", re.M | re.S | flags)
-            macro = ""
-            for match in token_pattern.finditer(source):
-                token = token_class(match)
-                if macro:
-                    if "\\\n" in token or "\n" not in token:
-                        macro += token
-                    else:
-                        yield macro
-                        yield token
-                        macro = ""
-                elif token == "#":
-                    macro = token
+        macro = ""
+        for match in token_pattern(addition).finditer(source_code):
+            token = token_class(match)
+            if macro:
+                if "\\\n" in token or "\n" not in token:
+                    macro += token
                 else:
+                    yield macro
                     yield token
-            if macro:
-                yield macro
-
-        flag_dict = {
-            'a': re.A,  # ASCII-only matching
-            'i': re.I,  # Ignore case
-            'L': re.L,  # Locale dependent
-            'm': re.M,  # Multi-line
-            's': re.S,  # Dot matches all
-            'u': re.U,  # Unicode matching
-            'x': re.X   # Verbose
-        }
-
-        pattern = re.compile(r'\(\?[aiLmsux]+\)')
-        re_flags = ''.join(opt[2:-1] for opt in pattern.findall(addition))
-        flags = reduce(or_, (flag_dict[flag] for flag in re_flags), 0)
-        cleaned_addition = pattern.sub('', addition)
-
-        return _generate_tokens(
-            source_code,
-            cleaned_addition,
-            flags=flags)
+                    macro = ""
+            elif token == "#":
+                macro = token
+            else:
+                yield token
+        if macro:
+            yield macro
 
     def __call__(self, tokens, reader):
         self.context = reader.context
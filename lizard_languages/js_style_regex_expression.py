@@ -4,11 +4,12 @@ generate token with javascript style regular expression.
 
 import re
 
+REGX_PATTERN = re.compile(r"\/(\S*?[^\s\\]\/)+?(igm)*")
+REGX_FLAGS = re.compile(r'^[igm]+$')
+
 
 def js_style_regex_expression(func):
     def generate_tokens_with_regex(source_code, addition='', token_class=None):
-        regx_regx = r"\/(\S*?[^\s\\]\/)+?(igm)*"
-        regx_pattern = re.compile(regx_regx)
         tokens = list(func(source_code, addition, token_class))
         result = []
         i = 0
@@ -35,11 +36,11 @@ def js_style_regex_expression(func):
                         regex_tokens.append(tokens[i])
                         i += 1
                         # Check for regex flags
-                        if i < len(tokens) and re.match(r'^[igm]+$', tokens[i]):
+                        if i < len(tokens) and REGX_FLAGS.match(tokens[i]):
                             regex_tokens.append(tokens[i])
                             i += 1
                     combined = ''.join(regex_tokens)
-                    if regx_pattern.match(combined):
+                    if REGX_PATTERN.match(combined):
                         result.append(combined)
                     else:
                         result.extend(regex_tokens)
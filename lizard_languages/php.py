@@ -226,6 +226,9 @@ class PHPLanguageStates(CodeStateMachine):
                 self._state = self._state_global
 
 
+PHP_CODE_BLOCK = re.compile(r"\<\?(?:php)?(.*?)(?:(\?\>)|\Z)", re.M | re.S)
+
+
 class PHPReader(CodeReader, CCppCommentsMixin):
     # pylint: disable=R0903
 
@@ -239,10 +242,7 @@ class PHPReader(CodeReader, CCppCommentsMixin):
         addition += r"|(?:\$\w+)"
         addition += r"|(?:\<{3}(?P<quote>\w+).*?(?P=quote))"
         current_pos = 0
-        code_block_pattern = re.compile(
-                r"\<\?(?:php)?(.*?)(?:(\?\>)|\Z)",
-                re.M | re.S)
-        for match in code_block_pattern.finditer(source_code):
+        for match in PHP_CODE_BLOCK.finditer(source_code):
             if source_code[current_pos:match.start()]:
                 yield '"' + source_code[current_pos:match.start()] + '"'
             for token in CodeReader.generate_tokens(
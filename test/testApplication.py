@@ -3,39 +3,51 @@ from mock import patch
 import lizard
 import os
 import sys
+from shutil import rmtree
+from tempfile import mkdtemp
+
+
+class SourceDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.source_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.source_dir)
+
+    def add_source_file(self, name):
+        open(os.path.join(self.source_dir, name), 'w').close()
 
 
-@patch('lizard.md5_hash_file')
 @patch('lizard.auto_read', create=True)
-@patch.object(os, 'walk')
 @patch.object(lizard, 'print_result')
-class TestApplication(unittest.TestCase):
+class TestApplication(SourceDirTestCase):
 
-    def testEmptyResult(self, print_result, os_walk, mock_open, _):
+    def testEmptyResult(self, print_result, mock_open):
 
         def check_empty_result(result, options, scheme, _):
             self.assertEqual([], list(result))
             return 0
 
-        os_walk.return_value = [('.', [], [])]
         print_result.side_effect = check_empty_result
-        lizard.main(['lizard'])
+        lizard.main(['lizard', self.source_dir])
 
-    def testFilesWithFunction(self, print_result, os_walk, mock_open, _):
+    def testFilesWithFunction(self, print_result, mock_open):
         def check_result(result, options, scheme, _):
             fileInfos = list(result)
             self.assertEqual(1, len(fileInfos))
             self.assertEqual('foo', fileInfos[0].function_list[0].name)
             return 0
-        os_walk.return_value = [('.', [], ['a.cpp'])]
+        self.add_source_file('a.cpp')
         mock_open.return_value = "void foo(){}"
         print_result.side_effect = check_result
-        lizard.main(['lizard'])
+        lizard.main(['lizard', self.source_dir])
 
 
-class IntegrationTests(unittest.TestCase):
+class IntegrationTests(SourceDirTestCase):
 
     def setUp(self):
+        SourceDirTestCase.setUp(self)
         self.source_code = '''
         void foo() {
         #if
@@ -65,11 +77,9 @@ class IntegrationTests(unittest.TestCase):
         lizard.main(argv)
         return self.fileInfos
 
-    @patch('lizard.md5_hash_file')
-    @patch.object(os, 'walk')
-    def runApplicationWithArgv(self, argv, os_walk, _):
-        os_walk.return_value = [('.', [], ['a.cpp'])]
-        return self.run_with_mocks(argv, self.source_code)
+    def runApplicationWithArgv(self, argv):
+        self.add_source_file('a.cpp')
+        return self.run_with_mocks(argv + [self.source_dir], self.source_code)
 
     def test_with_preprocessor_counted_in_CCN(self):
         self.runApplicationWithArgv(['lizard'])
@@ -1,20 +1,41 @@
 import unittest
-import platform
+from shutil import rmtree
+from tempfile import mkdtemp
 from mock import patch
-from lizard import get_all_source_files
+from fnmatch import fnmatch
+from lizard import get_all_source_files, get_source_files_with_content, \
+    walk_source_tree, _scan_directory, ExcludePatterns, read_exclude_file
 import os
 
 
-def which_system():
-    return platform.system()
+class SourceTreeTestCase(unittest.TestCase):
 
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = mkdtemp()
+        os.chdir(self.tmp_dir)
 
-class TestFilesFilter(unittest.TestCase):
-    @patch.object(os, "walk")
-    def test_no_matching(self, mock_os_walk):
-        mock_os_walk.return_value = []
-        files = get_all_source_files(["dir"], [], [])
-        self.assertEqual(0, len(list(files)))
+    def tearDown(self):
+        os.chdir(self.cwd)
+        rmtree(self.tmp_dir)
+
+    def write(self, name, content=b"int foo(){}"):
+        directory = os.path.dirname(name)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(name, "wb") as source_file:
+            source_file.write(content)
+        return os.path.join(".", os.path.normpath(name))
+
+    def source_files(self, exclude_patterns=(), lans=(), threads=1):
+        return sorted(get_all_source_files(
+            ["."], list(exclude_patterns), list(lans), threads))
+
+
+class TestFilesFilter(SourceTreeTestCase):
+
+    def test_no_matching(self):
+        self.assertEqual([], self.source_files())
 
     @patch.object(os.path, "isfile")
     def test_explicit_file_names(self, mock_isfile):
@@ -28,130 +49,143 @@ class TestFilesFilter(unittest.TestCase):
         files = get_all_source_files(["dir/file.log"], [], [])
         self.assertEqual(["dir/file.log"], list(files))
 
-    @patch('lizard.md5_hash_file')
-    @patch.object(os, "walk")
-    def test_exclude_file_name(self, mock_os_walk, md5):
-        mock_os_walk.return_value = (['.',
-                                      None,
-                                      ['temp.c', 'useful.cpp']],)
-        files = get_all_source_files(["dir"], ["*.c"], [])
-        if which_system() == "Windows":
-            file_names = [".\\useful.cpp"]
-        else:
-            file_names = ["./useful.cpp"]
-        self.assertEqual(file_names, list(files))
-
-    @patch('lizard.md5_hash_file')
-    @patch.object(os, "walk")
-    def test_assigned_languages(self, mock_os_walk, md5):
-        mock_os_walk.return_value = (['.',
-                                      None,
-                                      ['temp.c', 'useful.cpp', 'x.java', 'x.js']],)
-        md5.side_effect = [1, 2, 3, 4, 5, 6, 7, 8, 9, 0]
-        files = list(get_all_source_files(["dir"], [], ['cpp', 'java']))
-        if which_system() == "Windows":
-            file_names = [".\\temp.c", ".\\useful.cpp", ".\\x.java", ".\\x.js"]
-        else:
-            file_names = ["./temp.c", "./useful.cpp", "./x.java", "./x.js"]
-        self.assertIn(file_names[0], files)
-        self.assertIn(file_names[1], files)
-        self.assertIn(file_names[2], files)
-        self.assertNotIn(file_names[3], files)
-
-    @patch.object(os, "walk")
-    def test_exclude_folder(self, mock_os_walk):
-        mock_os_walk.return_value = (['ut',
-                                      None,
-                                      ['useful.cpp']],)
-        files = get_all_source_files(["dir"], ["ut/*"], [])
-        self.assertEqual([], list(files))
-
-    @patch.object(os, "walk")
-    def test_exclude_folder_recursively(self, mock_os_walk):
-        mock_os_walk.return_value = (['ut/something',
-                                      None,
-                                      ['useful.cpp']],)
-        files = get_all_source_files(["dir"], ["ut/*"], [])
-        self.assertEqual([], list(files))
-
-    @patch.object(os, "walk")
-    def test_exclude_none_supported_files(self, mock_os_walk):
-        mock_os_walk.return_value = (['.',
-                                      None,
-                                      ['useful.txt']],)
-        files = get_all_source_files(["dir"], ['exclude_me'], [])
-        self.assertEqual([], list(files))
-
-    @patch.object(os, "walk")
-    @patch("lizard.auto_open", create=True)
-    def test_duplicates(self, mock_open, mock_os_walk):
-        mock_os_walk.return_value = (['.',
-                                      None,
-                                      ['f1.cpp', 'f2.cpp']],)
-        file_handle = mock_open.return_value.__enter__.return_value
-        file_handle.read.return_value = "int foo(){haha();\n}"
-        files = get_all_source_files(["dir"], [], [])
-        if which_system() == "Windows":
-            file_names = [".\\f1.cpp"]
-        else:
-            file_names = ["./f1.cpp"]
-        self.assertEqual(file_names, list(files))
-
-    @patch.object(os, "walk")
-    @patch("lizard.auto_open", create=True)
-    def test_nonduplicates(self, mock_open, mock_os_walk):
-        mock_os_walk.return_value = (['.',
-                                      None,
-                                      ['f1.cpp', 'f2.cpp']],)
-        file_handle = mock_open.return_value.__enter__.return_value
-        outs = ["int foo(){{haha({param});\n}}".format(param=i) for i in range(2)]
-        file_handle.read.side_effect = lambda: outs.pop()
-        files = get_all_source_files(["dir"], [], [])
-        if which_system() == "Windows":
-            file_names = [".\\f1.cpp", ".\\f2.cpp"]
-        else:
-            file_names = ["./f1.cpp", "./f2.cpp"]
-        self.assertEqual(file_names, list(files))
-
-    @patch.object(os, "walk")
-    @patch("lizard.auto_open", create=True)
-    def test_fail_to_open_file_should_be_allowed(self, mock_open, mock_os_walk):
-        mock_os_walk.return_value = (['.',
-                                      None,
-                                      ['f1.cpp', 'f2.cpp']],)
-        file_handle = mock_open.side_effect = IOError
-        files = get_all_source_files(["dir"], [], [])
-        if which_system() == "Windows":
-            file_names = [".\\f1.cpp", ".\\f2.cpp"]
-        else:
-            file_names = ["./f1.cpp", "./f2.cpp"]
-        self.assertEqual(file_names, list(files))
-
-    @patch.object(os.path, "exists")
-    @patch.object(os.path, "relpath")
-    @patch.object(os, "walk")
-    @patch("lizard.auto_read")
-    def test_gitignore_filter(self, mock_auto_read, mock_os_walk, mock_relpath, mock_exists):
-        mock_os_walk.return_value = (['.',
-                                    None,
-                                    ['temp.c', 'node_modules/file.js', 'useful.cpp']], )
-        
-        def exists_side_effect(path):
-            return path.endswith('.gitignore')
-        mock_exists.side_effect = exists_side_effect
-        
-        def relpath_side_effect(path, start):
-            # Return paths in a normalized format
-            if path.startswith('./'):
-                path = path[2:]
-            return path.replace(os.sep, '/')
-        mock_relpath.side_effect = relpath_side_effect
-        
-        mock_auto_read.return_value = "node_modules/\n*.c\n"
-        
-        files = get_all_source_files(["dir"], [], [])
-        if which_system() == "Windows":
-            file_names = [".\\useful.cpp"]
-        else:
-            file_names = ["./useful.cpp"]
-        self.assertEqual(file_names, list(files))
+    def test_exclude_file_name(self):
+        self.write("temp.c", b"int a(){}")
+        useful = self.write("useful.cpp", b"int b(){}")
+        self.assertEqual([useful], self.source_files(["*.c"]))
+
+    def test_assigned_languages(self):
+        temp = self.write("temp.c", b"int a(){}")
+        useful = self.write("useful.cpp", b"int bb(){}")
+        java = self.write("x.java", b"int ccc(){}")
+        self.write("x.js", b"int dddd(){}")
+        self.assertEqual([temp, useful, java],
+                         self.source_files(lans=['cpp', 'java']))
+
+    def test_exclude_folder(self):
+        self.write("ut/useful.cpp")
+        self.assertEqual([], sorted(get_all_source_files(
+            ["ut"], ["ut/*"], [])))
+
+    def test_exclude_folder_recursively(self):
+        self.write("ut/something/useful.cpp")
+        self.assertEqual([], sorted(get_all_source_files(
+            ["ut"], ["ut/*"], [])))
+
+    def test_exclude_none_supported_files(self):
+        self.write("useful.txt")
+        self.assertEqual([], self.source_files(['exclude_me']))
+
+    def test_gitignore_filter(self):
+        self.write(".gitignore", b"node_modules/\n*.c\n")
+        self.write("temp.c", b"int a(){}")
+        self.write("node_modules/file.js", b"int bb(){}")
+        useful = self.write("useful.cpp", b"int ccc(){}")
+        self.assertEqual([useful], self.source_files())
+
+    def test_files_in_subdirectories(self):
+        first = self.write("a/b/deep.c", b"int a(){}")
+        second = self.write("a/top.c", b"int bb(){}")
+        self.assertEqual([first, second], self.source_files())
+
+    def test_walk_in_threads_keeps_the_order(self):
+        for i in range(20):
+            self.write("d%d/e%d/f.c" % (i % 4, i), b"int f%d(){}" % i)
+        self.assertEqual(list(get_all_source_files(["."], [], [])),
+                         list(get_all_source_files(["."], [], [], 4)))
+
+
+class TestDirectoryPruning(SourceTreeTestCase):
+
+    def walked_directories(self, exclude_patterns):
+        with patch("lizard._scan_directory",
+                   side_effect=_scan_directory) as scan:
+            list(get_all_source_files(["."], exclude_patterns, []))
+        return sorted(os.path.normpath(call[0][0])
+                      for call in scan.call_args_list)
+
+    def test_excluded_directories_are_not_entered(self):
+        self.write("src/a.c")
+        self.write("node_modules/lib/b.js")
+        self.assertEqual([".", "src"],
+                         self.walked_directories(["./node_modules/*"]))
+
+    def test_git_ignored_directories_are_not_entered(self):
+        self.write(".gitignore", b"build/\n")
+        self.write("src/a.c")
+        self.write("build/gen/b.c")
+        self.assertEqual([".", "src"], self.walked_directories([]))
+
+    def test_pattern_not_covering_the_directory_does_not_prune(self):
+        self.write("src/a.c")
+        self.assertEqual([".", "src"], self.walked_directories(["*.c"]))
+
+    def test_pruned_walk(self):
+        self.write("keep/a.c")
+        self.write("skip/b.c")
+        files = walk_source_tree(
+            ".", lambda directory: directory.endswith("skip"))
+        self.assertEqual([os.path.join(".", "keep", "a.c")], list(files))
+
+
+class TestExcludePatterns(SourceTreeTestCase):
+
+    def test_same_as_fnmatch(self):
+        patterns = ["*.c", "./ut/*", "*/gen?/*", "[ab]*.h"]
+        excludes = ExcludePatterns(patterns)
+        for name in ["a.c", "a.cpp", "./ut/x/y.cpp", "./src/gen1/a.cpp",
+                     "./src/gen/a.cpp", "a.h", "./b.h", "c.h"]:
+            self.assertEqual(any(fnmatch(name, p) for p in patterns),
+                             excludes.excludes(name), name)
+
+    def test_directories(self):
+        excludes = ExcludePatterns(["./ut/*", "*.c"])
+        self.assertTrue(excludes.excludes_directory(os.path.join(".", "ut")))
+        self.assertFalse(excludes.excludes_directory("src"))
+
+    def test_no_patterns(self):
+        self.assertFalse(ExcludePatterns([]).excludes("a.c"))
+        self.assertFalse(ExcludePatterns([]).excludes_directory("."))
+
+    def test_exclude_file(self):
+        self.write("excludes.txt", b"# generated code\n\n./gen/*\n  *.h  \n")
+        self.assertEqual(["./gen/*", "*.h"], read_exclude_file("excludes.txt"))
+
+
+class TestDuplicateFiles(SourceTreeTestCase):
+
+    def test_duplicates(self):
+        self.write("f1.cpp", b"int foo(){haha();\n}")
+        self.write("f2.cpp", b"int foo(){haha();\n}")
+        self.assertEqual(1, len(self.source_files()))
+
+    def test_nonduplicates_of_the_same_size(self):
+        first = self.write("f1.cpp", b"int foo(){haha(0);\n}")
+        second = self.write("f2.cpp", b"int foo(){haha(1);\n}")
+        self.assertEqual([first, second], self.source_files())
+
+    def test_files_of_different_sizes_are_not_read(self):
+        first = self.write("f1.cpp", b"int foo(){}")
+        second = self.write("f2.cpp", b"int foo(){haha();}")
+        with patch("lizard._read_bytes") as read_bytes:
+            self.assertEqual([first, second], self.source_files())
+        self.assertFalse(read_bytes.called)
+
+    @unittest.skipUnless(hasattr(os, "link"), "needs hard links")
+    def test_hard_links_are_duplicates(self):
+        os.link(self.write("f1.cpp"), "f2.cpp")
+        self.assertEqual(1, len(self.source_files()))
+
+    def test_content_read_for_hashing_is_kept(self):
+        self.write("f1.cpp", b"int foo(){haha(0);\n}")
+        self.write("f2.cpp", b"int foo(){haha(1);\n}")
+        result = list(get_source_files_with_content(["."], [], []))
+        self.assertEqual(None, result[0][1])
+        with open(result[1][0], "rb") as source_file:
+            self.assertEqual(source_file.read(), result[1][1])
+
+    @patch("lizard._read_bytes", return_value=None)
+    def test_fail_to_open_file_should_be_allowed(self, _):
+        first = self.write("f1.cpp")
+        second = self.write("f2.cpp")
+        self.assertEqual([first, second], self.source_files())
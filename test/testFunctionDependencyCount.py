@@ -1,6 +1,12 @@
+import os
 import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+from mock import Mock, patch
+from lizard import FileAnalyzer, analyze_files, get_extensions
 from .testHelpers import get_cpp_function_list_with_extension
 from lizard_ext.lizarddependencycount import LizardExtension as DependencyCounter
+from lizard_ext.lizarddependencycount import resolve_imports
 
 
 class TestFunctionDependencyCount(unittest.TestCase):
@@ -30,3 +36,73 @@ class TestFunctionDependencyCount(unittest.TestCase):
             "import kok as www import tree, java as monster, coffee import java public board { private void function() { java += 1; java.tree = green; www.yay(0); teacher.lecture(0); }",
             DependencyCounter())
         self.assertEqual(3, result[0].dependency_count)
+
+
+class TestImportGraph(unittest.TestCase):
+
+    def imports(self, code, filename="a.cpp"):
+        return FileAnalyzer(get_extensions([DependencyCounter()])) \
+            .analyze_source_code(filename, code).imports
+
+    def test_includes(self):
+        self.assertEqual(["stdio.h", "foo/bar.h"], self.imports(
+            '#include <stdio.h>\n#include "foo/bar.h"\nint fun(){}'))
+
+    def test_python_imports(self):
+        self.assertEqual(["os.path", "a.b", "x", "z", "..p", "w"],
+                         self.imports(
+                             "import os.path\nfrom a.b import c as d, e\n"
+                             "import x as y, z\nfrom ..p import r\n"
+                             "import w\ndef fun():\n  pass\n", "a.py"))
+
+    def test_java_imports(self):
+        self.assertEqual(["java.util.List", "a.b.C", "a.c"], self.imports(
+            "import java.util.List;\nimport static a.b.C;\n"
+            "import a.c.*;\nclass A { void fun(){} }", "A.java"))
+
+    def test_javascript_imports(self):
+        self.assertEqual(["./mod", "lib"], self.imports(
+            "import x from './mod';\nimport {a, b} from \"lib\";\n"
+            "function fun(){}", "a.js"))
+
+    def test_imports_resolved_to_the_files(self):
+        self.assertEqual({
+            "src/pkg/__init__.py": ["src/pkg/mod.py", "os"],
+            "src/pkg/mod.py": ["src/pkg/__init__.py", "inc/foo/bar.h"],
+            "inc/foo/bar.h": ["stdio.h"]},
+            resolve_imports({
+                "src/pkg/__init__.py": ["pkg.mod", "os"],
+                "src/pkg/mod.py": ["pkg", "foo/bar.h"],
+                "inc/foo/bar.h": ["stdio.h"]}))
+
+    def test_relative_python_imports_resolved_to_the_files(self):
+        self.assertEqual(["json/decoder.py", "util.py"], resolve_imports({
+            "json/__init__.py": [".decoder", "..util"],
+            "json/decoder.py": [], "util.py": []})["json/__init__.py"])
+
+    def test_python_from_that_is_not_an_import(self):
+        self.assertEqual([], self.imports(
+            "def fun():\n  yield from x\n  raise A from None\n", "a.py"))
+
+    def test_ambiguous_imports_are_not_resolved(self):
+        self.assertEqual(["util"], resolve_imports({
+            "a/util.py": [], "b/util.py": [], "c.py": ["util"]})["c.py"])
+
+    @patch('lizard.auto_read', create=True)
+    def test_graph_written_as_an_adjacency_list(self, auto_read):
+        source_files = {"a.cpp": '#include "b.h"\n#include <map>\n',
+                        "b.h": 'int fun(){}'}
+        auto_read.side_effect = lambda filename: source_files[filename]
+        directory = mkdtemp()
+        try:
+            path = os.path.join(directory, "graph.txt")
+            extension = DependencyCounter()
+            extension.set_options(Mock(import_graph=path))
+            list(analyze_files(sorted(source_files),
+                               exts=get_extensions([extension])))
+            with patch('sys.stdout'):
+                extension.print_result()
+            with open(path) as graph:
+                self.assertEqual("a.cpp\tb.h\tmap\nb.h\n", graph.read())
+        finally:
+            rmtree(directory)
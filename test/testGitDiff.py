@@ -0,0 +1,279 @@
+import os
+import subprocess
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+from mock import patch
+from lizard import analyze, FileAnalyzer, parse_args, get_extensions
+from lizard_ext import ResultCache, git_changed_files, load_changed_lines, \
+    GitError
+from lizard_ext.gitdiff import parse_unified_diff, ChangedLines
+
+
+class GitRepoTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+        self.repo = os.path.join(self.tmp_dir, "repo")
+        os.mkdir(self.repo)
+        self.git("init", "-q")
+        self.git("config", "user.email", "test@example.com")
+        self.git("config", "user.name", "test")
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def git(self, *args):
+        subprocess.check_output(("git", "-C", self.repo) + args)
+
+    def write(self, name, code):
+        path = os.path.join(self.repo, name)
+        with open(path, "w") as source_file:
+            source_file.write(code)
+        return path
+
+    def commit(self, message):
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", message)
+
+
+class TestGitChangedFiles(GitRepoTestCase):
+
+    def test_changed_files_in_range(self):
+        self.write("a.c", "int a(){}")
+        self.write("b.c", "int b(){}")
+        self.commit("first")
+        self.write("b.c", "int b(){if(x);}")
+        self.write("c.c", "int c(){}")
+        self.commit("second")
+        changed = git_changed_files("HEAD~1..HEAD", self.repo)
+        self.assertEqual(
+            ["b.c", "c.c"], sorted(os.path.basename(f) for f in changed))
+
+    def test_deleted_files_are_not_changed_files(self):
+        self.write("a.c", "int a(){}")
+        self.commit("first")
+        os.remove(os.path.join(self.repo, "a.c"))
+        self.commit("second")
+        self.assertEqual([], git_changed_files("HEAD~1..HEAD", self.repo))
+
+    def test_single_revision_compares_with_working_tree(self):
+        self.write("a.c", "int a(){}")
+        self.commit("first")
+        self.write("a.c", "int a(){if(x);}")
+        self.write("new.c", "int n(){}")
+        changed = git_changed_files("HEAD", self.repo)
+        self.assertEqual(
+            ["a.c", "new.c"], sorted(os.path.basename(f) for f in changed))
+
+    def test_not_a_repository(self):
+        with self.assertRaises(GitError):
+            git_changed_files("HEAD", self.tmp_dir)
+
+
+class TestDiffAnalysis(GitRepoTestCase):
+
+    def setUp(self):
+        GitRepoTestCase.setUp(self)
+        self.cache = ResultCache(os.path.join(self.tmp_dir, "cache"), 10)
+        self.write("a.c", "int a(){}")
+        self.write("b.c", "int b(){}")
+        self.write("notes.txt", "nothing to analyze")
+        self.commit("first")
+
+    def analyze_diff(self, diff, cache=None, exts=None):
+        with patch.object(FileAnalyzer, "analyze_source_code",
+                          autospec=True,
+                          side_effect=FileAnalyzer.analyze_source_code
+                          ) as analyzer:
+            result = list(analyze([self.repo], cache=cache, diff=diff,
+                                  exts=exts))
+        analyzed = sorted(
+            os.path.basename(call[0][1]) for call in analyzer.call_args_list)
+        functions = sorted(
+            f.name for fileinfo in result for f in fileinfo.function_list)
+        return analyzed, functions
+
+    def test_only_changed_files_without_cache(self):
+        self.write("b.c", "int b2(){}")
+        self.write("notes.txt", "changed")
+        analyzed, functions = self.analyze_diff("HEAD")
+        self.assertEqual(["b.c"], analyzed)
+        self.assertEqual(["b2"], functions)
+
+    def test_changed_files_are_named_under_the_given_path(self):
+        self.write("b.c", "int b2(){}")
+        result = list(analyze([self.repo], diff="HEAD"))
+        self.assertEqual([os.path.join(self.repo, "b.c")],
+                         [fileinfo.filename for fileinfo in result])
+
+    def test_first_run_with_cache_analyzes_everything(self):
+        analyzed, functions = self.analyze_diff("HEAD", self.cache)
+        self.assertEqual(["a.c", "b.c"], analyzed)
+        self.assertEqual(["a", "b"], functions)
+
+    def test_unchanged_files_come_from_the_previous_run(self):
+        self.analyze_diff("HEAD", self.cache)
+        self.write("b.c", "int b2(){}")
+        self.write("c.c", "int c(){}")
+        self.commit("second")
+        analyzed, functions = self.analyze_diff("HEAD~1..HEAD", self.cache)
+        self.assertEqual(["b.c", "c.c"], analyzed)
+        self.assertEqual(["a", "b2", "c"], functions)
+
+    def test_deleted_files_are_dropped_from_the_result(self):
+        self.analyze_diff("HEAD", self.cache)
+        os.remove(os.path.join(self.repo, "a.c"))
+        self.commit("second")
+        analyzed, functions = self.analyze_diff("HEAD~1..HEAD", self.cache)
+        self.assertEqual([], analyzed)
+        self.assertEqual(["b"], functions)
+
+    def test_files_modified_outside_the_range_are_analyzed_again(self):
+        self.analyze_diff("HEAD", self.cache)
+        self.write("a.c", "int a2(){ return 0; }")
+        self.commit("second")
+        self.write("b.c", "int b2(){}")
+        self.commit("third")
+        analyzed, functions = self.analyze_diff("HEAD~1..HEAD", self.cache)
+        self.assertEqual(["a.c", "b.c"], analyzed)
+        self.assertEqual(["a2", "b2"], functions)
+
+    def test_results_of_other_extensions_are_not_reused(self):
+        self.write("a.c", "int a(){switch(x){case 1: case 2: case 3:;}}")
+        self.commit("second")
+        self.analyze_diff("HEAD", self.cache, get_extensions(["modified"]))
+        result = list(analyze([self.repo], cache=self.cache, diff="HEAD"))
+        ccn = dict((f.name, f.cyclomatic_complexity)
+                   for fileinfo in result for f in fileinfo.function_list)
+        self.assertEqual(4, ccn["a"])
+
+    def test_files_added_outside_the_range_are_analyzed(self):
+        self.analyze_diff("HEAD", self.cache)
+        self.write("b.c", "int b2(){}")
+        self.commit("second")
+        self.write("c.c", "int c(){}")
+        analyzed, functions = self.analyze_diff("HEAD~1..HEAD", self.cache)
+        self.assertEqual(["b.c", "c.c"], analyzed)
+        self.assertEqual(["a", "b2", "c"], functions)
+
+    def test_manifest_names_files_by_their_path_in_the_repository(self):
+        self.analyze_diff("HEAD", self.cache)
+        root = os.path.realpath(self.repo)
+        self.assertEqual(
+            {"a.c", "b.c"},
+            set(name for repo, name in self.cache.load_manifest()
+                if os.path.realpath(repo) == root))
+
+    def test_deleted_files_are_removed_from_the_manifest(self):
+        self.analyze_diff("HEAD", self.cache)
+        os.remove(os.path.join(self.repo, "a.c"))
+        self.write("b.c", "int b2(){}")
+        self.analyze_diff("HEAD", self.cache)
+        self.assertEqual(["b.c"], sorted(
+            name for _, name in self.cache.load_manifest()))
+
+
+class TestUnifiedDiff(unittest.TestCase):
+
+    def test_new_side_of_hunks(self):
+        changes = parse_unified_diff([
+            "--- a/src/a.c",
+            "+++ b/src/a.c",
+            "@@ -1,2 +1,3 @@",
+            " int a;",
+            "+int b;",
+            " int c;",
+            "@@ -10 +11 @@ int foo()",
+            "-    return 0;",
+            "+    return 1;",
+            "--- a/old.c",
+            "+++ /dev/null",
+            "@@ -1,3 +0,0 @@",
+            "-a",
+            "-b",
+            "-c",
+        ])
+        self.assertEqual({os.path.join("src", "a.c"): [(1, 3), (11, 11)]},
+                         changes)
+
+    def test_deletion_marks_the_lines_around_it(self):
+        changes = parse_unified_diff([
+            "+++ b/a.c",
+            "@@ -5,2 +4,0 @@",
+        ])
+        self.assertEqual({"a.c": [(4, 5)]}, changes)
+
+    def test_added_lines_are_not_file_headers(self):
+        changes = parse_unified_diff([
+            "--- a/a.c",
+            "+++ b/a.c",
+            "@@ -1,0 +1,2 @@",
+            "+++ b/x = 1;",
+            "+++ y;",
+            "@@ -8 +10 @@",
+            "-a",
+            "\\ No newline at end of file",
+            "+b",
+            "+++ b/b.c",
+            "@@ -1 +1 @@",
+            "+c",
+        ])
+        self.assertEqual({"a.c": [(1, 2), (10, 10)], "b.c": [(1, 1)]},
+                         changes)
+
+
+class TestChangedLines(unittest.TestCase):
+
+    def setUp(self):
+        self.changed = ChangedLines({"a.c": [(20, 22), (1, 3), (4, 5),
+                                             (100, 100)]})
+
+    def test_merged_ranges(self):
+        self.assertEqual(
+            ([1, 20, 100], [5, 22, 100]),
+            self.changed.index[os.path.abspath("a.c")])
+
+    def test_overlapping_functions(self):
+        self.assertTrue(self.changed.overlaps("a.c", 5, 10))
+        self.assertTrue(self.changed.overlaps("a.c", 10, 20))
+        self.assertTrue(self.changed.overlaps("./a.c", 21, 21))
+        self.assertTrue(self.changed.overlaps("a.c", 90, 200))
+
+    def test_functions_without_changes(self):
+        self.assertFalse(self.changed.overlaps("a.c", 6, 19))
+        self.assertFalse(self.changed.overlaps("a.c", 23, 99))
+        self.assertFalse(self.changed.overlaps("b.c", 1, 100))
+
+
+class TestChangedFunctionAnalysis(GitRepoTestCase):
+
+    def setUp(self):
+        GitRepoTestCase.setUp(self)
+        self.write("a.c", "int a1(){\n}\nint a2(){\n}\n")
+        self.write("b.c", "int b(){}\n")
+        self.commit("first")
+        self.write("a.c", "int a1(){\n}\nint a2(){\n if(x);\n}\n")
+        self.write("notes.txt", "nothing to analyze")
+        self.commit("second")
+
+    def function_names(self, changed_lines):
+        result = analyze([self.repo], changed_lines=changed_lines)
+        return [(os.path.basename(fileinfo.filename),
+                 [f.name for f in fileinfo.function_list])
+                for fileinfo in result]
+
+    def test_changed_functions_in_git_range(self):
+        changed_lines = load_changed_lines("HEAD~1..HEAD", self.repo)
+        self.assertEqual([("a.c", ["a2"])], self.function_names(changed_lines))
+
+    def test_changed_functions_in_patch_file(self):
+        patch_file = os.path.join(self.tmp_dir, "change.patch")
+        with open(patch_file, "w") as patch:
+            patch.write("+++ b/b.c\n@@ -1 +1 @@\n+int b(){}\n")
+        changed_lines = load_changed_lines(patch_file, self.repo)
+        self.assertEqual([("b.c", ["b"])], self.function_names(changed_lines))
+
+    def test_diff_and_diff_lines_are_exclusive(self):
+        with patch("sys.stderr"), self.assertRaises(SystemExit):
+            parse_args(["lizard", "--diff", "HEAD", "--diff_lines", "HEAD"])
@@ -0,0 +1,131 @@
+import os
+import subprocess
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+from lizard import get_all_source_files
+from lizard_ext import GitIgnore
+from lizard_ext.gitignore import IgnoreRules
+
+
+class TestIgnoreRules(unittest.TestCase):
+
+    def ignored(self, patterns, path, is_dir=False):
+        return IgnoreRules(patterns).match(path, is_dir)
+
+    def test_name_matches_at_any_depth(self):
+        self.assertTrue(self.ignored(["*.o"], "a.o"))
+        self.assertTrue(self.ignored(["*.o"], "src/lib/a.o"))
+        self.assertEqual(None, self.ignored(["*.o"], "a.c"))
+
+    def test_pattern_with_slash_is_anchored(self):
+        self.assertTrue(self.ignored(["/out"], "out", True))
+        self.assertEqual(None, self.ignored(["/out"], "src/out", True))
+        self.assertTrue(self.ignored(["doc/gen"], "doc/gen", True))
+        self.assertEqual(None, self.ignored(["doc/gen"], "x/doc/gen", True))
+
+    def test_star_does_not_cross_directories(self):
+        self.assertEqual(None, self.ignored(["src/*.c"], "src/a/b.c"))
+        self.assertTrue(self.ignored(["src/*.c"], "src/b.c"))
+
+    def test_double_star(self):
+        self.assertTrue(self.ignored(["**/gen"], "a/b/gen", True))
+        self.assertTrue(self.ignored(["a/**/gen"], "a/gen", True))
+        self.assertTrue(self.ignored(["a/**/gen"], "a/x/y/gen", True))
+        self.assertTrue(self.ignored(["a/**"], "a/x/y.c"))
+
+    def test_directory_only_pattern(self):
+        self.assertTrue(self.ignored(["build/"], "build", True))
+        self.assertEqual(None, self.ignored(["build/"], "build"))
+
+    def test_last_match_wins(self):
+        self.assertFalse(self.ignored(["*.c", "!keep.c"], "keep.c"))
+        self.assertTrue(self.ignored(["!keep.c", "*.c"], "keep.c"))
+
+    def test_comments_escapes_and_classes(self):
+        self.assertEqual(None, self.ignored(["# a.c", ""], "# a.c"))
+        self.assertTrue(self.ignored(["\\#a.c"], "#a.c"))
+        self.assertTrue(self.ignored(["f[0-9].c"], "f1.c"))
+        self.assertEqual(None, self.ignored(["f[!0-9].c"], "f1.c"))
+        self.assertTrue(self.ignored(["f?.c  "], "fx.c"))
+
+
+class TestGitIgnore(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = mkdtemp()
+        os.chdir(self.tmp_dir)
+        try:
+            subprocess.check_output(["git", "init", "-q"])
+        except (OSError, subprocess.CalledProcessError):
+            os.makedirs(os.path.join(".git", "info"))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        rmtree(self.tmp_dir)
+
+    def write(self, name, content="int foo(){}"):
+        directory = os.path.dirname(name)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(name, "w") as source_file:
+            source_file.write(content)
+
+    def source_files(self, path="."):
+        return sorted(os.path.relpath(f, path).replace(os.sep, "/")
+                      for f in get_all_source_files([path], [], []))
+
+    def test_nested_gitignore_overrides_the_parent(self):
+        self.write(".gitignore", "*.c\n")
+        self.write("src/.gitignore", "!main.c\n")
+        self.write("a.c")
+        self.write("src/main.c", "int main(){}")
+        self.write("src/util.c", "int util(){}")
+        self.assertEqual(["src/main.c"], self.source_files())
+
+    def test_nested_gitignore_is_relative_to_its_directory(self):
+        self.write("src/.gitignore", "/gen.c\n")
+        self.write("src/gen.c")
+        self.write("src/sub/gen.c", "int sub(){}")
+        self.assertEqual(["src/sub/gen.c"], self.source_files())
+
+    def test_info_exclude_has_the_lowest_precedence(self):
+        self.write(os.path.join(".git", "info", "exclude"), "*.c\n")
+        self.write(".gitignore", "!b.c\n")
+        self.write("a.c")
+        self.write("b.c", "int b(){}")
+        self.assertEqual(["b.c"], self.source_files())
+
+    def test_gitignore_of_the_parents_apply_to_a_subdirectory(self):
+        self.write(".gitignore", "src/gen/\n")
+        self.write("src/gen/a.c")
+        self.write("src/b.c", "int b(){}")
+        self.assertEqual(["b.c"], self.source_files("src"))
+
+    def test_ignored_directories_are_not_entered(self):
+        self.write(".gitignore", "build\n!build/keep.c\n")
+        self.write("build/keep.c")
+        ignore = GitIgnore(".")
+        self.assertTrue(ignore.ignored(os.path.join(".", "build"), True))
+        self.assertEqual([], self.source_files())
+
+    def test_git_directory_is_ignored(self):
+        self.write(os.path.join(".git", "hooks", "a.c"))
+        self.assertEqual([], self.source_files())
+
+    def test_same_files_as_git(self):
+        self.write(".gitignore", "*.o\n/out/\nlib/**/gen/\n!lib/keep.o\n")
+        self.write("lib/.gitignore", "tmp*\n!tmp_keep.c\n")
+        for name in ["a.c", "a.o", "out/b.c", "src/out/c.c", "lib/keep.o",
+                     "lib/x/gen/d.c", "lib/gen/e.c", "lib/tmp1.c",
+                     "lib/tmp_keep.c", "lib/sub/tmp2.c"]:
+            self.write(name, name)
+        try:
+            output = subprocess.check_output(
+                ["git", "ls-files", "--others", "--exclude-standard"])
+        except (OSError, subprocess.CalledProcessError):
+            self.skipTest("git is not available")
+        expected = sorted(name for name in output.decode().splitlines()
+                          if name.endswith(".c"))
+        self.assertEqual(expected, self.source_files())
@@ -32,6 +32,15 @@ class TestLanguageChooser(unittest.TestCase):
     def test_unknown_extension(self):
         self.assertEqual(None, get_reader_for("a.unknown"))
 
+    def test_no_extension(self):
+        self.assertEqual(None, get_reader_for("src.c/Makefile"))
+
+    def test_extension_shared_by_readers_goes_to_the_first(self):
+        self.assertEqual(CLikeReader, get_reader_for("a.MM"))
+
+    def test_only_the_last_extension_counts(self):
+        self.assertEqual(JavaReader, get_reader_for("a.c.java"))
+
     def test_Solidity(self):
         self.assertEqual(SolidityReader, get_reader_for("a.sol"))
 
@@ -1,3 +1,4 @@
+import io
 import unittest
 import sys
 from mock import Mock, patch
@@ -5,9 +6,10 @@ from test.helper_stream import StreamStdoutTestCase
 import os
 from lizard import print_warnings, print_and_save_modules, FunctionInfo, FileInformation,\
     print_result, print_extension_results, get_extensions, OutputScheme, get_warnings, print_clang_style_warning,\
-    parse_args, AllResult
-from lizard_ext import xml_output
+    parse_args, AllResult, print_result_in_bounded_memory, RunningTotal
+from lizard_ext import xml_output, write_xml, write_checkstyle
 from lizard_ext.checkstyleoutput import checkstyle_output
+from xml.dom.minidom import parseString
 
 def print_result_with_scheme(result, option):
     return print_result(result, option, OutputScheme(option.extensions), AllResult)
@@ -164,6 +166,53 @@ class TestAllOutput(StreamStdoutTestCase):
         self.check_whitelist('')
 
 
+class TestBoundedMemoryOutput(StreamStdoutTestCase):
+
+    def file_infos(self):
+        foo = FunctionInfo("foo", 'f1.c', 100)
+        foo.cyclomatic_complexity = 16
+        bar = FunctionInfo("bar", 'f1.c', 200)
+        bar.nloc = 3
+        return [FileInformation('f1.c', 10, [foo, bar]), None,
+                FileInformation('f2.c', 1, [])]
+
+    def output(self, printer, extensions):
+        option = parse_args(["lizard", "--sort", "nloc"])
+        scheme = OutputScheme(extensions)
+        scheme.patch_for_extensions()
+        sys.stdout.stream = ""
+        warning_count = printer(
+            iter(self.file_infos()), option, scheme, AllResult)
+        return warning_count, sys.stdout.stream
+
+    def test_same_output_as_the_default(self):
+        self.assertEqual(
+            self.output(print_result, []),
+            self.output(print_result_in_bounded_memory, []))
+
+    def test_same_output_with_extension_columns(self):
+        extensions = get_extensions(["ND"])
+        self.assertEqual(
+            self.output(print_result, extensions),
+            self.output(print_result_in_bounded_memory, extensions))
+
+    def test_running_total(self):
+        total = RunningTotal(OutputScheme([]))
+        for file_info in self.file_infos()[::2]:
+            total.add(file_info)
+        self.assertEqual(2, total.files)
+        self.assertEqual(11, total.nloc)
+        self.assertEqual(2, total.function_count())
+        self.assertEqual(8.5, total.average_cyclomatic_complexity)
+        self.assertRaises(AttributeError, getattr, total, "average_foo")
+
+    def test_option(self):
+        self.assertEqual(print_result_in_bounded_memory,
+                         parse_args(["lizard", "--low_memory"]).printer)
+        self.assertEqual(print_clang_style_warning,
+                         parse_args(["lizard", "--low_memory", "-w"]).printer)
+
+
 class TestXMLOutput(unittest.TestCase):
     foo = FunctionInfo("foo", '', 100)
     foo.cyclomatic_complexity = 16
@@ -182,6 +231,29 @@ class TestXMLOutput(unittest.TestCase):
         self.assertIn('''<sum label="CCN" value="0"/>''', xml_empty)
         self.assertIn('''<sum label="Functions" value="0"/>''', xml_empty)
 
+    def test_xml_is_well_formed_with_special_characters(self):
+        bar = FunctionInfo('operator<"&>', 'a&b.c', 3)
+        xml = xml_output(AllResult([FileInformation('a&b.c', 2, [bar])]), True)
+        items = parseString(xml).getElementsByTagName("item")
+        self.assertEqual('operator<"&> at a&b.c:3', items[0].getAttribute("name"))
+        self.assertEqual('a&b.c', items[1].getAttribute("name"))
+
+    def test_xml_is_written_while_results_arrive(self):
+        output = io.StringIO()
+
+        def results():
+            yield FileInformation('f1.c', 1, [self.foo])
+            self.assertIn("foo at f1.c:100", output.getvalue())
+        write_xml(results(), True, output)
+        self.assertIn('<sum label="Functions" value="1"/>', output.getvalue())
+
+    @patch('lizard_ext.xmloutput.SPOOL_SIZE', 1)
+    def test_non_ascii_names_after_the_spool_rolls_over(self):
+        bar = FunctionInfo(u'b\u00e4r', u'\u00e4.c', 3)
+        xml = xml_output(AllResult([FileInformation(u'\u00e4.c', 2, [bar])]),
+                         True)
+        self.assertIn(u'<item name="\u00e4.c">', xml)
+
 
 class TestCheckstyleOutput(unittest.TestCase):
     foo = FunctionInfo("foo", '', 100)
@@ -199,3 +271,13 @@ class TestCheckstyleOutput(unittest.TestCase):
     def test_checkstyle_output_on_empty_folder(self):
         xml_empty = checkstyle_output(AllResult([]), True)
         self.assertIn('<checkstyle', xml_empty)
+
+    def test_checkstyle_is_written_while_results_arrive(self):
+        output = io.StringIO()
+
+        def results():
+            yield FileInformation('f1.c', 1, [self.foo])
+            self.assertIn('<file name="f1.c">', output.getvalue())
+        write_checkstyle(results(), True, output)
+        errors = parseString(output.getvalue()).getElementsByTagName("error")
+        self.assertEqual("100", errors[0].getAttribute("line"))
@@ -1,7 +1,13 @@
 from mock import Mock, patch
 import unittest
+import json
+import os
+import re
 import sys
-from lizard_ext import html_output
+from shutil import rmtree
+from tempfile import mkdtemp
+from lizard_ext import html_output, html_report
+from lizard_ext.htmlreport import HtmlReport
 from lizard import parse_args, FunctionInfo, FileInformation, AllResult
 from test.helper_stream import StreamStdoutTestCase
 
@@ -19,3 +25,115 @@ class TestHTMLOutput(StreamStdoutTestCase):
         html_output([self.fileSummary], self.option, None, AllResult)
         self.assertRegex(sys.stdout.stream, r"\<html\>")
 
+
+
+class TestHTMLReport(StreamStdoutTestCase):
+
+    def setUp(self):
+        StreamStdoutTestCase.setUp(self)
+        self.report_dir = mkdtemp()
+        self.option = parse_args(["lizard", "--html_dir", self.report_dir])
+
+    def tearDown(self):
+        rmtree(self.report_dir)
+        StreamStdoutTestCase.tearDown(self)
+
+    def source_file(self, filename, ccns):
+        functions = []
+        for i, ccn in enumerate(ccns):
+            func = FunctionInfo("f%d" % i, filename, i + 1)
+            func.cyclomatic_complexity = ccn
+            functions.append(func)
+        return FileInformation(filename, 10, functions)
+
+    def shards(self):
+        data_dir = os.path.join(self.report_dir, "data")
+        result = {}
+        for name in os.listdir(data_dir):
+            with open(os.path.join(data_dir, name)) as shard:
+                content = shard.read()
+            match = re.match(r"lizardShard\((\d+), (.*)\);\n\Z", content, re.S)
+            result[int(match.group(1))] = json.loads(match.group(2))
+        return result
+
+    def summary(self):
+        with open(os.path.join(self.report_dir, "index.html")) as index:
+            content = index.read()
+        return json.loads(
+            re.search(r"var SUMMARY = (.*);\n", content).group(1))
+
+    def test_option_selects_the_report(self):
+        self.assertEqual(html_report, self.option.printer)
+
+    def test_option_conflicts_with_the_other_outputs(self):
+        for other in (["-X"], ["--csv"], ["--checkstyle"], ["-o", "a.xml"]):
+            with patch("sys.stderr"), self.assertRaises(SystemExit):
+                parse_args(["lizard", "--html_dir", self.report_dir] + other)
+
+    def test_page_loads_one_shard_of_a_directory_at_a_time(self):
+        html_report([self.source_file("a/x.c", [1])],
+                    self.option, None, AllResult)
+        with open(os.path.join(self.report_dir, "index.html")) as index:
+            content = index.read()
+        self.assertIn("loadShard(ids[part]", content)
+        self.assertIn("forgetShards(ids[part])", content)
+
+    def test_summary_of_each_directory(self):
+        html_report([self.source_file("a/x.c", [1, 20]),
+                     self.source_file("a/y.c", [3]),
+                     self.source_file("b/z.c", [])],
+                    self.option, None, AllResult)
+        summary = self.summary()
+        self.assertEqual(
+            [["a", 2, 3, 20, 24, 20, 1, [0]], ["b", 1, 0, 10, 0, 0, 0, []]],
+            summary["directories"])
+        self.assertEqual(3, summary["totals"]["files"])
+        self.assertEqual(1, summary["totals"]["warnings"])
+        self.assertEqual(["a/x.c", "f1", 2], summary["worst"][0][:3])
+        self.assertIn("index.html", sys.stdout.stream)
+
+    def test_functions_go_to_the_shards(self):
+        html_report([self.source_file("a/x.c", [1, 2])],
+                    self.option, None, AllResult)
+        self.assertEqual(
+            {0: {"files": ["a/x.c"],
+                 "rows": [[0, "f0", 1, 1, 1, 1, 0, 1],
+                          [0, "f1", 2, 1, 2, 1, 0, 1]]}},
+            self.shards())
+
+    def test_big_directory_is_split_into_shards(self):
+        report = HtmlReport(self.report_dir, {}, shard_size=2)
+        report.add(self.source_file("a/x.c", [1, 1, 1]))
+        report.add(self.source_file("a/y.c", [1]))
+        report.close()
+        shards = self.shards()
+        self.assertEqual([0, 1], self.summary()["directories"][0][7])
+        self.assertEqual(["a/x.c"], shards[0]["files"])
+        self.assertEqual(["a/x.c", "a/y.c"], shards[1]["files"])
+        self.assertEqual([0, 1], [row[0] for row in shards[1]["rows"]])
+
+    def test_buffered_functions_are_bounded(self):
+        report = HtmlReport(self.report_dir, {}, shard_size=100,
+                            max_buffered=3)
+        report.add(self.source_file("a/x.c", [1, 1]))
+        report.add(self.source_file("b/x.c", [1, 1]))
+        self.assertEqual(2, report.buffered)
+        self.assertEqual([0], report.directories["a"].shards)
+        report.close()
+        self.assertEqual(2, len(self.shards()))
+
+    def test_index_does_not_grow_with_the_functions(self):
+        html_report([self.source_file("a/x.c", [1] * 5000)],
+                    self.option, None, AllResult)
+        index_size = os.path.getsize(
+            os.path.join(self.report_dir, "index.html"))
+        self.assertLess(index_size, 30000)
+        self.assertEqual(3, len(self.shards()))
+
+    def test_script_end_tag_in_names_is_escaped(self):
+        html_report([self.source_file("a/</script>.c", [1])],
+                    self.option, None, AllResult)
+        self.assertEqual(["a/</script>.c"],
+                         self.shards()[0]["files"])
+        with open(os.path.join(self.report_dir, "index.html")) as index:
+            self.assertEqual(1, index.read().count("</script>"))
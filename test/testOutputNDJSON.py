@@ -0,0 +1,77 @@
+import io
+import json
+import unittest
+from lizard_ext import write_ndjson, function_columns
+from lizard import parse_args, print_ndjson, FunctionInfo, FileInformation,\
+    get_extensions, OutputScheme
+
+
+class FlushCountingStream(io.StringIO):
+
+    def __init__(self):
+        io.StringIO.__init__(self)
+        self.flushes = []
+
+    def flush(self):
+        self.flushes.append(len(self.getvalue().splitlines()))
+
+
+class TestNDJSONOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.foo = FunctionInfo("foo", 'FILENAME', 100)
+        self.foo.cyclomatic_complexity = 3
+        self.file_info = FileInformation("FILENAME", 123, [self.foo])
+        self.columns = function_columns(OutputScheme(get_extensions([])))
+
+    def records(self, result, **kwargs):
+        output = io.StringIO()
+        write_ndjson(result, self.columns, output, **kwargs)
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_function_record_then_file_record(self):
+        function, source_file = self.records([self.file_info])
+        self.assertEqual("function", function["type"])
+        self.assertEqual("foo", function["name"])
+        self.assertEqual("FILENAME", function["filename"])
+        self.assertEqual(100, function["start_line"])
+        self.assertEqual(3, function["cyclomatic_complexity"])
+        self.assertEqual(0, function["parameter_count"])
+        self.assertNotIn("location", function)
+        self.assertEqual({"type": "file", "filename": "FILENAME",
+                          "nloc": 123, "token_count": 0,
+                          "cyclomatic_complexity": 3,
+                          "function_count": 1}, source_file)
+
+    def test_extension_columns(self):
+        extensions = get_extensions(["ND"])
+        self.columns = function_columns(OutputScheme(extensions))
+        self.foo.max_nesting_depth = 2
+        function = self.records([self.file_info])[0]
+        self.assertEqual(2, function["max_nesting_depth"])
+
+    def test_skips_empty_results(self):
+        self.assertEqual(1, len(self.records([None, FileInformation("a", 1)])))
+
+    def test_flushes_in_batches(self):
+        output = FlushCountingStream()
+        files = [FileInformation("f%d" % i, 1) for i in range(5)]
+        write_ndjson(files, self.columns, output,
+                     batch_size=2, flush_interval=3600)
+        self.assertEqual([2, 4, 5], output.flushes)
+
+    def test_results_are_written_as_they_arrive(self):
+        output = io.StringIO()
+
+        def result():
+            yield self.file_info
+            self.assertEqual(2, len(output.getvalue().splitlines()))
+        write_ndjson(result(), self.columns, output, flush_interval=0)
+
+    def test_option_and_file_extension(self):
+        self.assertEqual(print_ndjson,
+                         parse_args(["lizard", "--ndjson"]).printer)
+        self.assertEqual(print_ndjson,
+                         parse_args(["lizard", "-o", "a.ndjson"]).printer)
+        self.assertEqual(print_ndjson,
+                         parse_args(["lizard", "-o", "a.jsonl"]).printer)
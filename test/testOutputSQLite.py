@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+from lizard_ext import write_sqlite, function_columns
+from lizard import parse_args, main, print_sqlite, FunctionInfo, \
+    FileInformation, get_extensions, OutputScheme
+
+
+class TestSQLiteOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "result.sqlite")
+        self.columns = function_columns(OutputScheme(get_extensions([])))
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def source_file(self, filename, ccns):
+        functions = []
+        for i, ccn in enumerate(ccns):
+            func = FunctionInfo("f%d" % i, filename, i + 1)
+            func.cyclomatic_complexity = ccn
+            functions.append(func)
+        return FileInformation(filename, 10, functions)
+
+    def query(self, sql, *args):
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute(sql, args).fetchall()
+        finally:
+            connection.close()
+
+    def test_files_and_functions(self):
+        write_sqlite([self.source_file("a.c", [1, 5]), None,
+                      self.source_file("b.c", [])], self.columns, self.path)
+        self.assertEqual(
+            [(1, "a.c", 10, 0, 6, 2), (2, "b.c", 10, 0, 0, 0)],
+            self.query("SELECT * FROM files ORDER BY id"))
+        self.assertEqual(
+            [(1, "a.c", "f1", 2, 5, 0)],
+            self.query("SELECT file_id, filename, name, start_line, "
+                       "cyclomatic_complexity, parameter_count "
+                       "FROM functions WHERE cyclomatic_complexity > 1"))
+
+    def test_top_functions_of_a_directory(self):
+        write_sqlite([self.source_file("src/net/a.c", [3, 9]),
+                      self.source_file("src/netx.c", [20]),
+                      self.source_file("src/io/b.c", [15])],
+                     self.columns, self.path, batch_size=1)
+        self.assertEqual(
+            [("src/net/a.c", "f1"), ("src/net/a.c", "f0")],
+            self.query("SELECT filename, name FROM functions "
+                       "WHERE filename >= ? AND filename < ? "
+                       "ORDER BY cyclomatic_complexity DESC LIMIT 100",
+                       "src/net/", "src/net0"))
+
+    def test_indexes_and_wal(self):
+        write_sqlite([], self.columns, self.path)
+        indexes = set(name for name, in self.query(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"))
+        self.assertEqual({"files_filename", "functions_filename",
+                          "functions_name",
+                          "functions_cyclomatic_complexity",
+                          "functions_nloc"}, indexes)
+        self.assertEqual([("wal",)], self.query("PRAGMA journal_mode"))
+
+    def test_extension_columns(self):
+        self.columns = function_columns(OutputScheme(get_extensions(["ND"])))
+        source_file = self.source_file("a.c", [1])
+        source_file.function_list[0].max_nesting_depth = 4
+        write_sqlite([source_file], self.columns, self.path)
+        self.assertEqual([(4,)], self.query(
+            "SELECT max_nesting_depth FROM functions"))
+
+    def test_overwrites_an_existing_database(self):
+        write_sqlite([self.source_file("a.c", [1])], self.columns, self.path)
+        write_sqlite([self.source_file("b.c", [1])], self.columns, self.path)
+        self.assertEqual([("b.c",)],
+                         self.query("SELECT filename FROM functions"))
+
+    def test_inferred_from_the_output_file(self):
+        self.assertEqual(print_sqlite,
+                         parse_args(["lizard", "-o", self.path]).printer)
+
+    def test_main_writes_the_database(self):
+        source = os.path.join(self.tmp_dir, "foo.c")
+        with open(source, "w") as source_file:
+            source_file.write("int foo() { return 42; }\n")
+        main(["lizard", "-o", self.path, source])
+        self.assertEqual([("foo",)],
+                         self.query("SELECT name FROM functions"))
@@ -0,0 +1,94 @@
+import os
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+from mock import Mock, patch
+from lizard import FileAnalyzer, get_extensions, analyze_files
+from lizard_ext import ResultCache
+from lizard_ext.lizardnd import LizardExtension as NestingDepth
+from lizard_ext.lizardduplicate import LizardExtension as Duplicate
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+        self.cache = ResultCache(self.cache_dir, 1)
+        self.source = os.path.join(self.tmp_dir, "a.cpp")
+        self.write_source("int foo(){if(a) return 1;}\n")
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def write_source(self, code):
+        with open(self.source, "w") as source_file:
+            source_file.write(code)
+
+    def analyze(self, extensions=None):
+        analyzer = FileAnalyzer(get_extensions(extensions or []), self.cache)
+        return analyzer(self.source)
+
+    def cached_entries(self):
+        return list(self.cache.entries())
+
+    def test_result_is_saved_in_the_cache(self):
+        fileinfo = self.analyze()
+        self.assertEqual(1, len(self.cached_entries()))
+        self.assertEqual("foo", fileinfo.function_list[0].name)
+        self.assertEqual(2, fileinfo.function_list[0].cyclomatic_complexity)
+
+    def test_unchanged_file_is_not_analyzed_again(self):
+        self.analyze()
+        with patch.object(FileAnalyzer, "analyze_source_code") as analyze:
+            fileinfo = self.analyze()
+        self.assertFalse(analyze.called)
+        self.assertEqual("foo", fileinfo.function_list[0].name)
+        self.assertEqual(self.source, fileinfo.filename)
+
+    def test_changed_file_is_analyzed_again(self):
+        self.analyze()
+        self.write_source("int bar(){}\n")
+        fileinfo = self.analyze()
+        self.assertEqual("bar", fileinfo.function_list[0].name)
+        self.assertEqual(2, len(self.cached_entries()))
+
+    def test_different_extensions_do_not_share_results(self):
+        self.analyze()
+        fileinfo = self.analyze([NestingDepth()])
+        self.assertEqual(2, len(self.cached_entries()))
+        self.assertEqual(1, fileinfo.function_list[0].max_nesting_depth)
+
+    def test_extension_options_that_change_results_do_not_share_them(self):
+        duplicate = Duplicate()
+        self.analyze([duplicate])
+        duplicate.set_options(Mock(working_threads=1, duplicate_index=None,
+                                   near_miss=True, near_miss_similarity=0.8))
+        self.analyze([duplicate])
+        self.assertEqual(2, len(self.cached_entries()))
+
+    def test_broken_entry_is_treated_as_missing(self):
+        self.analyze()
+        _, _, path = self.cached_entries()[0]
+        with open(path, "wb") as entry:
+            entry.write(b"broken")
+        fileinfo = self.analyze()
+        self.assertEqual("foo", fileinfo.function_list[0].name)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.analyze()
+        _, _, old_entry = self.cached_entries()[0]
+        os.utime(old_entry, (1, 1))
+        self.write_source("int bar(){}\n")
+        self.analyze()
+        self.cache.max_size = os.path.getsize(old_entry)
+        self.cache.evict()
+        remaining = [path for _, _, path in self.cached_entries()]
+        self.assertEqual(1, len(remaining))
+        self.assertNotEqual(old_entry, remaining[0])
+
+    def test_analyze_files_evicts_after_the_last_result(self):
+        self.cache.max_size = 0
+        result = list(analyze_files([self.source], cache=self.cache))
+        self.assertEqual("foo", result[0].function_list[0].name)
+        self.assertEqual([], self.cached_entries())
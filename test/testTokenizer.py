@@ -1,5 +1,5 @@
 import unittest
-from lizard_languages.code_reader import CodeReader
+from lizard_languages.code_reader import CodeReader, token_pattern
 def generate_tokens(source):
     return [t for t in CodeReader.generate_tokens(source)]
 
@@ -125,3 +125,15 @@ class Test_generate_token_for_comments(unittest.TestCase):
         comment = '/**a/*/'
         tokens = generate_tokens(comment)
         self.assertListEqual([comment], tokens)
+
+
+class Test_token_pattern(unittest.TestCase):
+
+    def test_pattern_is_built_once_per_addition(self):
+        self.assertIs(token_pattern(r"|\$\w+"), token_pattern(r"|\$\w+"))
+        self.assertIsNot(token_pattern(""), token_pattern(r"|\$\w+"))
+
+    def test_inline_flags_apply_to_the_whole_pattern(self):
+        pattern = token_pattern(r"(?i)|END\s+IF")
+        self.assertFalse(pattern.pattern.startswith("(?i)"))
+        self.assertEqual("end if", pattern.match("end if").group(0))
@@ -5,12 +5,18 @@ import unittest
 import sys
 from mock import patch, Mock
 from lizard_languages import CLikeReader
-from lizard import map_files_to_analyzer, FunctionInfo, analyze_file, FileInfoBuilder
+from lizard import map_files_to_analyzer, FunctionInfo, analyze_file, FileInfoBuilder, \
+    CompactFileInfo, FileAnalyzer, get_extensions
 
 
 def analyzer_mock(filename):
     return filename
 
+def analyzer_error(filename):
+    if filename == "error":
+        raise ValueError(filename)
+    return filename
+
 class Test_analyze_files(unittest.TestCase):
     def test_NoFiles(self):
         call_count = 0
@@ -46,6 +52,27 @@ class Test_analyze_files(unittest.TestCase):
         r = map_files_to_analyzer(["f1", "f2"], analyzer, 2)
         self.assertSetEqual(set(["f1", "f2"]), set(x for x in r))
 
+    def test_ManyFilesMultipleThreadKeepTheOrder(self):
+        files = ["f%d" % i for i in range(1000)]
+        r = map_files_to_analyzer(files, analyzer_mock, 3)
+        self.assertEqual(files, list(r))
+
+    def test_FilesAreConsumedLazilyByMultipleThread(self):
+        consumed = []
+
+        def files():
+            for i in range(10000):
+                consumed.append(i)
+                yield "f%d" % i
+        r = map_files_to_analyzer(files(), analyzer_mock, 2)
+        self.assertEqual("f0", next(r))
+        r.close()
+        self.assertLess(len(consumed), 10000)
+
+    def test_ErrorInWorkerIsRaised(self):
+        r = map_files_to_analyzer(["f1", "error"], analyzer_error, 2)
+        self.assertRaises(ValueError, list, r)
+
 
 @patch('lizard.auto_read', create=True)
 class Test_FileAnalyzer(unittest.TestCase):
@@ -93,7 +120,52 @@ class Test_Picklability(unittest.TestCase):
         pickle.dumps(FileInfoBuilder("a"))
 
 
-from lizard import warning_filter, FileInformation, whitelist_filter
+class Test_CompactFileInfo(unittest.TestCase):
+
+    CODE = "int foo(int a, int b){if(a) return b;}\nvoid bar(){}\n"
+
+    def round_trip(self, fileinfo, extensions=None):
+        import pickle
+        compact = CompactFileInfo(get_extensions(extensions or []))
+        data = pickle.dumps(compact.pack(fileinfo))
+        return compact.unpack(pickle.loads(data)), data
+
+    def test_round_trip_keeps_everything(self):
+        fileinfo = analyze_file.analyze_source_code("a.c", self.CODE)
+        fileinfo.extra = "for the file"
+        fileinfo.function_list[1].extra = "for the function"
+        result, _ = self.round_trip(fileinfo)
+        self.assertEqual(fileinfo.__dict__.keys(), result.__dict__.keys())
+        self.assertEqual("for the file", result.extra)
+        self.assertEqual(fileinfo.token_count, result.token_count)
+        for original, copy in zip(fileinfo.function_list,
+                                  result.function_list):
+            self.assertEqual(original.__dict__, copy.__dict__)
+        self.assertEqual(["a", "b"], result.function_list[0].parameters)
+
+    def test_extension_columns(self):
+        from lizard_ext.lizardnd import LizardExtension as NestingDepth
+        fileinfo = FileAnalyzer(get_extensions([NestingDepth()])) \
+            .analyze_source_code("a.c", self.CODE)
+        result, _ = self.round_trip(fileinfo, [NestingDepth()])
+        self.assertEqual(1, result.function_list[0].max_nesting_depth)
+
+    def test_function_missing_an_extension_column_is_kept_as_is(self):
+        fileinfo = analyze_file.analyze_source_code("a.c", self.CODE)
+        ext = Mock(FUNCTION_INFO={"dependency_count": {}}, ordering_index=-1)
+        result, _ = self.round_trip(fileinfo, [ext])
+        self.assertFalse(hasattr(result.function_list[0],
+                                 "dependency_count"))
+        self.assertEqual("foo", result.function_list[0].name)
+
+    def test_compact_form_is_smaller(self):
+        import pickle
+        fileinfo = analyze_file.analyze_source_code("a.c", self.CODE * 50)
+        _, data = self.round_trip(fileinfo)
+        self.assertLess(len(data), len(pickle.dumps(fileinfo)) * 0.75)
+
+
+from lizard import warning_filter, FileInformation, whitelist_filter, Whitelist
 
 class TestWarningFilter(unittest.TestCase):
 
@@ -139,3 +211,47 @@ class TestWarningFilterWithWhitelist(unittest.TestCase):
     def test_should_ignore_comments_in_whitelist(self):
         warnings = whitelist_filter(self.WARNINGS, 'foo  #,bar\ni#,bar')
         self.assertEqual(1, len(list(warnings)))
+
+    def test_should_filter_with_a_function_name_glob(self):
+        warnings = whitelist_filter(self.WARNINGS, 'glob f*')
+        self.assertEqual(["bar"], [w.name for w in warnings])
+
+    def test_should_filter_with_a_file_name_glob(self):
+        warnings = whitelist_filter(self.WARNINGS, 'glob another*:foo, bar')
+        self.assertEqual([("foo", "filename"), ("bar", "filename")],
+                         [(w.name, w.filename) for w in warnings])
+
+    def test_glob_star_matches_across_directories(self):
+        warnings = whitelist_filter([FunctionInfo("foo", 'src/a/b.c')],
+                                    'glob src/*.c:foo')
+        self.assertEqual(0, len(list(warnings)))
+
+    def test_file_entry_applies_to_that_file_only(self):
+        warnings = whitelist_filter(self.WARNINGS, 'anotherfile:foo\nx:bar')
+        self.assertEqual([("foo", "filename"), ("bar", "filename")],
+                         [(w.name, w.filename) for w in warnings])
+
+
+class TestWhitelist(unittest.TestCase):
+
+    def test_entries_are_indexed(self):
+        whitelist = Whitelist('foo, a::b\nfile.c:bar  # comment\n')
+        self.assertEqual({'foo', 'a::b'}, whitelist.names)
+        self.assertEqual({('file.c', 'bar')}, whitelist.file_functions)
+        self.assertIsNone(whitelist.glob_match)
+
+    def test_globs_are_compiled_into_one_matcher(self):
+        whitelist = Whitelist('glob test_*\n glob src/*.c:init?\n')
+        self.assertIn(FunctionInfo("test_foo", 'a.c'), whitelist)
+        self.assertIn(FunctionInfo("init2", 'src/x.c'), whitelist)
+        self.assertNotIn(FunctionInfo("init2", 'lib/x.c'), whitelist)
+        self.assertNotIn(FunctionInfo("init", 'src/x.c'), whitelist)
+
+    def test_names_are_matched_exactly_without_the_glob_prefix(self):
+        whitelist = Whitelist('operator*, f?\nfile.c:operator[]')
+        self.assertIn(FunctionInfo("operator*", 'a.c'), whitelist)
+        self.assertNotIn(FunctionInfo("operator*=", 'a.c'), whitelist)
+        self.assertNotIn(FunctionInfo("operator->*", 'a.c'), whitelist)
+        self.assertNotIn(FunctionInfo("fo", 'a.c'), whitelist)
+        self.assertIn(FunctionInfo("operator[]", 'file.c'), whitelist)
+        self.assertIsNone(whitelist.glob_match)
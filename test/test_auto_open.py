@@ -4,7 +4,7 @@ import codecs
 import io
 import os
 from tempfile import NamedTemporaryFile
-from lizard_ext import auto_open, auto_read
+from lizard_ext import auto_open, auto_read, decode_source
 
 
 class TestAutoOpen(unittest.TestCase):
@@ -44,3 +44,16 @@ class TestAutoRead(unittest.TestCase):
     def test_at(self):
         result = auto_read(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data/utf.c'))
         self.assertIn("after", result)
+
+
+class TestDecodeSource(unittest.TestCase):
+
+    def test_same_as_reading_text(self):
+        self.assertEqual(u"a\nb\n", decode_source(b"a\r\nb\r"))
+
+    def test_utf_8_with_bom(self):
+        binary = codecs.BOM_UTF8 + u"天下太平".encode('utf-8')
+        self.assertEqual(u"天下太平", decode_source(binary))
+
+    def test_invalid_bytes_are_ignored(self):
+        self.assertEqual(u"ab", decode_source(b"a\xffb"))
@@ -1,7 +1,15 @@
+import gc
+import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
-from mock import patch
+import weakref
+from mock import Mock, patch
 from ..testHelpers import get_cpp_fileinfo_with_extension
 from lizard_ext.lizardduplicate import LizardExtension as DuplicateDetector
+from lizard_ext.lizardduplicate import NestingStackWithUnifiedTokens, Samples
+from lizard_ext.duplicate_index import SampleStore
 from lizard import analyze_files, get_extensions
 
 
@@ -292,6 +300,170 @@ class TestDuplicateExtensionAcrossFiles(unittest.TestCase):
                 })
         self.assertEqual(1, len(duplicates))
 
+    def test_samples_grouped_in_shards_by_processes(self):
+        source_files = {
+                'f1.cpp': self.builder.six_line_function().build(),
+                'f2.cpp': self.builder.five_line_function()
+                    .six_line_function().build(),
+                'f3.cpp': self.builder.empty_function()
+                    .six_line_function().build()}
+        expected = [[str(s) for s in dup] for dup in self.detect(source_files)]
+        self.detector = DuplicateDetector()
+        self.detector.set_options(Mock(working_threads=2, duplicate_index=None, near_miss=None))
+        duplicates = self.detect(source_files)
+        self.assertEqual(expected, [[str(s) for s in dup] for dup in duplicates])
+        self.assertEqual(2, len(self.detector.shards))
+
+    def detect_with_index(self, source_files, path):
+        self.detector = DuplicateDetector()
+        self.detector.set_options(Mock(
+            working_threads=1, near_miss=None, duplicate_index=path))
+        try:
+            return self.detect(source_files)
+        finally:
+            self.detector.nodes.close()
+
+    def test_samples_kept_in_an_on_disk_index(self):
+        source_files = {
+                'f1.cpp': self.builder.six_line_function().build(),
+                'f2.cpp': self.builder.five_line_function()
+                    .six_line_function().build(),
+                'f3.cpp': self.builder.empty_function()
+                    .six_line_function().build()}
+        expected = [[str(s) for s in dup] for dup in self.detect(source_files)]
+        rates = (self.detector.duplicate_rate(), self.detector.unique_rate())
+        directory = tempfile.mkdtemp()
+        try:
+            duplicates = self.detect_with_index(
+                source_files, os.path.join(directory, "index.db"))
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(expected, [[str(s) for s in dup] for dup in duplicates])
+        self.assertEqual(rates, (self.detector.duplicate_rate(),
+                                 self.detector.unique_rate()))
+
+    def test_on_disk_index_only_writes_the_changed_files_again(self):
+        before = {
+                'f1.cpp': self.builder.six_line_function().build(),
+                'f2.cpp': self.builder.five_line_function().build(),
+                'f3.cpp': self.builder.six_line_function().build()}
+        after = {
+                'f1.cpp': before['f1.cpp'],
+                'f2.cpp': self.builder.five_line_function()
+                    .six_line_function().build(),
+                'f4.cpp': self.builder.empty_function()
+                    .six_line_function().build()}
+        expected = [[str(s) for s in dup] for dup in self.detect(after)]
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "index.db")
+            self.detect_with_index(before, path)
+            duplicates = self.detect_with_index(after, path)
+            store = self.detector.nodes
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(expected, [[str(s) for s in dup] for dup in duplicates])
+        self.assertEqual(1, store.reused)
+        self.assertEqual(['f1.cpp', 'f2.cpp', 'f4.cpp'], store.filenames)
+
+    def test_samples_are_not_sharded_for_the_on_disk_index(self):
+        self.detector.set_options(Mock(
+            working_threads=2, near_miss=None, duplicate_index="index.db"))
+        fileinfo = get_cpp_fileinfo_with_extension(
+            self.builder.six_line_function().build(), self.detector)
+        self.assertIsNone(fileinfo.hash_nodes.shards)
+        self.assertIsNone(self.detector.shards)
+
+    def test_on_disk_index_is_closed_after_printing(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.detector.set_options(Mock(
+                working_threads=1, near_miss=None,
+                duplicate_index=os.path.join(directory, "index.db")))
+            self.detect({'f1.cpp': self.builder.six_line_function().build()})
+            store = self.detector.nodes
+            with patch('sys.stdout'):
+                self.detector.print_result()
+        finally:
+            shutil.rmtree(directory)
+        self.assertRaises(sqlite3.ProgrammingError,
+                          store.connection.execute, "SELECT 1")
+
+    def test_on_disk_index_caches_do_not_keep_it_alive(self):
+        directory = tempfile.mkdtemp()
+        try:
+            store = SampleStore(os.path.join(directory, "index.db"))
+            samples = Samples()
+            samples.hashes.extend([1, 2, 1])
+            samples.start_lines.extend([1, 2, 3])
+            samples.end_lines.extend([1, 2, 3])
+            store.add('f1.cpp', samples)
+            index = store.group_index([0], False)
+            self.assertEqual(2, index.hash_at(1))
+            self.assertEqual(0, index.group_first(2))
+            reference = weakref.ref(index)
+            del index
+            gc.collect()
+            store.close()
+        finally:
+            shutil.rmtree(directory)
+        self.assertIsNone(reference())
+
+    def test_file_without_samples_is_skipped_when_looking_up_names(self):
+        duplicates = self.detect({
+                'f1.cpp': self.builder.six_line_function().build(),
+                'f2.cpp': '',
+                'f3.cpp': self.builder.six_line_function().build()})
+        self.assertEqual(["f1.cpp", "f3.cpp"],
+                         [snippet.file_name for snippet in duplicates[0]])
+
+
+class TestNearMissDuplicates(unittest.TestCase):
+
+    def setUp(self):
+        self.detector = DuplicateDetector()
+        self.detector.set_options(Mock(
+            working_threads=1, duplicate_index=None, near_miss=True,
+            near_miss_similarity=0.8))
+        self.builder = CFunctionBuilder()
+
+    @patch('lizard.auto_read', create=True)
+    def detect(self, source_files, auto_read):
+        auto_read.side_effect = lambda filename: source_files[filename]
+        extensions = get_extensions([self.detector])
+        list(analyze_files(sorted(source_files.keys()), exts=extensions))
+        return [[str(snippet) for snippet in block]
+                for block in self.detector.nodes.find()]
+
+    def test_edited_copies_are_similar(self):
+        blocks = self.detect({
+                'f1.cpp': self.builder.long_function().build(),
+                'f2.cpp': self.builder.empty_function()
+                    .long_function(extra="log(i);").build()})
+        self.assertEqual([["f1.cpp:1 ~ 10", "f2.cpp:3 ~ 12"]], blocks)
+
+    def test_different_functions_are_not_similar(self):
+        blocks = self.detect({
+                'f1.cpp': self.builder.long_function().build(),
+                'f2.cpp': self.builder.six_line_function()
+                    .different_six_line_function("f").build()})
+        self.assertEqual([], blocks)
+
+    def test_copies_are_joined_in_a_block(self):
+        blocks = self.detect({
+                'f1.cpp': self.builder.long_function().build(),
+                'f2.cpp': self.builder.long_function().build(),
+                'f3.cpp': self.builder.long_function(extra="log(i);").build()})
+        self.assertEqual([["f1.cpp:1 ~ 10", "f2.cpp:1 ~ 10",
+                           "f3.cpp:1 ~ 10"]], blocks)
+
+    def test_small_functions_are_skipped(self):
+        blocks = self.detect({
+                'f1.cpp': self.builder.empty_function().build(),
+                'f2.cpp': self.builder.empty_function().build()})
+        self.assertEqual([], blocks)
+        self.assertEqual(0, len(self.detector.nodes))
+
 
 class CFunctionBuilder(object):
     def __init__(self):
@@ -327,6 +499,20 @@ class CFunctionBuilder(object):
         '''%(name, variable_name, number_value, rvalue, variable_name, operator)
         return self
 
+    def long_function(self, name='func', extra=''):
+        self.code += ''' void %s(int param, int count) {
+                int result = 0, i = 0;
+                for (; i < count; i++) {
+                    if (i %% 2 == 0) result += i * param;
+                    else result -= param;
+                    print("abc", result);%s
+                }
+                save(result, count);
+                return;
+            }
+        '''%(name, extra)
+        return self
+
     def part_of_six_line_function(self, name='func6'):
         self.code += ''' void %s(int param) {
                 int result, i = 0;
@@ -349,3 +535,27 @@ class CFunctionBuilder(object):
         return self
 
 
+
+
+class TestSamples(unittest.TestCase):
+
+    def samples(self, tokens):
+        unifier = NestingStackWithUnifiedTokens(None)
+        unifier.unified_tokens = [(t, i + 1) for i, t in enumerate(tokens)]
+        return unifier.samples()
+
+    def test_too_few_tokens(self):
+        self.assertEqual(0, len(self.samples(["a"] * 31)))
+
+    def test_each_sample_covers_32_tokens(self):
+        samples = self.samples([str(i) for i in range(34)])
+        self.assertEqual(3, len(samples))
+        self.assertEqual([1, 2, 3], list(samples.start_lines))
+        self.assertEqual([32, 33, 34], list(samples.end_lines))
+        self.assertEqual(3, len(set(samples.hashes)))
+
+    def test_same_hash_for_the_same_concatenated_tokens(self):
+        samples = self.samples(["ab", "c"] + ["x"] * 30 + ["a", "bc"] +
+                               ["x"] * 30)
+        self.assertEqual(samples.hashes[0], samples.hashes[32])
+        self.assertNotEqual(samples.hashes[0], samples.hashes[1])
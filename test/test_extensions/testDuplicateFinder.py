@@ -1,5 +1,7 @@
 import unittest
-from lizard_ext.lizardduplicate import DuplicateFinder
+from array import array
+from mock import patch
+from lizard_ext.lizardduplicate import DuplicateFinder, _map_shards
 
 
 class Node(object):
@@ -52,7 +54,42 @@ class TestDuplicateFinder(unittest.TestCase):
     def test_partial_different_purpose(self):
         self.assertNotIn([("2@1", "3@2"), ("2@4", "3@5")], self.find_in([1,2,3,1,2,3,2]))
 
-
-
-
-
+    def test_samples_grouped_in_shards(self):
+        values = [1, 2, 3, 1, 2, 3, 2, 4, 1, 2]
+        nodes = [Node(v, v) for v in values + [-1]]
+        shards = [[(0, array('q', [v for v in values if v % 2 == s]),
+                    array('l', [i for i, v in enumerate(values)
+                                if v % 2 == s]))]
+                  for s in (0, 1)]
+        finder = DuplicateFinder(nodes, [0], collapse_repeat_tokens=0,
+                                 shards=shards)
+        self.assertEqual(
+            list(DuplicateFinder(nodes, [0], collapse_repeat_tokens=0)
+                 .find_start_and_ends()),
+            list(finder.find_start_and_ends()))
+        self.assertEqual(4, finder.index.group_count())
+
+    def test_repeated_samples_in_a_file_are_collapsed(self):
+        nodes = [Node(v, v) for v in [1, 1, 2, 1, 3]]
+        finder = DuplicateFinder(nodes, [0, 3], collapse_repeat_tokens=2)
+        self.assertEqual([[0, 3]], [list(g) for g in finder.index.groups])
+
+
+@patch('multiprocessing.Pool')
+class TestMapShards(unittest.TestCase):
+
+    def test_pool_is_closed_and_joined(self, pool_class):
+        pool = pool_class.return_value
+        pool.map.return_value = ["a", "b"]
+        self.assertEqual(["a", "b"], _map_shards([1, 2], 2))
+        pool.close.assert_called_once_with()
+        pool.join.assert_called_once_with()
+        self.assertFalse(pool.terminate.called)
+
+    def test_pool_is_terminated_and_joined_on_error(self, pool_class):
+        pool = pool_class.return_value
+        pool.map.side_effect = KeyboardInterrupt
+        self.assertRaises(KeyboardInterrupt, _map_shards, [1, 2], 2)
+        pool.terminate.assert_called_once_with()
+        pool.join.assert_called_once_with()
+        self.assertFalse(pool.close.called)
@@ -143,3 +143,44 @@ class TestGeneralFanOut(unittest.TestCase):
                 void ns::foo(){ foo();}
                 """)
         self.assertEqual(1, result)
+
+
+class TestOrderOfFiles(unittest.TestCase):
+
+    def test_fan_in_from_a_source_file_before(self):
+        result = fanio(
+                """ int bar(){ fun() } """,
+                """ int fun(){ } """
+                )
+        self.assertEqual(0, result.fan_in)
+        self.assertEqual(1, result.fan_out)
+
+    def test_fan_out_to_a_source_file_before(self):
+        ext = FanInOut()
+        files = [FileAnalyzer(get_extensions([ext])).analyze_source_code(
+            "a.cpp", code) for code in (""" int bar(){ } """,
+                                        """ int fun(){ bar() } """)]
+        for fileinfo in files:
+            list(ext.cross_file_process([fileinfo]))
+        self.assertEqual(1, files[0].function_list[0].fan_in)
+        self.assertEqual(1, files[1].function_list[0].fan_out)
+
+    def test_general_fan_out_does_not_grow_with_more_files(self):
+        result = fanio(
+                """ int foo(){ bar(); } """,
+                """ int bar(){ } """,
+                """ int baz(){ } """
+                )
+        self.assertEqual(1, result.general_fan_out)
+
+    def test_values_are_complete_when_the_files_are_yielded(self):
+        for codes in ((" int foo(){return 1;} ", " int bar(){return foo();} "),
+                      (" int bar(){return foo();} ", " int foo(){return 1;} ")):
+            ext = FanInOut()
+            files = [FileAnalyzer(get_extensions([ext])).analyze_source_code(
+                "a.c", code) for code in codes]
+            seen = {}
+            for fileinfo in ext.cross_file_process(iter(files)):
+                func = fileinfo.function_list[0]
+                seen[func.name] = (func.fan_in, func.fan_out)
+            self.assertEqual({"foo": (1, 0), "bar": (0, 1)}, seen)
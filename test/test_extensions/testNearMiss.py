@@ -0,0 +1,59 @@
+import unittest
+from lizard_ext.near_miss import NearMissFinder, shingle_hashes, signature, \
+    similarity
+
+
+def signature_of(text):
+    return signature(shingle_hashes(text.split()))
+
+
+class TestSignature(unittest.TestCase):
+
+    def test_shingles_of_too_few_tokens(self):
+        self.assertEqual([], shingle_hashes(["a", "b"]))
+        self.assertEqual(None, signature([]))
+
+    def test_tokens_are_not_concatenated_ambiguously(self):
+        self.assertNotEqual(shingle_hashes(["ab", "c", "d", "e", "f"]),
+                            shingle_hashes(["a", "bc", "d", "e", "f"]))
+
+    def test_same_tokens_have_the_same_signature(self):
+        self.assertEqual(1.0, similarity(signature_of("a b c d e f g h"),
+                                         signature_of("a b c d e f g h")))
+
+    def test_empty_bins_are_filled(self):
+        self.assertEqual(64, len(signature_of("a b c d e f")))
+
+    def test_similarity_estimates_the_shared_shingles(self):
+        hashes = shingle_hashes(["x%d" % i for i in range(1004)])
+        edited = hashes[:900] + shingle_hashes(["y%d" % i for i in range(104)])
+        self.assertAlmostEqual(
+            0.82, similarity(signature(hashes), signature(edited)), delta=0.1)
+
+
+class TestNearMissFinder(unittest.TestCase):
+
+    def find(self, *texts):
+        finder = NearMissFinder(0.8)
+        for name, text in texts:
+            finder.add(name, signature_of(text))
+        return list(finder.find())
+
+    def test_nothing_to_find(self):
+        self.assertEqual([], self.find())
+
+    def test_similar_functions_are_in_a_block(self):
+        text = " ".join("x%d" % i for i in range(200))
+        edited = text.replace("x100 ", "y ")
+        self.assertEqual([["a", "b"]], self.find(("a", text), ("b", edited)))
+
+    def test_different_functions_are_not(self):
+        self.assertEqual([], self.find(
+            ("a", " ".join("x%d" % i for i in range(200))),
+            ("b", " ".join("y%d" % i for i in range(200)))))
+
+    def test_blocks_are_in_the_order_functions_were_added(self):
+        first = " ".join("x%d" % i for i in range(200))
+        second = " ".join("y%d" % i for i in range(200))
+        self.assertEqual([["a", "c"], ["b", "d"]], self.find(
+            ("a", first), ("b", second), ("c", first), ("d", second)))
@@ -1,6 +1,11 @@
+import os
+import shutil
+import tempfile
 import unittest
-from mock import patch
-from lizard_ext.lizardwordcount import LizardExtension
+from collections import Counter
+from mock import Mock, patch
+from lizard_ext.lizardwordcount import LizardExtension, CountMinSketch, \
+    SketchCounter, main, read_word_counts, top_words, write_word_counts
 
 
 class FakeReader(object):
@@ -82,3 +87,79 @@ class TestWordCountOutput(unittest.TestCase):
         ext.result = {'a':123}
         ext.print_result()
         browser_open.assert_called_with('file://' + os.path.abspath('codecloud.html'));
+
+
+class TestTopWords(unittest.TestCase):
+
+    def test_most_frequent_first_then_by_word(self):
+        self.assertEqual([("c", 5), ("a", 2)],
+                         top_words({"b": 2, "a": 2, "c": 5}, 2))
+
+    def test_the_result_is_a_counter_of_all_files(self):
+        ext = LizardExtension()
+        reader = FakeReader()
+        list(ext(["a", "b", "a"], reader))
+        list(ext.cross_file_process([reader.fileinfo, reader.fileinfo]))
+        self.assertEqual(Counter({"a": 4, "b": 2}), ext.result)
+
+
+class TestSketchCounter(unittest.TestCase):
+
+    def test_estimates_are_never_too_low(self):
+        counter = SketchCounter(sketch=CountMinSketch(width=16, depth=2))
+        counter.update(dict(("w%d" % i, i) for i in range(100)))
+        for i in range(100):
+            self.assertGreaterEqual(counter["w%d" % i], i)
+
+    def test_keeps_the_most_frequent_words(self):
+        counter = SketchCounter(capacity=3)
+        for i in range(100):
+            counter.update({"w%d" % i: i, "often": 10})
+        self.assertEqual(["often", "w99", "w98"],
+                         [word for word, _ in top_words(counter, 3)])
+        self.assertLessEqual(len(counter.candidates), 6)
+
+    def test_option(self):
+        ext = LizardExtension()
+        ext.set_options(Mock(word_count_sketch=True, word_count_file=None))
+        reader = FakeReader()
+        list(ext(["a", "a"], reader))
+        list(ext.cross_file_process([reader.fileinfo]))
+        self.assertEqual([("a", 2)], top_words(ext.result))
+
+
+class TestWordCountFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "counts.tsv")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @patch('webbrowser.open')
+    def test_counts_are_saved_instead_of_the_tag_cloud(self, browser_open):
+        ext = LizardExtension()
+        ext.set_options(Mock(word_count_sketch=False,
+                             word_count_file=self.path))
+        ext.result = Counter({"a": 1, "b": 3})
+        with patch('sys.stdout'):
+            ext.print_result()
+        with open(self.path) as count_file:
+            self.assertEqual("b\t3\na\t1\n", count_file.read())
+        self.assertFalse(browser_open.called)
+
+    def test_read_the_saved_counts(self):
+        write_word_counts(Counter({"a": 1, "b": 3}), self.path)
+        self.assertEqual(Counter({"a": 1, "b": 3}),
+                         read_word_counts(self.path))
+
+    @patch('webbrowser.open')
+    def test_tag_cloud_from_the_saved_counts(self, browser_open):
+        write_word_counts(Counter({"a": 123}), self.path)
+        html = os.path.join(self.directory, "cloud.html")
+        with patch.object(LizardExtension, "HTML_FILENAME", html):
+            self.assertEqual(0, main([self.path]))
+        with open(html) as html_file:
+            self.assertIn('["a", 123]', html_file.read())
+        browser_open.assert_called_with('file://' + os.path.abspath(html))